@@ -1,23 +1,101 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+import asyncio
+import os
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 import uvicorn
 
 # Importar routers
 from routers.auth import router as auth_router
 from routers.dao import router as dao_router
 from routers.onboarding import router as onboarding_router
-from routers.marketplace import router as marketplace_router
+from routers.marketplace import router as marketplace_router, usage_writer
 from routers.metrics import router as metrics_router
 from routers.admin import router as admin_router
 from routers.licenses import router as licenses_router
+from routers.signals import router as signals_router
+from utils.hashing_pool import hashing_pool
+from models.engine import engine, async_engine
+from models.user import init_db
+from routers.database import mongo_db
+from utils.mongo_indexes import ensure_indexes
+from utils.api_keys import PartnerKeyMiddleware, PARTNER_API_PREFIXES
+from utils.redis_pool import init_redis, close_redis
+from utils.kpi_engine import KPIEngine, run_kpi_engine
+from utils.user_kpis import UserKPIBuilder, run_user_kpis, user_kpis_lock
+from utils.counters import run_reconciliation, reconcile_lock
+from utils.signal_hub import signal_hub
+from utils.stripe_gateway import stripe_gateway, price_catalog, run_price_catalog
+from utils.stripe_events import StripeEventWorker, run_stripe_events
+from utils.runtime_stats import register_stats
+from utils.telemetry import PrometheusMiddleware, METRICS_PATH, authorized, render_metrics, start_metrics_server
+
+MONGO_ENSURE_INDEXES = os.getenv("MONGO_ENSURE_INDEXES", "true").lower() in ("1", "true", "yes")
+KPI_ENGINE_ENABLED = os.getenv("KPI_ENGINE_ENABLED", "true").lower() in ("1", "true", "yes")
+USER_KPIS_ENABLED = os.getenv("USER_KPIS_ENABLED", "true").lower() in ("1", "true", "yes")
+COUNTERS_RECONCILE_ENABLED = os.getenv("COUNTERS_RECONCILE_ENABLED", "true").lower() in ("1", "true", "yes")
+SIGNAL_HUB_ENABLED = os.getenv("SIGNAL_HUB_ENABLED", "true").lower() in ("1", "true", "yes")
+
+kpi_engine = KPIEngine(mongo_db)
+register_stats("kpi_engine", kpi_engine.stats)
+user_kpi_builder = UserKPIBuilder(mongo_db)
+register_stats("user_kpis", user_kpi_builder.stats)
+register_stats("job_lock:user_kpis", user_kpis_lock.stats)
+register_stats("job_lock:counters_reconcile", reconcile_lock.stats)
+stripe_event_worker = StripeEventWorker(mongo_db)
+register_stats("stripe_events", stripe_event_worker.stats)
+
+# Ciclo de vida: recursos compartidos del proceso
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    init_db()
+    init_redis()
+    # Índices de Mongo en segundo plano: no demorar el arranque si Mongo tarda
+    indexes_task = asyncio.create_task(ensure_indexes(mongo_db)) if MONGO_ENSURE_INDEXES else None
+    # KPIs globales: recálculo incremental periódico (snapshot en Mongo + Redis)
+    kpi_task = asyncio.create_task(run_kpi_engine(kpi_engine)) if KPI_ENGINE_ENABLED else None
+    # KPIs por usuario (user_kpis + user:kpis:{id}): batch vectorizado periódico
+    user_kpis_task = asyncio.create_task(run_user_kpis(user_kpi_builder)) if USER_KPIS_ENABLED else None
+    # Contadores mantenidos en escritura: recuento periódico contra las colecciones
+    # (un solo worker por intervalo; COUNTERS_RECONCILE_ENABLED=false lo apaga)
+    counters_task = asyncio.create_task(run_reconciliation(mongo_db)) if COUNTERS_RECONCILE_ENABLED else None
+    # Señales en tiempo real: una suscripción pub/sub por worker para SSE/WebSocket
+    hub_task = asyncio.create_task(signal_hub.run()) if SIGNAL_HUB_ENABLED else None
+    # Catálogo de precios de Stripe en memoria (valida plan_id sin ir a la red)
+    catalog_task = asyncio.create_task(run_price_catalog(price_catalog)) if stripe_gateway.api_key else None
+    # Webhooks de Stripe: los eventos encolados se aplican con reintentos
+    stripe_events_task = asyncio.create_task(run_stripe_events(stripe_event_worker))
+    # Métricas en un puerto interno aparte (METRICS_PORT), si está configurado
+    metrics_server = await start_metrics_server()
+    yield
+    # Escribir el uso encolado antes de cerrar Mongo/Redis
+    await usage_writer.stop()
+    for task in (indexes_task, kpi_task, user_kpis_task, counters_task, hub_task, catalog_task, stripe_events_task):
+        if task:
+            task.cancel()
+    if metrics_server:
+        metrics_server.close()
+    hashing_pool.shutdown(wait=False)
+    await stripe_gateway.close()
+    await close_redis()
+    engine.dispose()
+    await async_engine.dispose()
 
 # Configuración base
 app = FastAPI(
     title="ZIMA Backend API",
     version="1.0.0",
-    description="Sistema completo de backend para ZIMA SaaS"
+    description="Sistema completo de backend para ZIMA SaaS",
+    lifespan=lifespan
 )
 
+# API Keys de partners en los prefijos configurados (PARTNER_API_PREFIXES).
+# Se agrega antes que CORS para quedar por dentro: los 401/403 también llevan
+# los headers de CORS.
+if PARTNER_API_PREFIXES:
+    app.add_middleware(PartnerKeyMiddleware, prefixes=PARTNER_API_PREFIXES)
+
 # CORS: permitir frontend en Vercel o localhost
 origins = [
     "http://localhost:3000",
@@ -30,8 +108,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+# Latencia por ruta (debe envolver a todo lo demás: se agrega último)
+app.add_middleware(PrometheusMiddleware)
+
 # Registrar routers
 app.include_router(auth_router, prefix="/auth")
 app.include_router(dao_router, prefix="/dao")
@@ -40,12 +122,20 @@ app.include_router(marketplace_router, prefix="/marketplace")
 app.include_router(metrics_router, prefix="/metrics")
 app.include_router(admin_router, prefix="/admin")
 app.include_router(licenses_router, prefix="/licenses")
+app.include_router(signals_router, prefix="/signals")
 
 # Healthcheck
 @app.get("/")
 def read_root():
     return {"status": "✅ ZIMA backend online", "version": "1.0.0"}
 
+# Métricas internas en formato Prometheus
+@app.get(METRICS_PATH, include_in_schema=False)
+def internal_metrics(request: Request):
+    if not authorized(request.headers.get("authorization")):
+        return PlainTextResponse("", status_code=401)
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # Ejecución local
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
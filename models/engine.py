@@ -0,0 +1,146 @@
+# models/engine.py
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from typing import Dict
+import os
+import threading
+import time
+
+from utils.runtime_stats import register_stats
+from utils.telemetry import instrument_sqlalchemy
+
+# ==================== Config DB ====================
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./test.db")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+# Drivers async equivalentes a los sync de DATABASE_URL
+ASYNC_DRIVERS = {
+    "sqlite": "aiosqlite",
+    "postgresql": "asyncpg",
+}
+
+# ==================== Pool instrumentado ====================
+# Mide cuánto espera cada checkout por una conexión libre y cuántos expiran.
+class _PoolTelemetry:
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            with self._stats_lock:
+                self.checkouts += 1
+                self.wait_total += waited
+                self.wait_max = max(self.wait_max, waited)
+
+class InstrumentedQueuePool(_PoolTelemetry, QueuePool):
+    pass
+
+class InstrumentedAsyncQueuePool(_PoolTelemetry, AsyncAdaptedQueuePool):
+    pass
+
+def _is_memory_sqlite(url: str) -> bool:
+    return url.startswith("sqlite") and (":memory:" in url or url.rstrip("/") in ("sqlite:", "sqlite+pysqlite:"))
+
+# ==================== Fábrica de engines ====================
+def _engine_kwargs(url: str, poolclass) -> Dict:
+    kwargs = {}
+    if url.startswith("sqlite"):
+        kwargs["connect_args"] = {"check_same_thread": False}
+    if not _is_memory_sqlite(url):
+        kwargs.update(
+            poolclass=poolclass,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_pre_ping=DB_POOL_PRE_PING,
+        )
+    return kwargs
+
+def build_engine(url: str = DATABASE_URL, **overrides) -> Engine:
+    kwargs = _engine_kwargs(url, InstrumentedQueuePool)
+    kwargs.update(overrides)
+    return create_engine(url, **kwargs)
+
+# sqlite:///x.db -> sqlite+aiosqlite:///x.db, postgresql://... -> postgresql+asyncpg://...
+def to_async_url(url: str) -> str:
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No hay driver async configurado para '{backend}'")
+    return parsed.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}").render_as_string(hide_password=False)
+
+def build_async_engine(url: str = DATABASE_URL, **overrides) -> AsyncEngine:
+    async_url = to_async_url(url)
+    kwargs = _engine_kwargs(async_url, InstrumentedAsyncQueuePool)
+    kwargs.update(overrides)
+    return create_async_engine(async_url, **kwargs)
+
+def pool_stats(target=None) -> Dict:
+    target = target or engine
+    if isinstance(target, AsyncEngine):
+        target = target.sync_engine
+    pool = target.pool
+    stats = {"pool_class": type(pool).__name__, "status": pool.status()}
+    if isinstance(pool, QueuePool):
+        stats.update({
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": max(0, pool.overflow()),
+            "max_overflow": pool._max_overflow,
+            "timeout_seconds": pool.timeout(),
+        })
+    if isinstance(pool, _PoolTelemetry):
+        stats.update({
+            "checkouts": pool.checkouts,
+            "timeouts": pool.timeouts,
+            "wait_avg_ms": round(pool.wait_total / pool.checkouts * 1000, 3) if pool.checkouts else 0.0,
+            "wait_max_ms": round(pool.wait_max * 1000, 3),
+        })
+    return stats
+
+# ==================== Engine compartido del proceso ====================
+engine = build_engine()
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+register_stats("sql_pool", pool_stats)
+instrument_sqlalchemy(engine)
+
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+# ==================== Engine async (endpoints async def) ====================
+async_engine = build_async_engine()
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+register_stats("sql_async_pool", lambda: pool_stats(async_engine))
+instrument_sqlalchemy(async_engine.sync_engine)
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,13 +1,14 @@
 
-from sqlalchemy import Column, Integer, String, create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base, Session
+from sqlalchemy import Column, Integer, String, inspect, or_, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import declarative_base, Session
 from passlib.context import CryptContext
-import os
+from datetime import datetime
+from utils.hashing_pool import hashing_pool
 
 # ==================== Config DB ====================
-DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./test.db")
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Engine y pool compartidos por todo el proceso (ver models/engine.py)
+from models.engine import engine, SessionLocal, get_db, async_engine, AsyncSessionLocal, get_async_db
 Base = declarative_base()
 
 # ==================== Modelo SQL ====================
@@ -19,7 +20,20 @@ class User(Base):
     role = Column(String, default="user")  # admin / user
     plan = Column(String, default="freemium")  # freemium / basic / pro / lifetime
 
-Base.metadata.create_all(bind=engine)
+# Crear tablas en el arranque de la app (lifespan), no al importar el módulo
+def init_db():
+    Base.metadata.create_all(bind=engine)
+    _add_missing_columns()
+
+# Sin migraciones: create_all no toca tablas existentes, así que las columnas
+# nullable agregadas después al modelo se crean acá
+def _add_missing_columns():
+    existing = {c["name"] for c in inspect(engine).get_columns(User.__tablename__)}
+    with engine.begin() as conn:
+        for column in User.__table__.columns:
+            if column.name not in existing and column.nullable:
+                conn.execute(text(f"ALTER TABLE {User.__tablename__} ADD COLUMN {column.name} "
+                                  f"{column.type.compile(engine.dialect)}"))
 
 # ==================== Seguridad ====================
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -31,24 +45,44 @@ def verify_password(plain_pw: str, hashed_pw: str) -> bool:
     return pwd_context.verify(plain_pw, hashed_pw)
 
 # ==================== DB utils ====================
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 def get_user_by_email(db: Session, email: str):
     return db.query(User).filter(User.email == email).first()
 
-def create_user(db: Session, email: str, password: str):
-    hashed_pw = hash_password(password)
+def create_user(db: Session, email: str, password: str, hashed_password: str = None):
+    hashed_pw = hashed_password or hash_password(password)
     user = User(email=email, hashed_password=hashed_pw)
     db.add(user)
     db.commit()
     db.refresh(user)
     return user
 
+# ==================== DB utils (async) ====================
+# Para endpoints async def: no bloquean el event loop
+async def get_user_by_email_async(db: AsyncSession, email: str):
+    result = await db.execute(select(User).where(User.email == email))
+    return result.scalars().first()
+
+async def create_user_async(db: AsyncSession, email: str, password: str, hashed_password: str = None):
+    if hashed_password is None:
+        hashed_password = await hashing_pool.hash(password)
+    user = User(email=email, hashed_password=hashed_password)
+    db.add(user)
+    await db.commit()
+    await db.refresh(user)
+    return user
+
+# Plan desde un evento de Stripe. Stripe no garantiza el orden de entrega: se
+# guarda el `created` del último evento aplicado y uno más viejo no lo pisa
+# (la condición va en el mismo UPDATE, sin carrera entre workers)
+async def set_plan_from_stripe(db: AsyncSession, email: str, plan: str, event_at: datetime) -> bool:
+    result = await db.execute(
+        update(User)
+        .where(User.email == email, or_(User.stripe_event_at.is_(None), User.stripe_event_at <= event_at))
+        .values(plan=plan, stripe_event_at=event_at)
+    )
+    await db.commit()
+    return bool(result.rowcount)
+
 # models/user.py
 
 from sqlalchemy import Column, Integer, String, DateTime
@@ -69,6 +103,7 @@ class User(Base):
 
     created_at = Column(DateTime, default=datetime.utcnow)
     last_login = Column(DateTime, default=None)
+    stripe_event_at = Column(DateTime, default=None)  # `created` del último evento de Stripe aplicado
 
     def __repr__(self):
         return f"<User(email='{self.email}', role='{self.role}', plan='{self.plan}')>"
@@ -5,7 +5,7 @@ from typing import List, Optional
 from datetime import datetime
 import uuid
 
-from utils.security import get_current_user
+from utils.security import get_current_principal
 from models.user import User
 
 router = APIRouter(prefix="/admin", tags=["admin"])
@@ -26,7 +26,7 @@ class AdminUpdateUser(BaseModel):
     role: Optional[str]
 
 # Middleware: solo admins pueden acceder
-async def require_admin(user: User = Depends(get_current_user)):
+async def require_admin(user=Depends(get_current_principal)):
     if user.role != "admin":
         raise HTTPException(status_code=403, detail="⛔ Solo admins pueden acceder a esta ruta.")
     return user
@@ -79,11 +79,14 @@ import os
 import json
 import uuid
 
+from utils.journal_store import JournalStore
+from utils.license_store import license_store
+
 router = APIRouter(prefix="/admin", tags=["Admin Panel"])
 
 DATA_PATH = "data"
 USERS_PATH = os.path.join(DATA_PATH, "users.json")
-LICENSES_PATH = os.path.join(DATA_PATH, "licenses.json")
+LICENSES_PATH = license_store.path
 
 os.makedirs(DATA_PATH, exist_ok=True)
 
@@ -106,28 +109,23 @@ class LicenseRecord(BaseModel):
     created_at: str
 
 # ===============================
-# Helpers JSON
+# Store de usuarios: snapshot JSON + journal append-only
 # ===============================
-def load_json(path):
-    return json.load(open(path)) if os.path.exists(path) else []
-
-def save_json(path, data):
-    with open(path, "w") as f:
-        json.dump(data, f, indent=2)
+users_store = JournalStore(USERS_PATH, key_field="id")
 
 # ===============================
 # ENDPOINT: Obtener usuarios registrados
 # ===============================
 @router.get("/users", response_model=List[UserRecord])
 async def list_users():
-    return load_json(USERS_PATH)
+    users_store.refresh()
+    return users_store.values()
 
 # ===============================
 # ENDPOINT: Agregar usuario manualmente
 # ===============================
 @router.post("/users/add")
 async def add_user(email: str = Form(...), plan: str = Form("freemium"), role: str = Form("user")):
-    users = load_json(USERS_PATH)
     new_user = UserRecord(
         id=str(uuid.uuid4()),
         email=email,
@@ -135,8 +133,7 @@ async def add_user(email: str = Form(...), plan: str = Form("freemium"), role: s
         role=role,
         created_at=datetime.utcnow().isoformat()
     )
-    users.append(new_user.dict())
-    save_json(USERS_PATH, users)
+    users_store.put(new_user.id, new_user.dict())
     return {"message": "✅ Usuario agregado", "user_id": new_user.id}
 
 # ===============================
@@ -144,14 +141,13 @@ async def add_user(email: str = Form(...), plan: str = Form("freemium"), role: s
 # ===============================
 @router.get("/licenses", response_model=List[LicenseRecord])
 async def list_licenses():
-    return load_json(LICENSES_PATH)
+    return license_store.all()
 
 # ===============================
 # ENDPOINT: Crear nueva licencia API
 # ===============================
 @router.post("/licenses/create")
 async def create_license(owner_email: str = Form(...), plan: str = Form("freemium")):
-    licenses = load_json(LICENSES_PATH)
     new_license = LicenseRecord(
         id=str(uuid.uuid4()),
         api_key=str(uuid.uuid4()),
@@ -160,8 +156,7 @@ async def create_license(owner_email: str = Form(...), plan: str = Form("freemiu
         active=True,
         created_at=datetime.utcnow().isoformat()
     )
-    licenses.append(new_license.dict())
-    save_json(LICENSES_PATH, licenses)
+    license_store.add(new_license.dict())
     return {
         "message": "✅ Licencia creada",
         "api_key": new_license.api_key
@@ -172,14 +167,7 @@ async def create_license(owner_email: str = Form(...), plan: str = Form("freemiu
 # ===============================
 @router.post("/licenses/revoke")
 async def revoke_license(license_id: str = Form(...)):
-    licenses = load_json(LICENSES_PATH)
-    found = False
-    for lic in licenses:
-        if lic["id"] == license_id:
-            lic["active"] = False
-            found = True
-    save_json(LICENSES_PATH, licenses)
-    if found:
+    if license_store.update(license_id, active=False):
         return {"message": "🔒 Licencia revocada"}
     raise HTTPException(status_code=404, detail="Licencia no encontrada")
 
@@ -191,7 +179,8 @@ from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime
 from database import db
-from utils.security import get_current_user
+from utils.security import get_current_principal, invalidate_principal
+from utils.counters import update_grouped_field
 
 router = APIRouter(prefix="/admin", tags=["Admin"])
 
@@ -212,7 +201,7 @@ class LicenseToken(BaseModel):
 # Ver todos los usuarios registrados
 # ===============================
 @router.get("/users")
-async def get_all_users(user=Depends(get_current_user)):
+async def get_all_users(user=Depends(get_current_principal)):
     if user.role != "admin":
         raise HTTPException(status_code=403, detail="No autorizado")
     
@@ -223,25 +212,21 @@ async def get_all_users(user=Depends(get_current_user)):
 # Cambiar plan de un usuario
 # ===============================
 @router.post("/update_plan")
-async def update_user_plan(data: UpdateUserPlan, user=Depends(get_current_user)):
+async def update_user_plan(data: UpdateUserPlan, user=Depends(get_current_principal)):
     if user.role != "admin":
         raise HTTPException(status_code=403, detail="No autorizado")
     
-    result = await db.users.update_one(
-        {"email": data.user_email},
-        {"$set": {"plan": data.new_plan}}
-    )
-
-    if result.modified_count == 0:
+    if not await update_grouped_field(db, "users:plan", {"email": data.user_email}, data.new_plan):
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
-    
+
+    await invalidate_principal(email=data.user_email)
     return {"message": f"✅ Plan actualizado a {data.new_plan}"}
 
 # ===============================
 # Crear nueva licencia
 # ===============================
 @router.post("/licenses/create")
-async def create_license(lic: LicenseToken, user=Depends(get_current_user)):
+async def create_license(lic: LicenseToken, user=Depends(get_current_principal)):
     if user.role != "admin":
         raise HTTPException(status_code=403, detail="No autorizado")
 
@@ -259,7 +244,7 @@ async def create_license(lic: LicenseToken, user=Depends(get_current_user)):
 # Ver licencias activas
 # ===============================
 @router.get("/licenses")
-async def get_licenses(user=Depends(get_current_user)):
+async def get_licenses(user=Depends(get_current_principal)):
     if user.role != "admin":
         raise HTTPException(status_code=403, detail="No autorizado")
     
@@ -273,7 +258,8 @@ from typing import List
 from pydantic import BaseModel
 from datetime import datetime
 from database import db
-from utils.security import get_current_user
+from utils.security import get_current_principal, invalidate_principal
+from utils.counters import get_counts, update_grouped_field
 from models.user import User
 
 router = APIRouter(prefix="/admin", tags=["admin"])
@@ -299,7 +285,7 @@ class UpdateUserPlan(BaseModel):
 # =============================
 # Solo para admins
 # =============================
-def require_admin(user=Depends(get_current_user)):
+def require_admin(user=Depends(get_current_principal)):
     if user.role != "admin":
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="⛔ Solo administradores autorizados")
     return user
@@ -320,6 +306,7 @@ async def update_user_role(data: UpdateUserRole, admin=Depends(require_admin)):
     updated = await db.users.update_one({"_id": data.user_id}, {"$set": {"role": data.new_role}})
     if updated.modified_count == 0:
         raise HTTPException(status_code=404, detail="Usuario no encontrado o sin cambios")
+    await invalidate_principal(user_id=data.user_id)
     return {"status": "✅ Rol actualizado"}
 
 # =============================
@@ -327,9 +314,9 @@ async def update_user_role(data: UpdateUserRole, admin=Depends(require_admin)):
 # =============================
 @router.post("/user/plan")
 async def update_user_plan(data: UpdateUserPlan, admin=Depends(require_admin)):
-    updated = await db.users.update_one({"_id": data.user_id}, {"$set": {"plan": data.new_plan}})
-    if updated.modified_count == 0:
+    if not await update_grouped_field(db, "users:plan", {"_id": data.user_id}, data.new_plan):
         raise HTTPException(status_code=404, detail="Usuario no encontrado o sin cambios")
+    await invalidate_principal(user_id=data.user_id)
     return {"status": "✅ Plan actualizado"}
 
 # =============================
@@ -337,14 +324,12 @@ async def update_user_plan(data: UpdateUserPlan, admin=Depends(require_admin)):
 # =============================
 @router.get("/dashboard")
 async def admin_dashboard(admin=Depends(require_admin)):
-    total_users = await db.users.count_documents({})
-    premium = await db.users.count_documents({"plan": "pro"})
-    freemium = await db.users.count_documents({"plan": "freemium"})
+    counts = await get_counts(db, ["users", "users:plan:pro", "users:plan:freemium"])
 
     return {
-        "total_users": total_users,
-        "premium_users": premium,
-        "freemium_users": freemium,
+        "total_users": counts["users"],
+        "premium_users": counts["users:plan:pro"],
+        "freemium_users": counts["users:plan:freemium"],
         "timestamp": datetime.utcnow()
     }
 
@@ -356,7 +341,8 @@ from pydantic import BaseModel
 from datetime import datetime
 from typing import List
 from database import db
-from utils.security import get_current_user
+from utils.security import get_current_principal, invalidate_principal
+from utils.counters import update_grouped_field
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
@@ -381,7 +367,7 @@ class RoleUpdateRequest(BaseModel):
 # ============================
 # Middleware: solo admin
 # ============================
-def require_admin(user=Depends(get_current_user)):
+def require_admin(user=Depends(get_current_principal)):
     if user.role != "admin":
         raise HTTPException(status_code=403, detail="Acceso restringido a administradores")
     return user
@@ -408,12 +394,9 @@ async def list_users(admin=Depends(require_admin)):
 # ============================
 @router.post("/update/plan")
 async def update_plan(req: PlanUpdateRequest, admin=Depends(require_admin)):
-    result = await db.users.update_one(
-        {"_id": req.user_id},
-        {"$set": {"plan": req.new_plan}}
-    )
-    if result.modified_count == 0:
+    if not await update_grouped_field(db, "users:plan", {"_id": req.user_id}, req.new_plan):
         raise HTTPException(status_code=404, detail="Usuario no encontrado o sin cambios")
+    await invalidate_principal(user_id=req.user_id)
     return {"message": f"✅ Plan actualizado a {req.new_plan}"}
 
 # ============================
@@ -427,18 +410,26 @@ async def update_role(req: RoleUpdateRequest, admin=Depends(require_admin)):
     )
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Usuario no encontrado o sin cambios")
+    await invalidate_principal(user_id=req.user_id)
     return {"message": f"✅ Rol actualizado a {req.new_role}"}
 
 
 # routers/admin.py
 
 from fastapi import APIRouter, HTTPException, Depends, Request
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from datetime import datetime
 from typing import List
+import logging
 import stripe
 import os
-from models.user import User
-from utils.security import get_db
+from database import db as mongo_db
+from models.user import User, AsyncSessionLocal, set_plan_from_stripe
+from utils.security import get_db, get_async_db, get_current_principal, invalidate_principal
+from utils.runtime_stats import collect_stats
+from utils.stripe_events import enqueue_event, stripe_handler
 
 router = APIRouter(prefix="/admin", tags=["Admin Panel"])
 
@@ -459,18 +450,20 @@ def list_users(db: Session = Depends(get_db)):
 
 # === ENDPOINT: Forzar upgrade manual de plan ===
 @router.post("/upgrade")
-def upgrade_user(email: str, new_plan: str, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == email).first()
-    if not user:
+async def upgrade_user(email: str, new_plan: str, db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(update(User).where(User.email == email).values(plan=new_plan))
+    if not result.rowcount:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
 
-    user.plan = new_plan
-    db.commit()
+    await db.commit()
+    await invalidate_principal(email=email)
     return {"message": f"✅ Plan actualizado a '{new_plan}' para {email}"}
 
 # === WEBHOOK STRIPE para upgrades automáticos ===
+# Solo verifica y encola (utils/stripe_events.py); los cambios de plan los
+# aplica el worker con los handlers de abajo.
 @router.post("/webhook/stripe")
-async def stripe_webhook(request: Request, db: Session = Depends(get_db)):
+async def stripe_webhook(request: Request):
     payload = await request.body()
     sig_header = request.headers.get("stripe-signature")
 
@@ -479,19 +472,33 @@ async def stripe_webhook(request: Request, db: Session = Depends(get_db)):
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-    if event["type"] == "customer.subscription.created":
-        email = event["data"]["object"].get("customer_email")
-        plan_id = event["data"]["object"]["items"]["data"][0]["price"]["nickname"]
-        user = db.query(User).filter(User.email == email).first()
-        if user:
-            user.plan = plan_id.lower()
-            db.commit()
-
-    elif event["type"] == "customer.subscription.deleted":
-        email = event["data"]["object"].get("customer_email")
-        user = db.query(User).filter(User.email == email).first()
-        if user:
-            user.plan = "free"
-            db.commit()
-
-    return {"status": "✅ Webhook recibido y procesado"}
+    await enqueue_event(mongo_db, event, payload)
+    return {"status": "✅ Webhook recibido"}
+
+async def _set_plan_by_email(email: str, plan: str, event: dict):
+    if not email:
+        return
+    event_at = datetime.utcfromtimestamp(event.get("created", 0))
+    async with AsyncSessionLocal() as session:
+        applied = await set_plan_from_stripe(session, email, plan, event_at)
+    if applied:
+        await invalidate_principal(email=email)
+    else:
+        logging.info(f"[STRIPE] Evento {event.get('id')} ignorado: {email} ya tiene un evento más nuevo o no existe")
+
+@stripe_handler("customer.subscription.created")
+async def apply_subscription_created(event: dict):
+    subscription = event["data"]["object"]
+    plan_id = subscription["items"]["data"][0]["price"]["nickname"]
+    await _set_plan_by_email(subscription.get("customer_email"), plan_id.lower(), event)
+
+@stripe_handler("customer.subscription.deleted")
+async def apply_subscription_deleted(event: dict):
+    await _set_plan_by_email(event["data"]["object"].get("customer_email"), "free", event)
+
+# === ENDPOINT: Estadísticas internas de runtime (caches, pools) ===
+@router.get("/runtime/stats")
+def runtime_stats(user=Depends(get_current_principal)):
+    if user.role != "admin":
+        raise HTTPException(status_code=403, detail="No autorizado")
+    return collect_stats()
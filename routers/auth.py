@@ -4,8 +4,10 @@ from pydantic import BaseModel, EmailStr
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
-from sqlalchemy.orm import Session
-from models.user import User, get_user_by_email, create_user, get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from models.user import User, get_user_by_email_async, create_user_async, get_async_db
+from utils.hashing_pool import hashing_pool, HashingPoolBusy, HASH_POOL_RETRY_AFTER
+from utils.security import issue_access_token
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -44,19 +46,35 @@ def create_access_token(data: dict, expires_delta: timedelta = timedelta(minutes
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
+# Hashing en el pool dedicado: si la cola está llena se corta rápido con 503
+async def pool_hash(password: str) -> str:
+    try:
+        return await hashing_pool.hash(password)
+    except HashingPoolBusy:
+        raise HTTPException(status_code=503, detail="Servicio saturado, reintentá en unos segundos",
+                            headers={"Retry-After": str(HASH_POOL_RETRY_AFTER)})
+
+async def pool_verify(plain: str, hashed: str) -> bool:
+    try:
+        return await hashing_pool.verify(plain, hashed)
+    except HashingPoolBusy:
+        raise HTTPException(status_code=503, detail="Servicio saturado, reintentá en unos segundos",
+                            headers={"Retry-After": str(HASH_POOL_RETRY_AFTER)})
+
 # Endpoints
 @router.post("/signup", response_model=Token)
-def signup(user: UserCreate, db: Session = Depends(get_db)):
-    if get_user_by_email(db, user.email):
+async def signup(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    if await get_user_by_email_async(db, user.email):
         raise HTTPException(status_code=400, detail="Email ya registrado")
-    new_user = create_user(db, user.email, user.password)
-    token = create_access_token(data={"sub": new_user.email})
+    hashed_pw = await pool_hash(user.password)
+    new_user = await create_user_async(db, user.email, user.password, hashed_pw)
+    token = await issue_access_token(new_user)
     return {"access_token": token, "token_type": "bearer"}
 
 @router.post("/login", response_model=Token)
-def login(form: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    db_user = get_user_by_email(db, form.username)
-    if not db_user or not verify_password(form.password, db_user.hashed_password):
+async def login(form: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    db_user = await get_user_by_email_async(db, form.username)
+    if not db_user or not await pool_verify(form.password, db_user.hashed_password):
         raise HTTPException(status_code=401, detail="Credenciales inválidas")
-    token = create_access_token(data={"sub": db_user.email})
+    token = await issue_access_token(db_user)
     return {"access_token": token, "token_type": "bearer"}
@@ -51,6 +51,8 @@ from web3 import Web3
 import json
 import os
 
+from utils.telemetry import timed
+
 router = APIRouter(prefix="/dao", tags=["governance"])
 
 # Config Web3
@@ -77,10 +79,12 @@ async def execute_proposal(request: Request):
 # === Endpoint: Listar propuestas ===
 @router.get("/proposals")
 async def list_proposals():
-    count = dao.functions.getProposalCount().call()
+    with timed("web3", "getProposalCount"):
+        count = dao.functions.getProposalCount().call()
     proposals = []
     for i in range(count):
-        desc, yes, no, deadline, executed = dao.functions.proposals(i).call()
+        with timed("web3", "proposals"):
+            desc, yes, no, deadline, executed = dao.functions.proposals(i).call()
         proposals.append({
             "id": i,
             "description": desc,
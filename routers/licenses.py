@@ -1,16 +1,19 @@
 
 # routers/licenses.py
 
-from fastapi import APIRouter, HTTPException, Request, Form
+from fastapi import APIRouter, HTTPException, Request, Form, Depends
 from pydantic import BaseModel
 from typing import List, Dict
 import uuid
 import json
 import os
 
+from utils.api_keys import partner_auth
+from utils.license_store import license_store, LICENSES_PATH
+
 router = APIRouter()
 
-LICENSE_DB_PATH = "data/licenses.json"
+LICENSE_DB_PATH = LICENSES_PATH
 os.makedirs("data", exist_ok=True)
 
 # ===============================
@@ -23,31 +26,22 @@ class License(BaseModel):
     active: bool = True
 
 # ===============================
-# Helpers de archivo JSON
+# Helpers: store en memoria (utils/license_store.py)
 # ===============================
 def load_licenses() -> List[Dict]:
-    if not os.path.exists(LICENSE_DB_PATH):
-        return []
-    with open(LICENSE_DB_PATH, "r") as f:
-        return json.load(f)
-
-def save_licenses(data: List[Dict]):
-    with open(LICENSE_DB_PATH, "w") as f:
-        json.dump(data, f, indent=4)
+    return license_store.all()
 
 # ===============================
 # ENDPOINT: Crear nueva licencia
 # ===============================
 @router.post("/licenses/create", response_model=License)
 async def create_license(partner_name: str = Form(...)):
-    licenses = load_licenses()
     new_license = License(
         id=str(uuid.uuid4()),
         partner_name=partner_name,
         api_key=str(uuid.uuid4()).replace("-", "")
     )
-    licenses.append(new_license.dict())
-    save_licenses(licenses)
+    license_store.add(new_license.dict())
     return new_license
 
 # ===============================
@@ -62,23 +56,16 @@ async def list_licenses():
 # ===============================
 @router.post("/licenses/revoke")
 async def revoke_license(license_id: str = Form(...)):
-    licenses = load_licenses()
-    for lic in licenses:
-        if lic["id"] == license_id:
-            lic["active"] = False
-            save_licenses(licenses)
-            return {"status": "revocada"}
+    if license_store.update(license_id, active=False):
+        return {"status": "revocada"}
     raise HTTPException(status_code=404, detail="Licencia no encontrada")
 
 # ===============================
-# Función para validar API Key
+# Función para validar API Key (caches positiva/negativa, ver utils/api_keys.py)
 # ===============================
 def get_partner_from_key(api_key: str) -> str:
-    licenses = load_licenses()
-    for lic in licenses:
-        if lic["api_key"] == api_key and lic["active"]:
-            return lic["partner_name"]
-    return None
+    partner = partner_auth.authenticate(api_key)
+    return partner.get("partner_name") if partner else None
 
 # routers/licenses.py
 
@@ -90,9 +77,10 @@ import os
 import uuid
 import json
 
+from utils.license_store import license_store, LICENSES_PATH
+
 router = APIRouter(prefix="/licenses", tags=["Licenses"])
 
-LICENSES_PATH = "data/licenses.json"
 os.makedirs("data", exist_ok=True)
 
 # ==============================
@@ -107,24 +95,16 @@ class LicenseModel(BaseModel):
     created_at: str
 
 # ==============================
-# Helpers de JSON
+# Helpers: store en memoria (utils/license_store.py)
 # ==============================
 def load_licenses() -> List[dict]:
-    if not os.path.exists(LICENSES_PATH):
-        return []
-    with open(LICENSES_PATH, "r") as f:
-        return json.load(f)
-
-def save_licenses(licenses: List[dict]):
-    with open(LICENSES_PATH, "w") as f:
-        json.dump(licenses, f, indent=2)
+    return license_store.all()
 
 # ==============================
 # Crear nueva licencia
 # ==============================
 @router.post("/create", response_model=LicenseModel)
 async def create_license(owner_email: str = Form(...), plan: str = Form("freemium")):
-    licenses = load_licenses()
     new_license = {
         "id": str(uuid.uuid4()),
         "api_key": str(uuid.uuid4()),
@@ -133,8 +113,7 @@ async def create_license(owner_email: str = Form(...), plan: str = Form("freemiu
         "active": True,
         "created_at": datetime.utcnow().isoformat()
     }
-    licenses.append(new_license)
-    save_licenses(licenses)
+    license_store.add(new_license)
     return new_license
 
 # ==============================
@@ -149,14 +128,13 @@ async def list_all_licenses():
 # ==============================
 @router.get("/verify/{api_key}")
 async def verify_license(api_key: str):
-    licenses = load_licenses()
-    for lic in licenses:
-        if lic["api_key"] == api_key and lic["active"]:
-            return {
-                "status": "valid",
-                "owner_email": lic["owner_email"],
-                "plan": lic["plan"]
-            }
+    lic = license_store.get_by_key(api_key)
+    if lic and lic.get("active"):
+        return {
+            "status": "valid",
+            "owner_email": lic["owner_email"],
+            "plan": lic["plan"]
+        }
     raise HTTPException(status_code=403, detail="API Key inválida o revocada.")
 
 # ==============================
@@ -164,12 +142,8 @@ async def verify_license(api_key: str):
 # ==============================
 @router.post("/revoke")
 async def revoke_license(license_id: str = Form(...)):
-    licenses = load_licenses()
-    for lic in licenses:
-        if lic["id"] == license_id:
-            lic["active"] = False
-            save_licenses(licenses)
-            return {"message": "🔒 Licencia revocada correctamente."}
+    if license_store.update(license_id, active=False):
+        return {"message": "🔒 Licencia revocada correctamente."}
     raise HTTPException(status_code=404, detail="Licencia no encontrada.")
 
 
@@ -258,22 +232,21 @@ async def validate_token(token_id: str):
 
 # routers/licenses.py
 
-from fastapi import APIRouter, HTTPException, Request, Form
+from fastapi import APIRouter, Depends, HTTPException, Request, Form
 from pydantic import BaseModel
 from typing import Dict, List
 import uuid
 import json
 import os
-import redis
 from datetime import datetime
 
-router = APIRouter(prefix="/api/licenses", tags=["Licenses"])
+from utils.api_keys import require_partner
+from utils.license_store import partner_key_store, PARTNER_KEYS_PATH
 
-# Inicializar Redis
-r = redis.Redis(host="localhost", port=6379, db=0)
+router = APIRouter(prefix="/api/licenses", tags=["Licenses"])
 
 # Path simulado (en producción usar DB real)
-PARTNER_KEYS_FILE = "config/partner_keys.json"
+PARTNER_KEYS_FILE = PARTNER_KEYS_PATH
 os.makedirs("config", exist_ok=True)
 if not os.path.exists(PARTNER_KEYS_FILE):
     with open(PARTNER_KEYS_FILE, "w") as f:
@@ -290,30 +263,24 @@ class License(BaseModel):
     stripe_customer_id: str
     created_at: str
 
-# === Cargar y guardar desde archivo json ===
+# === Store de claves: snapshot {"partners": {...}} + journal append-only ===
+# El mismo que consulta la autenticación de partners (utils/api_keys.py): una
+# key generada acá autentica en el acto y revocarla invalida las caches
 def load_keys() -> Dict:
-    with open(PARTNER_KEYS_FILE) as f:
-        return json.load(f)
-
-def save_keys(data: Dict):
-    with open(PARTNER_KEYS_FILE, "w") as f:
-        json.dump(data, f, indent=4)
+    return {"partners": partner_key_store.as_dict()}
 
 # === ENDPOINT: Generar nueva API Key ===
 @router.post("/generate", response_model=License)
 def generate_api_key(req: LicenseRequest):
-    data = load_keys()
-    if req.partner_name in data["partners"]:
-        raise HTTPException(status_code=400, detail="Partner ya existe")
-
     new_key = str(uuid.uuid4())
     record = {
         "api_key": new_key,
+        "partner_name": req.partner_name,
         "stripe_customer_id": req.stripe_customer_id,
         "created_at": datetime.utcnow().isoformat()
     }
-    data["partners"][req.partner_name] = record
-    save_keys(data)
+    if not partner_key_store.insert(req.partner_name, record):
+        raise HTTPException(status_code=400, detail="Partner ya existe")
 
     return {
         "api_key": new_key,
@@ -330,11 +297,12 @@ def list_keys():
 # === ENDPOINT: Revocar API Key ===
 @router.delete("/revoke")
 def revoke_key(partner_name: str = Form(...)):
-    data = load_keys()
-    if partner_name not in data["partners"]:
+    if not partner_key_store.delete(partner_name):
         raise HTTPException(status_code=404, detail="Partner no encontrado")
 
-    del data["partners"][partner_name]
-    save_keys(data)
     return {"status": "revocado", "partner": partner_name}
 
+# === ENDPOINT: Partner autenticado por X-API-Key ===
+@router.get("/partner")
+async def get_current_partner(partner: Dict = Depends(require_partner)):
+    return {"status": "valid", "partner": partner}
@@ -6,11 +6,30 @@ from pydantic import BaseModel
 from typing import List
 from datetime import datetime
 import os
+from bson import ObjectId
 from database import db
-from utils.security import get_current_user
+from utils.security import get_current_user, get_current_principal
+from utils.usage_rollups import apply_usage
+from utils.counters import incr
+from utils.batch_writer import BatchWriter, BatchWriterFull, BATCH_WRITER_RETRY_AFTER, register_writer, write_concern_from_env
 
 router = APIRouter(prefix="/marketplace", tags=["Marketplace"])
 
+async def _apply_rollups(docs):
+    await apply_usage(db, docs)
+
+# Uso de /log_usage y /api/billing/log_usage: se confirma al encolar y se
+# escribe en lotes; los rollups se actualizan una vez por lote
+usage_writer = register_writer(BatchWriter("usage_logs", db.usage_logs, on_flush=_apply_rollups,
+                                            write_concern=write_concern_from_env()))
+
+def enqueue_usage(usage: dict):
+    try:
+        usage_writer.submit(usage)
+    except BatchWriterFull:
+        raise HTTPException(status_code=503, detail="Servicio saturado, reintentá en unos segundos",
+                            headers={"Retry-After": str(BATCH_WRITER_RETRY_AFTER)})
+
 # ===============================
 # Modelos
 # ===============================
@@ -25,28 +44,22 @@ class UsageLog(BaseModel):
     signals_consumed: int
     executions: int
 
-class Signal(BaseModel):
-    asset: str
-    timeframe: str
-    prediction: str
-    confidence: float
-    timestamp: datetime
-
 # ===============================
 # Registrar uso por tenant (para SLA / billing)
 # ===============================
 @router.post("/log_usage")
-async def log_usage(log: UsageLog, user=Depends(get_current_user)):
+async def log_usage(log: UsageLog, user=Depends(get_current_principal)):
     if user.tenant_id != log.tenant_id:
         raise HTTPException(status_code=403, detail="No autorizado")
 
-    await db.usage_logs.insert_one({
+    usage = {
         "tenant_id": log.tenant_id,
         "api_calls": log.api_calls,
         "signals_consumed": log.signals_consumed,
         "executions": log.executions,
         "timestamp": datetime.utcnow()
-    })
+    }
+    enqueue_usage(usage)
 
     return {"status": "ok", "message": "✅ Uso registrado correctamente"}
 
@@ -55,7 +68,8 @@ async def log_usage(log: UsageLog, user=Depends(get_current_user)):
 # ===============================
 @router.post("/buy_signal")
 async def purchase_signal(purchase: SignalPurchase, user=Depends(get_current_user)):
-    signal = await db.signals.find_one({"_id": purchase.signal_id})
+    # _id de señales: ObjectId; en compras el signal_id se guarda en hex
+    signal = await db.signals.find_one({"_id": ObjectId(purchase.signal_id)}) if ObjectId.is_valid(purchase.signal_id) else None
     if not signal:
         raise HTTPException(status_code=404, detail="Señal no encontrada")
 
@@ -65,48 +79,35 @@ async def purchase_signal(purchase: SignalPurchase, user=Depends(get_current_use
         "price_usd": purchase.price_usd,
         "timestamp": datetime.utcnow()
     })
+    await incr(db, "purchases")
 
     return {"status": "ok", "access_granted": True, "signal": signal}
 
-# ===============================
-# Listar señales públicas
-# ===============================
-@router.get("/public_signals", response_model=List[Signal])
-async def list_public_signals():
-    signals = await db.signals.find().sort("timestamp", -1).limit(20).to_list(20)
-    return signals
-
-# ===============================
-# Dashboard público resumido
-# ===============================
-@router.get("/public_kpis")
-async def get_public_metrics():
-    total = await db.signals.count_documents({})
-    last_signals = await db.signals.find().sort("timestamp", -1).limit(10).to_list(10)
-
-    return {
-        "kpis": {
-            "total_signals": total,
-            "roi_avg": "74.3%",
-            "win_rate_avg": "88.1%",
-            "sharpe": 1.92
-        },
-        "latest": last_signals
-    }
-
 
 # routers/marketplace.py
 
-from fastapi import APIRouter, Request, Depends, HTTPException
+from fastapi import APIRouter, Request, Depends, HTTPException, Query
 from pydantic import BaseModel
-from datetime import datetime
+from typing import List, Optional
+from datetime import datetime, timedelta
 import stripe
+import json
 import os
 
-from utils.security import get_current_user
+from bson import ObjectId
+from utils.security import get_current_user, get_current_principal
+from utils.usage_rollups import query_usage, usage_series, GRANULARITIES
+from utils.stripe_gateway import stripe_gateway, price_catalog, StripeBusy, STRIPE_RETRY_AFTER
+from utils.stripe_events import enqueue_event, stripe_handler
+from utils.counters import incr
+from utils.kpi_engine import read_snapshot
+from utils.http_cache import cached_response, json_bytes, to_datetime
+from utils.signal_feed import fetch_page, FEED_DEFAULT_LIMIT, FEED_MAX_LIMIT
+from utils.singleflight import SingleFlight
 from database import db
 
 router = APIRouter()
+public_flight = SingleFlight("marketplace_public")
 
 # Stripe config
 stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
@@ -123,6 +124,13 @@ class SignalPurchaseRequest(BaseModel):
     buyer_id: str
     price_usd: float
 
+class Signal(BaseModel):
+    asset: str
+    timeframe: str
+    prediction: str
+    confidence: float
+    timestamp: datetime
+
 class CheckoutSessionRequest(BaseModel):
     customer_id: str
     plan_id: str
@@ -130,24 +138,106 @@ class CheckoutSessionRequest(BaseModel):
 
 # ---------- FACTURACIÓN POR USO ----------
 @router.post("/api/billing/log_usage")
-async def log_usage(log: UsageLog, user=Depends(get_current_user)):
+async def log_usage(log: UsageLog, user=Depends(get_current_principal)):
     if user.tenant_id != log.tenant_id:
         raise HTTPException(status_code=403, detail="⛔ Acceso denegado")
 
-    await db.usage_logs.insert_one({
+    usage = {
         "tenant_id": log.tenant_id,
         "api_calls": log.api_calls,
         "signals_consumed": log.signals_consumed,
         "executions": log.executions,
         "timestamp": datetime.utcnow()
-    })
+    }
+    enqueue_usage(usage)
 
     return {"status": "ok", "message": "✅ Uso registrado"}
 
+# ---------- USO AGREGADO (SLA / BILLING) ----------
+# Rollups minuto/hora/día (utils/usage_rollups.py); por defecto, el mes en curso
+def _usage_range(user, tenant_id: str, start: Optional[datetime], end: Optional[datetime]):
+    if user.tenant_id != tenant_id and user.role != "admin":
+        raise HTTPException(status_code=403, detail="⛔ Acceso denegado")
+    end = end or datetime.utcnow()
+    start = start or end.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="Rango inválido")
+    return start, end
+
+@router.get("/api/billing/usage")
+async def billing_usage(tenant_id: str, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                        user=Depends(get_current_principal)):
+    start, end = _usage_range(user, tenant_id, start, end)
+    return await query_usage(db, tenant_id, start, end)
+
+@router.get("/api/billing/usage/series")
+async def billing_usage_series(tenant_id: str, granularity: str = "hour", start: Optional[datetime] = None,
+                               end: Optional[datetime] = None, user=Depends(get_current_principal)):
+    if granularity not in GRANULARITIES:
+        raise HTTPException(status_code=400, detail="Granularidad inválida (minute, hour, day)")
+    start, end = _usage_range(user, tenant_id, start, end)
+    return {"tenant_id": tenant_id, "granularity": granularity,
+            "buckets": await usage_series(db, tenant_id, start, end, granularity)}
+
+async def _latest_signals_body() -> str:
+    signals = await db.signals.find().sort("timestamp", -1).limit(10).to_list(10)
+    return json_bytes(signals).decode("utf-8")
+
+# ---------- DASHBOARD PÚBLICO RESUMIDO (ETag/Last-Modified y 304) ----------
+@router.get("/api/marketplace/public_kpis")
+async def get_public_metrics(request: Request):
+    snapshot = await read_snapshot(db) or {}
+    latest = await public_flight.cached("latest_signals", _latest_signals_body)
+    kpis = json_bytes({
+        "total_signals": snapshot.get("total_signals", 0),
+        "roi_avg": f"{snapshot.get('avg_roi', 0.0) * 100:.1f}%",
+        "win_rate_avg": f"{snapshot.get('win_rate', 0.0) * 100:.1f}%",
+        "sharpe": snapshot.get("sharpe", 0.0)
+    })
+    # Las últimas señales ya vienen serializadas del cache: se insertan tal cual
+    body = b'{"kpis":' + kpis + b',"latest":' + latest.encode("utf-8") + b"}"
+    return cached_response(request, body, last_modified=snapshot.get("updated_at"))
+
+# ---------- SEÑALES PÚBLICAS (paginado por cursor) ----------
+# Orden (timestamp, _id) descendente; X-Next-Cursor trae el cursor opaco de
+# la página siguiente (ausente en la última). Las primeras páginas son las
+# que se consultan en polling: se cachean por combinación de filtros.
+@router.get("/api/marketplace/public_signals", response_model=List[Signal])
+async def list_public_signals(request: Request, asset: Optional[str] = None, timeframe: Optional[str] = None,
+                              prediction: Optional[str] = None,
+                              min_confidence: Optional[float] = Query(None, ge=0, le=1),
+                              limit: int = Query(FEED_DEFAULT_LIMIT, ge=1, le=FEED_MAX_LIMIT),
+                              cursor: Optional[str] = None):
+    filters = {"asset": asset, "timeframe": timeframe, "prediction": prediction}
+    try:
+        if cursor:
+            page = await _public_signals_page(filters, min_confidence, cursor, limit)
+        else:
+            key = json.dumps([asset, timeframe, prediction, min_confidence, limit])
+            page = await public_flight.cached(f"public_signals:{key}",
+                                              lambda: _public_signals_page(filters, min_confidence, None, limit))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+    # Valor cacheado: "<next_cursor>\n<json>"
+    next_cursor, _, body = page.partition("\n")
+    newest = json.loads(body)[:1]
+    response = cached_response(request, body.encode("utf-8"),
+                               last_modified=to_datetime(newest[0]["timestamp"]) if newest else None)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
+
+async def _public_signals_page(filters: dict, min_confidence: Optional[float], cursor: Optional[str],
+                               limit: int) -> str:
+    signals, next_cursor = await fetch_page(db, filters, min_confidence, cursor, limit)
+    return (next_cursor or "") + "\n" + json_bytes([Signal(**s) for s in signals]).decode("utf-8")
+
 # ---------- MARKETPLACE DE SEÑALES ----------
 @router.post("/api/marketplace/purchase_signal")
 async def purchase_signal(req: SignalPurchaseRequest, user=Depends(get_current_user)):
-    signal = await db.signals.find_one({"_id": req.signal_id})
+    # _id de señales: ObjectId; en compras el signal_id se guarda en hex
+    signal = await db.signals.find_one({"_id": ObjectId(req.signal_id)}) if ObjectId.is_valid(req.signal_id) else None
     if not signal:
         raise HTTPException(status_code=404, detail="❌ Señal no encontrada")
 
@@ -157,30 +247,48 @@ async def purchase_signal(req: SignalPurchaseRequest, user=Depends(get_current_u
         "price_usd": req.price_usd,
         "timestamp": datetime.utcnow()
     })
+    await incr(db, "purchases")
 
     return {"status": "ok", "access_granted": True}
 
 # ---------- STRIPE CHECKOUT DINÁMICO ----------
+@router.get("/api/checkout/plans")
+async def list_checkout_plans():
+    return {"plans": list(price_catalog.prices.values())}
+
 @router.post("/api/checkout/create")
 async def create_checkout_session(req: CheckoutSessionRequest):
+    # plan_id desconocido: se rechaza con el catálogo local, sin ir a Stripe
+    if not price_catalog.is_valid(req.plan_id):
+        raise HTTPException(status_code=400, detail="Plan inválido")
+
+    params = {
+        "customer": req.customer_id,
+        "payment_method_types": ["card"],
+        "line_items": [{
+            "price": req.plan_id,
+            "quantity": 1,
+        }],
+        "mode": "subscription",
+        "success_url": os.getenv("SUCCESS_URL", "https://zima.ai/success"),
+        "cancel_url": os.getenv("CANCEL_URL", "https://zima.ai/cancel"),
+    }
+    if req.promo_code:
+        params["discounts"] = [{"coupon": req.promo_code}]
     try:
-        session = stripe.checkout.Session.create(
-            customer=req.customer_id,
-            payment_method_types=["card"],
-            line_items=[{
-                "price": req.plan_id,
-                "quantity": 1,
-            }],
-            mode="subscription",
-            discounts=[{"coupon": req.promo_code}] if req.promo_code else [],
-            success_url=os.getenv("SUCCESS_URL", "https://zima.ai/success"),
-            cancel_url=os.getenv("CANCEL_URL", "https://zima.ai/cancel"),
-        )
+        session = await stripe_gateway.call("checkout.session.create",
+                                            lambda c: c.checkout.sessions.create_async(params=params))
         return {"checkout_url": session.url}
+    except StripeBusy:
+        raise HTTPException(status_code=503, detail="Servicio saturado, reintentá en unos segundos",
+                            headers={"Retry-After": str(STRIPE_RETRY_AFTER)})
+    except TimeoutError:
+        raise HTTPException(status_code=504, detail="Stripe no respondió a tiempo")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # ---------- WEBHOOK DE STRIPE ----------
+# Solo verifica y encola (utils/stripe_events.py): el worker aplica el evento
 @router.post("/api/stripe/webhook")
 async def stripe_webhook(request: Request):
     payload = await request.body()
@@ -192,13 +300,18 @@ async def stripe_webhook(request: Request):
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Webhook inválido: {str(e)}")
 
-    if event["type"] == "customer.subscription.updated":
-        subscription = event["data"]["object"]
-        customer_id = subscription["customer"]
-        plan_id = subscription["items"]["data"][0]["price"]["id"]
-        await db.tenants.update_one(
-            {"stripe_customer_id": customer_id},
-            {"$set": {"active_plan_id": plan_id}}
-        )
-
+    await enqueue_event(db, event, payload)
     return {"received": True}
+
+@stripe_handler("customer.subscription.updated")
+async def apply_subscription_updated(event: dict):
+    subscription = event["data"]["object"]
+    customer_id = subscription["customer"]
+    plan_id = subscription["items"]["data"][0]["price"]["id"]
+    # Stripe no garantiza el orden: un evento más viejo no pisa uno más nuevo
+    created = datetime.utcfromtimestamp(event.get("created", 0))
+    await db.tenants.update_one(
+        {"stripe_customer_id": customer_id,
+         "$or": [{"stripe_event_at": {"$exists": False}}, {"stripe_event_at": {"$lte": created}}]},
+        {"$set": {"active_plan_id": plan_id, "stripe_event_at": created}}
+    )
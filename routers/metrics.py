@@ -1,98 +1,21 @@
 
 # routers/metrics.py
 
-from fastapi import APIRouter, HTTPException, Depends
-from pydantic import BaseModel
-from typing import Dict, List
-from datetime import datetime
-import random
-import json
+from typing import Dict
 import os
 
-router = APIRouter()
+from utils.metrics_snapshot import KPI, MetricsSnapshot
 
-# Ruta de simulación para métricas
-METRICS_PATH = "data/metrics.json"
 os.makedirs("data", exist_ok=True)
 
-# ================================
-# MODELOS
-# ================================
-class KPI(BaseModel):
-    total_signals: int
-    win_rate: float
-    avg_rating: float
-    avg_roi: float
-    active_users: int
-    model_version: str
-    updated_at: datetime
+# Documento de métricas en memoria (utils/metrics_snapshot.py): las respuestas
+# de /metrics/kpis y /metrics/public/dashboard (router montado, al final del
+# módulo) ya vienen serializadas
+metrics_snapshot = MetricsSnapshot()
 
-# ================================
-# Helpers de lectura
-# ================================
 def load_metrics() -> Dict:
-    if not os.path.exists(METRICS_PATH):
-        return {
-            "total_signals": 4200,
-            "win_rate": 0.864,
-            "avg_rating": 4.6,
-            "avg_roi": 0.72,
-            "active_users": 137,
-            "model_version": "ZIMA-RL-v5",
-            "updated_at": datetime.utcnow().isoformat()
-        }
-    with open(METRICS_PATH, "r") as f:
-        return json.load(f)
-
-# ================================
-# ENDPOINT: KPIs globales (públicos)
-# ================================
-@router.get("/metrics/kpis", response_model=KPI)
-async def get_kpis():
-    data = load_metrics()
-    return KPI(**data)
-
-# ================================
-# ENDPOINT: Métricas específicas de una señal
-# ================================
-@router.get("/metrics/signal/{signal_id}")
-async def get_signal_metrics(signal_id: str):
-    # Simulación de feedback por señal (reemplazar con DB)
-    fake_feedback = [
-        {"rating": random.randint(3, 5), "was_profitable": random.choice([True, True, False])}
-        for _ in range(random.randint(5, 20))
-    ]
-    if not fake_feedback:
-        raise HTTPException(status_code=404, detail="No hay métricas para esa señal")
-
-    avg_rating = sum(f["rating"] for f in fake_feedback) / len(fake_feedback)
-    win_rate = sum(1 for f in fake_feedback if f["was_profitable"]) / len(fake_feedback)
-
-    return {
-        "signal_id": signal_id,
-        "feedback_count": len(fake_feedback),
-        "avg_rating": round(avg_rating, 2),
-        "win_rate": round(win_rate * 100, 2)
-    }
-
-# ================================
-# ENDPOINT: Dashboard público (resumen)
-# ================================
-@router.get("/public/dashboard")
-async def public_dashboard_summary():
-    data = load_metrics()
-    return {
-        "status": "✅ ZIMA Metrics API Online",
-        "global_metrics": {
-            "signals_generated": data["total_signals"],
-            "average_roi": f"{round(data['avg_roi'] * 100, 2)}%",
-            "win_rate": f"{round(data['win_rate'] * 100, 2)}%",
-            "active_users": data["active_users"],
-            "model_version": data["model_version"]
-        },
-        "last_update": data["updated_at"]
-    }
-
+    metrics_snapshot.refresh()
+    return metrics_snapshot.data
 
 # routers/metrics.py
 
@@ -121,8 +44,11 @@ class UserSignalMetric(BaseModel):
     symbol: str
     timeframe: str
     roi: float
+    roi_total: float = 0.0
     win_rate: float
     avg_holding: float
+    sharpe: float = 0.0
+    drawdown: float = 0.0
     updated_at: datetime
 
 # =============================
@@ -135,14 +61,6 @@ async def get_global_metrics():
         raise HTTPException(status_code=404, detail="No hay métricas registradas")
     return KPISummary(**kpi)
 
-# =============================
-# KPIs por usuario logueado
-# =============================
-@router.get("/user", response_model=List[UserSignalMetric])
-async def get_user_metrics(user=Depends(get_current_user)):
-    metrics = await db.user_kpis.find({"user_id": user.id}).to_list(100)
-    return [UserSignalMetric(**m) for m in metrics]
-
 # =============================
 # Endpoint de status del sistema
 # =============================
@@ -156,19 +74,11 @@ async def health_check():
 
 # routers/metrics.py
 
-from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from datetime import datetime
-from database import db
-from utils.security import get_current_user
-import redis
-import json
-
-router = APIRouter(prefix="/metrics", tags=["metrics"])
-r = redis.Redis(host="localhost", port=6379, db=0)
 
 # ============================
-# Modelos de respuesta
+# Modelos de respuesta (los usa el router montado: /public y /me)
 # ============================
 class KPIResponse(BaseModel):
     roi: float
@@ -178,51 +88,15 @@ class KPIResponse(BaseModel):
     total_signals: int
     updated_at: datetime
 
-# ============================
-# Endpoint: KPIs públicos
-# ============================
-@router.get("/public", response_model=KPIResponse)
-async def get_public_kpis():
-    data = r.get("public:kpis:latest")
-    if not data:
-        raise HTTPException(status_code=404, detail="KPIs no disponibles")
-    parsed = json.loads(data)
-    return KPIResponse(**parsed)
-
-# ============================
-# Endpoint: KPIs personalizados por usuario
-# ============================
-@router.get("/me", response_model=KPIResponse)
-async def get_user_kpis(user=Depends(get_current_user)):
-    key = f"user:kpis:{user.id}"
-    data = r.get(key)
-    if not data:
-        raise HTTPException(status_code=404, detail="KPIs del usuario no disponibles")
-    parsed = json.loads(data)
-    return KPIResponse(**parsed)
-
-# ============================
-# Endpoint: KPI de señales totales históricas
-# ============================
-@router.get("/summary")
-async def get_kpi_summary():
-    count = await db.signals.count_documents({})
-    last_signal = await db.signals.find().sort("created_at", -1).limit(1).to_list(1)
-    return {
-        "total_signals": count,
-        "last_signal_at": last_signal[0]["created_at"] if last_signal else None,
-        "active_model": "ZIMA-RL-Boosted-v5",
-        "version": "1.0.154"
-    }
-
 
 # routers/metrics.py
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from typing import Dict
 from datetime import datetime
-import random
+from database import db
+from utils.kpi_engine import read_snapshot
 
 router = APIRouter(prefix="/api/metrics", tags=["Metrics"])
 
@@ -236,45 +110,119 @@ class KPIMetrics(BaseModel):
     active_models: int
     last_updated: datetime
 
-# Simulación — en producción debe venir desde Redis, DB o sistema de señales
-def get_global_kpis() -> Dict:
-    return {
-        "total_signals": 21394,
-        "win_rate": round(random.uniform(0.82, 0.91), 4),
-        "avg_roi": round(random.uniform(0.53, 0.78), 4),
-        "drawdown_avg": round(random.uniform(0.03, 0.07), 4),
-        "sharpe_ratio": round(random.uniform(1.8, 2.4), 2),
-        "active_models": 4,
-        "last_updated": datetime.utcnow()
-    }
+# Snapshot del motor de KPIs (utils/kpi_engine.py), el mismo que leen los demás endpoints
+async def get_global_kpis() -> Dict:
+    snapshot = await read_snapshot(db)
+    if not snapshot:
+        raise HTTPException(status_code=503, detail="KPIs aún no calculados")
+    return snapshot
 
 @router.get("/global", response_model=KPIMetrics)
 async def get_metrics():
-    return get_global_kpis()
+    return await get_global_kpis()
 
 
 # routers/metrics.py
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from pydantic import BaseModel, Field
 from datetime import datetime
 from typing import List, Dict
-import redis
 import json
 
+from database import db
+from utils.redis_pool import get_redis
+from utils.security import get_current_user
+from utils.singleflight import SingleFlight
+from utils.counters import get_count
+from utils.security import get_current_principal
+from utils.signal_feedback import record_feedback, get_feedback, get_feedback_bulk, summarize, MAX_BULK_SIGNALS
+from utils.http_cache import cached_response, json_bytes, make_etag, to_datetime
+from utils.kpi_engine import read_snapshot
+
+summary_flight = SingleFlight("metrics_summary")
+
 router = APIRouter(prefix="/metrics", tags=["KPIs & Metrics"])
 
-# Redis config (se asume host local, en producción puede ir en .env)
-r = redis.Redis(host="localhost", port=6379, decode_responses=True)
+# ===============================
+# ENDPOINT: KPIs del archivo de métricas (pre-serializados)
+# ===============================
+@router.get("/kpis", response_model=KPI)
+async def get_kpis():
+    return metrics_snapshot.kpis_response()
+
+# ===============================
+# ENDPOINT: Dashboard público (resumen)
+# ===============================
+@router.get("/public/dashboard")
+async def public_dashboard_summary(request: Request):
+    return metrics_snapshot.dashboard_response(request)
+
+# ===============================
+# ENDPOINT: KPIs públicos (KPIResponse, con ETag/Last-Modified y 304)
+# ===============================
+@router.get("/public", response_model=KPIResponse)
+async def get_public_kpis(request: Request):
+    data = await get_redis().get("public:kpis:latest")
+    # Clave vencida o borrada: snapshot de Mongo, leído una sola vez por proceso
+    snapshot = json.loads(data) if data else await read_snapshot(db)
+    if not snapshot:
+        raise HTTPException(status_code=404, detail="KPIs no disponibles")
+    parsed = KPIResponse(**snapshot)
+    body = json_bytes(parsed)
+    return cached_response(request, body, etag=make_etag(snapshot.get("version", body)),
+                           last_modified=parsed.updated_at)
+
+# ===============================
+# ENDPOINT: KPI de señales totales históricas (single-flight + cache en Redis)
+# ===============================
+@router.get("/summary")
+async def get_kpi_summary():
+    body = await summary_flight.cached("global", _build_summary)
+    return Response(content=body, media_type="application/json")
+
+async def _build_summary() -> str:
+    count = await get_count(db, "signals")
+    last_signal = await db.signals.find().sort("created_at", -1).limit(1).to_list(1)
+    return json_bytes({
+        "total_signals": count,
+        "last_signal_at": last_signal[0]["created_at"] if last_signal else None,
+        "active_model": "ZIMA-RL-Boosted-v5",
+        "version": "1.0.154"
+    }).decode("utf-8")
+
+# ===============================
+# ENDPOINT: KPIs por usuario logueado (batch de utils/user_kpis.py)
+# ===============================
+@router.get("/user", response_model=List[UserSignalMetric])
+async def get_user_metrics(user=Depends(get_current_user)):
+    metrics = await db.user_kpis.find({"user_id": user.id}).to_list(100)
+    return [UserSignalMetric(**m) for m in metrics]
+
+@router.get("/me", response_model=KPIResponse)
+async def get_user_kpis(user=Depends(get_current_user)):
+    data = await get_redis().get(f"user:kpis:{user.id}")
+    if not data:
+        raise HTTPException(status_code=404, detail="KPIs del usuario no disponibles")
+    return KPIResponse(**json.loads(data))
 
 # ===============================
 # ENDPOINT: KPIs globales de ZIMA
 # ===============================
 @router.get("/kpis/global")
-async def get_global_kpis():
+async def get_global_kpis(request: Request):
     try:
-        data = r.get("zima:kpis:global")
+        data = await get_redis().get("zima:kpis:global")
         if data:
-            return json.loads(data)
+            # El snapshot ya está serializado: se reenvía tal cual
+            snapshot = json.loads(data)
+            return cached_response(request, data.encode("utf-8"), etag=make_etag(snapshot.get("version", data)),
+                                   last_modified=to_datetime(snapshot.get("updated_at")))
+        snapshot = await read_snapshot(db)
+        if snapshot:
+            body = json_bytes(snapshot)
+            return cached_response(request, body, etag=make_etag(snapshot.get("version", body)),
+                                   last_modified=to_datetime(snapshot.get("updated_at")))
         else:
             raise HTTPException(status_code=404, detail="No hay KPIs globales cargados.")
     except Exception as e:
@@ -287,7 +235,7 @@ async def get_global_kpis():
 async def get_tenant_kpis(tenant_id: str):
     key = f"zima:kpis:tenant:{tenant_id}"
     try:
-        data = r.get(key)
+        data = await get_redis().get(key)
         if data:
             return json.loads(data)
         else:
@@ -299,13 +247,46 @@ async def get_tenant_kpis(tenant_id: str):
 # ENDPOINT: Últimas señales públicas
 # ===============================
 @router.get("/signals/public", response_model=List[Dict])
-async def get_public_signals():
+async def get_public_signals(request: Request):
     try:
-        signals = r.lrange("zima:signals:public", -10, -1)
-        return [json.loads(s) for s in signals]
+        signals = await get_redis().lrange("zima:signals:public", -10, -1)
+        body = ("[" + ",".join(signals) + "]").encode("utf-8")
+        return cached_response(request, body)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al recuperar señales: {str(e)}")
 
+class SignalFeedback(BaseModel):
+    rating: int = Field(..., ge=1, le=5)
+    was_profitable: bool
+
+class BulkFeedbackRequest(BaseModel):
+    signal_ids: List[str] = Field(..., min_length=1, max_length=MAX_BULK_SIGNALS)
+
+# ===============================
+# ENDPOINT: Métricas específicas de una señal
+# ===============================
+@router.get("/signal/{signal_id}")
+async def get_signal_metrics(signal_id: str):
+    summary = await get_feedback(db, signal_id)
+    if not summary:
+        raise HTTPException(status_code=404, detail="No hay métricas para esa señal")
+    return summary
+
+# ===============================
+# ENDPOINT: Registrar feedback de una señal
+# ===============================
+@router.post("/signal/{signal_id}/feedback")
+async def post_signal_feedback(signal_id: str, feedback: SignalFeedback, user=Depends(get_current_principal)):
+    doc = await record_feedback(db, signal_id, feedback.rating, feedback.was_profitable)
+    return summarize(signal_id, doc)
+
+# ===============================
+# ENDPOINT: Métricas de varias señales a la vez
+# ===============================
+@router.post("/signals/feedback")
+async def get_signals_metrics(req: BulkFeedbackRequest):
+    return await get_feedback_bulk(db, req.signal_ids)
+
 # ===============================
 # ENDPOINT: Estado del sistema
 # ===============================
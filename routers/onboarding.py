@@ -9,6 +9,8 @@ import os
 import httpx
 
 from utils.security import get_current_user
+from utils.telemetry import timed
+from utils.counters import claim_slot
 from database import db  # conexión a Mongo o similar
 
 router = APIRouter(prefix="/community", tags=["community"])
@@ -32,18 +34,19 @@ async def onboarding_gpt(req: OnboardingRequest):
     """
 
     async with httpx.AsyncClient() as client:
-        response = await client.post(
-            "https://api.openai.com/v1/chat/completions",
-            headers={
-                "Authorization": f"Bearer {os.getenv('OPENAI_API_KEY')}",
-                "Content-Type": "application/json"
-            },
-            json={
-                "model": "gpt-4",
-                "messages": [{"role": "user", "content": prompt}],
-                "temperature": 0.7
-            }
-        )
+        with timed("openai", "chat.completions"):
+            response = await client.post(
+                "https://api.openai.com/v1/chat/completions",
+                headers={
+                    "Authorization": f"Bearer {os.getenv('OPENAI_API_KEY')}",
+                    "Content-Type": "application/json"
+                },
+                json={
+                    "model": "gpt-4",
+                    "messages": [{"role": "user", "content": prompt}],
+                    "temperature": 0.7
+                }
+            )
         content = response.json()["choices"][0]["message"]["content"]
 
     return {"tutorial": content}
@@ -51,10 +54,13 @@ async def onboarding_gpt(req: OnboardingRequest):
 # ---------- REGISTRO DE FOUNDING MEMBERS ----------
 @router.post("/founding_member")
 async def register_founding_member(req: FoundingMemberRequest):
-    count = await db.founding_members.count_documents({})
-    if count >= 15:
+    # Cupo reservado de forma atómica en el contador: sin carreras entre requests
+    number = await claim_slot(db, "founding_member_slots", 15)
+    if number is None:
         raise HTTPException(status_code=403, detail="Límite de Founding Members alcanzado")
 
+    # Si el alta falla el número no se devuelve (otro request puede tener ya el
+    # siguiente); se recupera con `python -m utils.counters reclaim`
     await db.founding_members.insert_one({
         "user_id": req.user_id,
         "payment_proof": req.payment_proof,
@@ -63,7 +69,8 @@ async def register_founding_member(req: FoundingMemberRequest):
             "access": "lifetime",
             "priority_support": True
         },
+        "founding_member_number": number,
         "joined_at": datetime.utcnow()
     })
 
-    return {"status": "registrado", "founding_member_number": count + 1}
+    return {"status": "registrado", "founding_member_number": number}
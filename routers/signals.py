@@ -0,0 +1,103 @@
+
+# routers/signals.py
+
+from fastapi import APIRouter, Depends, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from datetime import datetime
+
+from database import db
+from utils.security import get_current_principal
+from utils.signal_hub import signal_hub, HubFull, SIGNAL_HUB_KEEPALIVE
+from utils.signal_ingest import ingest_signals, SIGNALS_INGEST_MAX_BATCH
+
+router = APIRouter(tags=["Signals"])
+
+# ===============================
+# Modelos
+# ===============================
+class SignalIn(BaseModel):
+    # Opcional: con id propio (ObjectId en hex) los reintentos no duplican
+    id: Optional[str] = Field(None, pattern="^[0-9a-fA-F]{24}$")
+    asset: str
+    timeframe: str
+    prediction: str
+    confidence: float = Field(..., ge=0, le=1)
+    timestamp: Optional[datetime] = None
+    model_version: Optional[str] = None
+    roi: Optional[float] = None
+    closed_at: Optional[datetime] = None
+
+class SignalBatch(BaseModel):
+    signals: List[SignalIn] = Field(..., min_length=1, max_length=SIGNALS_INGEST_MAX_BATCH)
+
+# ===============================
+# Ingesta desde el pipeline de modelos
+# ===============================
+@router.post("/bulk")
+async def ingest_signal_batch(batch: SignalBatch, user=Depends(get_current_principal)):
+    if user.role != "admin":
+        raise HTTPException(status_code=403, detail="No autorizado")
+    return await ingest_signals(db, [s.dict() for s in batch.signals])
+
+# ===============================
+# Señales en tiempo real (reemplazo del polling)
+# ===============================
+# Cada conexión es un suscriptor del hub del worker; `asset` filtra del lado
+# del servidor. Un cliente que no consume a tiempo se desconecta: al
+# reconectarse conviene releer /marketplace/api/marketplace/public_signals para cubrir el hueco.
+
+# ---------- SSE ----------
+@router.get("/stream")
+async def stream_signals(request: Request, asset: Optional[str] = None):
+    try:
+        subscriber = signal_hub.subscribe(asset)
+    except HubFull:
+        raise HTTPException(status_code=503, detail="Servicio saturado, reintentá en unos segundos",
+                            headers={"Retry-After": "5"})
+
+    async def events():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    message = await subscriber.next(SIGNAL_HUB_KEEPALIVE)
+                except ConnectionAbortedError:
+                    yield "event: evicted\ndata: {}\n\n"
+                    return
+                if message is None:
+                    if await request.is_disconnected():
+                        return
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: signal\ndata: {message}\n\n"
+        finally:
+            signal_hub.unsubscribe(subscriber)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# ---------- WEBSOCKET ----------
+@router.websocket("/ws")
+async def signals_ws(websocket: WebSocket, asset: Optional[str] = None):
+    try:
+        subscriber = signal_hub.subscribe(asset)
+    except HubFull:
+        await websocket.close(code=1013)
+        return
+
+    await websocket.accept()
+    try:
+        while True:
+            try:
+                message = await subscriber.next(SIGNAL_HUB_KEEPALIVE)
+            except ConnectionAbortedError:
+                await websocket.close(code=1013, reason="Cliente demasiado lento")
+                return
+            # Sin señales nuevas: un ping para detectar conexiones muertas
+            await websocket.send_text(message if message is not None else '{"type":"ping"}')
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        signal_hub.unsubscribe(subscriber)
@@ -0,0 +1,101 @@
+# tests/test_api_keys.py
+
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__ + "/..")))
+
+import pytest
+from utils.api_keys import PartnerKeyAuth
+from utils.license_store import LicenseStore
+
+
+def test_negative_cache_short_circuits_invalid_keys(tmp_path):
+    store = LicenseStore(str(tmp_path / "licenses.json"), recheck_interval=60)
+    auth = PartnerKeyAuth(store)
+
+    for _ in range(10):
+        assert auth.authenticate("bad-key") is None
+    assert auth.store_lookups == 1
+    assert auth.stats()["negative_cache"]["hits"] == 9
+
+
+def test_create_and_revoke_propagate_immediately(tmp_path):
+    store = LicenseStore(str(tmp_path / "licenses.json"), recheck_interval=60)
+    auth = PartnerKeyAuth(store)
+    assert auth.authenticate("k1") is None  # queda en la cache negativa
+
+    store.add({"id": "l1", "api_key": "k1", "partner_name": "acme", "active": True})
+    assert auth.authenticate("k1")["partner_name"] == "acme"
+    assert auth.authenticate("k1")["partner_name"] == "acme"
+    assert auth.stats()["positive_cache"]["hits"] == 1
+
+    store.update("l1", active=False)
+    assert auth.authenticate("k1") is None
+
+
+def test_partner_middleware_inside_cors(tmp_path):
+    from fastapi import FastAPI
+    from fastapi.middleware.cors import CORSMiddleware
+    from fastapi.testclient import TestClient
+    from utils.api_keys import PartnerKeyMiddleware
+
+    store = LicenseStore(str(tmp_path / "licenses.json"), recheck_interval=60)
+    store.add({"id": "l1", "api_key": "k1", "partner_name": "acme", "active": True})
+    app = FastAPI()
+
+    @app.get("/partner/data")
+    def data():
+        return {"ok": True}
+
+    # Mismo orden que main.py: la middleware de partners queda por dentro de CORS
+    app.add_middleware(PartnerKeyMiddleware, prefixes=["/partner"], auth=PartnerKeyAuth(store))
+    app.add_middleware(CORSMiddleware, allow_origins=["https://zima.ia"], allow_methods=["*"], allow_headers=["*"])
+    client = TestClient(app)
+    origin = {"Origin": "https://zima.ia"}
+
+    preflight = client.options("/partner/data", headers={**origin, "Access-Control-Request-Method": "GET",
+                                                          "Access-Control-Request-Headers": "x-api-key"})
+    assert preflight.status_code == 200
+
+    denied = client.get("/partner/data", headers=origin)
+    assert denied.status_code == 401
+    assert denied.headers["access-control-allow-origin"] == "https://zima.ia"
+
+    assert client.get("/partner/data", headers={**origin, "X-API-Key": "k1"}).json() == {"ok": True}
+
+
+def test_partner_keys_store_backs_partner_auth(tmp_path):
+    # Mismo flujo que /api/licenses/generate y /revoke: alta por nombre, baja borrando
+    store = LicenseStore(str(tmp_path / "partner_keys.json"), recheck_interval=60, root_key="partners")
+    auth = PartnerKeyAuth(store)
+    assert store.insert("acme", {"api_key": "k1", "partner_name": "acme", "stripe_customer_id": "cus_1"})
+    assert not store.insert("acme", {"api_key": "k2", "partner_name": "acme"})
+    assert auth.authenticate("k1")["partner_name"] == "acme"
+    assert list(store.as_dict()) == ["acme"]
+
+    assert store.delete("acme")
+    assert auth.authenticate("k1") is None
+
+
+def test_generated_key_authenticates_until_revoked(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    # App completa: se omite si faltan dependencias de otros routers
+    main = pytest.importorskip("main")
+    from utils import api_keys
+    from routers import licenses
+
+    store = LicenseStore(str(tmp_path / "partner_keys.json"), recheck_interval=60, root_key="partners")
+    monkeypatch.setattr(licenses, "partner_key_store", store)
+    monkeypatch.setattr(api_keys, "partner_auth", PartnerKeyAuth(store))
+    client = TestClient(main.app)
+    base = "/licenses/api/licenses"
+
+    key = client.post(f"{base}/generate", json={"partner_name": "acme", "stripe_customer_id": "cus_1"}).json()["api_key"]
+    response = client.get(f"{base}/partner", headers={"X-API-Key": key})
+    assert response.status_code == 200
+    assert response.json()["partner"]["partner_name"] == "acme"
+
+    assert client.request("DELETE", f"{base}/revoke", data={"partner_name": "acme"}).status_code == 200
+    assert client.get(f"{base}/partner", headers={"X-API-Key": key}).status_code == 401
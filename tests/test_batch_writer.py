@@ -0,0 +1,113 @@
+# tests/test_batch_writer.py
+
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__ + "/..")))
+
+import asyncio
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+from utils.batch_writer import BatchWriter, BatchWriterFull
+
+
+@pytest.mark.asyncio
+async def test_flushes_by_size_and_feeds_on_flush():
+    db = AsyncMongoMockClient()["zima"]
+    batches = []
+
+    async def on_flush(docs):
+        batches.append(len(docs))
+
+    writer = BatchWriter("test_size", db.usage_logs, on_flush=on_flush, max_batch=10, max_delay_ms=5_000)
+    for i in range(25):
+        writer.submit({"n": i})
+    # Dos lotes llenos sin esperar el timer; el resto queda hasta el drain
+    for _ in range(50):
+        if writer.stats()["flushes"] >= 2:
+            break
+        await asyncio.sleep(0.01)
+    assert batches == [10, 10]
+
+    await writer.stop()
+    assert batches == [10, 10, 5]
+    assert await db.usage_logs.count_documents({}) == 25
+    stats = writer.stats()
+    assert stats["written"] == 25 and stats["queue_depth"] == 0 and stats["flushes"] == 3
+
+
+@pytest.mark.asyncio
+async def test_flushes_by_time():
+    db = AsyncMongoMockClient()["zima"]
+    writer = BatchWriter("test_time", db.usage_logs, max_batch=100, max_delay_ms=20)
+    try:
+        writer.submit({"n": 1})
+        writer.submit({"n": 2})
+        await asyncio.sleep(0.1)
+        assert await db.usage_logs.count_documents({}) == 2
+        assert writer.stats()["last_batch"] == 2
+    finally:
+        await writer.stop()
+
+
+@pytest.mark.asyncio
+async def test_bounded_queue_rejects_and_closed_writer_rejects():
+    db = AsyncMongoMockClient()["zima"]
+    writer = BatchWriter("test_bounded", db.usage_logs, max_batch=100, max_delay_ms=5_000, max_queue=3)
+    for i in range(3):
+        writer.submit({"n": i})
+    with pytest.raises(BatchWriterFull):
+        writer.submit({"n": 3})
+    assert writer.stats()["rejected"] == 1
+
+    await writer.stop()
+    assert await db.usage_logs.count_documents({}) == 3
+    with pytest.raises(BatchWriterFull):
+        writer.submit({"n": 4})
+
+
+def test_write_concern_from_env():
+    from utils.batch_writer import write_concern_from_env
+
+    assert write_concern_from_env(None, None) is None
+    assert write_concern_from_env("majority", "true").document == {"w": "majority", "j": True}
+    assert write_concern_from_env("0", None).document == {"w": 0}
+
+
+class FlakyCollection:
+    # Primer intento: escribe y pierde la respuesta (AutoReconnect). Reintento:
+    # los ya escritos vuelven como clave duplicada, más un rechazo real.
+    def __init__(self):
+        self.stored = {}
+        self.calls = 0
+
+    async def insert_many(self, docs, ordered=False):
+        from pymongo.errors import AutoReconnect, BulkWriteError
+        self.calls += 1
+        if self.calls == 1:
+            for i, doc in enumerate(docs[:2]):
+                self.stored[i] = doc
+            raise AutoReconnect("connection reset")
+        errors = [{"index": i, "code": 11000, "errmsg": "E11000 duplicate key"} for i in self.stored]
+        errors.append({"index": 2, "code": 121, "errmsg": "Document failed validation"})
+        for i in range(3, len(docs)):
+            self.stored[i] = docs[i]
+        raise BulkWriteError({"writeErrors": errors, "nInserted": len(docs) - 3})
+
+
+@pytest.mark.asyncio
+async def test_retry_counts_duplicates_from_the_lost_attempt_as_written():
+    flushed = []
+
+    async def on_flush(docs):
+        flushed.extend(d["n"] for d in docs)
+
+    collection = FlakyCollection()
+    writer = BatchWriter("test_retry", collection, on_flush=on_flush, max_batch=5, max_delay_ms=5_000)
+    await writer._flush([{"n": i} for i in range(5)])
+
+    assert collection.calls == 2
+    assert flushed == [0, 1, 3, 4]
+    stats = writer.stats()
+    assert stats["written"] == 4 and stats["failed"] == 1 and stats["dropped"] == 0
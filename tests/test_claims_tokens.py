@@ -0,0 +1,92 @@
+# tests/test_claims_tokens.py
+
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__ + "/..")))
+
+import fakeredis
+import pytest
+from fakeredis.aioredis import FakeAsyncRedisConnection
+from utils import redis_pool, security
+from utils.token_revocation import TokenRevocations
+
+
+class FakeUser:
+    id = 42
+    email = "admin@zima.ai"
+    role = "admin"
+    plan = "pro"
+    tenant_id = "tenant-1"
+
+
+def init_fake_redis(server=None):
+    pool = redis_pool.build_pool(connection_class=FakeAsyncRedisConnection, server=server or fakeredis.FakeServer(),
+                                 health_check_interval=0)
+    return redis_pool.init_redis(pool)
+
+
+def demoted_lookup(monkeypatch):
+    demoted = FakeUser()
+    demoted.role = "user"
+    lookups = []
+
+    async def fake_lookup(token, db):
+        lookups.append(token)
+        return demoted
+
+    monkeypatch.setattr(security, "get_current_user", fake_lookup)
+    return lookups
+
+
+@pytest.mark.asyncio
+async def test_claims_token_authorizes_without_lookup(monkeypatch):
+    init_fake_redis()
+    monkeypatch.setattr(security, "token_revocations", TokenRevocations())
+    try:
+        async def fail_lookup(*args, **kwargs):
+            raise AssertionError("no debería consultar la DB")
+
+        monkeypatch.setattr(security, "get_current_user", fail_lookup)
+        token = await security.create_claims_token(FakeUser())
+        principal = await security.get_current_principal(token)
+        assert principal.role == "admin"
+        assert principal.tenant_id == "tenant-1"
+    finally:
+        await redis_pool.close_redis()
+
+
+@pytest.mark.asyncio
+async def test_invalidated_claims_fall_back_to_lookup_in_every_worker(monkeypatch):
+    init_fake_redis()
+    monkeypatch.setattr(security, "token_revocations", TokenRevocations())
+    try:
+        token = await security.create_claims_token(FakeUser())
+        lookups = demoted_lookup(monkeypatch)
+        await security.invalidate_principal(user_id=42)
+        principal = await security.get_current_principal(token)
+        assert lookups == [token]
+        assert principal.role == "user"
+
+        # Otro worker (o este mismo tras reiniciar) ve la revocación desde Redis
+        monkeypatch.setattr(security, "token_revocations", TokenRevocations())
+        await security.get_current_principal(token)
+        assert len(lookups) == 2
+    finally:
+        await redis_pool.close_redis()
+
+
+@pytest.mark.asyncio
+async def test_claims_are_not_trusted_without_redis(monkeypatch):
+    init_fake_redis(fakeredis.FakeServer())
+    redis_pool.get_redis().connection_pool.connection_kwargs["server"].connected = False
+    monkeypatch.setattr(security, "token_revocations", TokenRevocations())
+    try:
+        token = security.create_access_token({"sub": FakeUser.email, "uid": 42, "role": "admin", "ver": 0,
+                                              "typ": "claims"})
+        lookups = demoted_lookup(monkeypatch)
+        principal = await security.get_current_principal(token)
+        assert lookups == [token] and principal.role == "user"
+        assert security.token_revocations.stats()["sync_errors"] >= 1
+    finally:
+        await redis_pool.close_redis()
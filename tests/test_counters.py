@@ -0,0 +1,63 @@
+# tests/test_counters.py
+
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__ + "/..")))
+
+import asyncio
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+from utils import counters
+
+
+@pytest.mark.asyncio
+async def test_counter_is_seeded_once_then_maintained_on_write():
+    db = AsyncMongoMockClient()["zima"]
+    await db.signals.insert_many([{"n": i} for i in range(3)])
+
+    assert await counters.get_count(db, "signals") == 3
+    await db.signals.insert_one({"n": 3})
+    await counters.incr(db, "signals")
+    assert await counters.get_count(db, "signals") == 4
+
+    # Escritura por fuera de la app: la reconciliación corrige la deriva
+    await db.signals.delete_many({"n": {"$lt": 2}})
+    assert await counters.get_count(db, "signals") == 4
+    await counters.reconcile_all(db)
+    assert await counters.get_count(db, "signals") == 2
+
+
+@pytest.mark.asyncio
+async def test_group_reconciliation_resets_empty_groups():
+    db = AsyncMongoMockClient()["zima"]
+    await db.users.insert_many([{"plan": "pro"}, {"plan": "pro"}, {"plan": "freemium"}])
+    await counters.reconcile_all(db)
+    assert await counters.get_counts(db, ["users", "users:plan:pro", "users:plan:freemium"]) == {
+        "users": 3, "users:plan:pro": 2, "users:plan:freemium": 1
+    }
+
+    await db.users.update_many({"plan": "freemium"}, {"$set": {"plan": "pro"}})
+    await counters.reconcile_all(db)
+    counts = await counters.get_counts(db, ["users:plan:pro", "users:plan:freemium", "users:plan:enterprise"])
+    assert counts == {"users:plan:pro": 3, "users:plan:freemium": 0, "users:plan:enterprise": 0}
+
+
+@pytest.mark.asyncio
+async def test_claim_slot_never_exceeds_the_limit():
+    db = AsyncMongoMockClient()["zima"]
+    await db.founding_members.insert_many([{"user_id": "a"}, {"user_id": "b"}])
+
+    results = await asyncio.gather(*(counters.claim_slot(db, "founding_member_slots", 5) for _ in range(10)))
+    assert sorted(r for r in results if r is not None) == [3, 4, 5]
+    assert results.count(None) == 7
+
+    # Un alta fallida no devuelve el número: nunca se repite uno ya entregado
+    await db.founding_members.insert_many([{"founding_member_number": n} for n in (3, 4)])
+    assert await counters.claim_slot(db, "founding_member_slots", 5) is None
+    # El 5 quedó sin usar: reclaim lo devuelve al cupo
+    assert await counters.reclaim_slots(db, "founding_member_slots", "founding_member_number") == 4
+    assert await counters.claim_slot(db, "founding_member_slots", 5) == 5
+    # Los cupos no se recuentan en la reconciliación periódica
+    assert "founding_member_slots" not in await counters.reconcile_all(db)
@@ -0,0 +1,33 @@
+# tests/test_db_engine.py
+
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__ + "/..")))
+
+from sqlalchemy import text
+from models.engine import build_engine, pool_stats, InstrumentedQueuePool
+
+
+def test_pool_stats_track_checkouts(tmp_path):
+    engine = build_engine(f"sqlite:///{tmp_path}/pool.db", pool_size=2, max_overflow=1)
+    assert isinstance(engine.pool, InstrumentedQueuePool)
+
+    conn_a = engine.connect()
+    conn_b = engine.connect()
+    conn_a.execute(text("select 1"))
+    stats = pool_stats(engine)
+    assert stats["checked_out"] == 2
+    assert stats["checkouts"] == 2
+    assert stats["max_overflow"] == 1
+
+    conn_a.close()
+    conn_b.close()
+    assert pool_stats(engine)["checked_out"] == 0
+    engine.dispose()
+
+
+def test_memory_sqlite_keeps_default_pool():
+    engine = build_engine("sqlite://")
+    assert not isinstance(engine.pool, InstrumentedQueuePool)
+    assert "status" in pool_stats(engine)
@@ -0,0 +1,36 @@
+# tests/test_hashing_pool.py
+
+import sys
+import os
+import threading
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__ + "/..")))
+
+import pytest
+from utils.hashing_pool import HashingPool, HashingPoolBusy
+
+
+@pytest.mark.asyncio
+async def test_hash_and_verify_roundtrip():
+    pool = HashingPool(kind="thread", workers=1, max_queue=1)
+    hashed = await pool.hash("s3cret")
+    assert await pool.verify("s3cret", hashed)
+    assert not await pool.verify("otro", hashed)
+    assert pool.stats()["completed"] == 3
+    pool.shutdown()
+
+
+def test_rejects_when_queue_is_full():
+    pool = HashingPool(kind="thread", workers=1, max_queue=1)
+    gate = threading.Event()
+    running = pool.submit(gate.wait)
+    queued = pool.submit(gate.wait)
+    with pytest.raises(HashingPoolBusy):
+        pool.submit(gate.wait)
+    stats = pool.stats()
+    assert stats["rejected"] == 1
+    assert stats["queue_depth"] == 1
+    gate.set()
+    running.result(timeout=5)
+    queued.result(timeout=5)
+    pool.shutdown()
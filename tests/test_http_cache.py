@@ -0,0 +1,51 @@
+# tests/test_http_cache.py
+
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__ + "/..")))
+
+from datetime import datetime
+
+from bson import ObjectId
+from fastapi import Request
+from utils.http_cache import cached_response, json_bytes, make_etag
+
+
+def make_request(**headers) -> Request:
+    raw = [(k.replace("_", "-").encode(), v.encode()) for k, v in headers.items()]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": raw})
+
+
+def test_full_response_carries_validators_and_cache_control():
+    body = json_bytes({"id": ObjectId("65f000000000000000000001"), "at": datetime(2026, 1, 2, 3, 4, 5)})
+    response = cached_response(make_request(), body, last_modified=datetime(2026, 1, 2, 3, 4, 5, 999),
+                               max_age=10, swr=30)
+    assert response.status_code == 200
+    assert response.body == b'{"id":"65f000000000000000000001","at":"2026-01-02T03:04:05"}'
+    assert response.headers["etag"] == make_etag(body)
+    assert response.headers["last-modified"] == "Fri, 02 Jan 2026 03:04:05 GMT"
+    assert response.headers["cache-control"] == "public, max-age=10, s-maxage=10, stale-while-revalidate=30"
+
+
+def test_if_none_match_returns_304_with_weak_comparison():
+    etag = make_etag(42)
+    strong = etag[2:]
+    response = cached_response(make_request(if_none_match=f'"other", {strong}'), b"{}", etag=etag)
+    assert response.status_code == 304
+    assert response.body == b""
+    assert response.headers["etag"] == etag
+
+    assert cached_response(make_request(if_none_match='"other"'), b"{}", etag=etag).status_code == 200
+
+
+def test_if_modified_since_only_without_if_none_match():
+    modified = "2026-01-02T03:04:05"
+    fresh = make_request(if_modified_since="Fri, 02 Jan 2026 03:04:05 GMT")
+    stale = make_request(if_modified_since="Fri, 02 Jan 2026 03:04:04 GMT")
+    assert cached_response(fresh, b"{}", last_modified=modified).status_code == 304
+    assert cached_response(stale, b"{}", last_modified=modified).status_code == 200
+
+    # Con If-None-Match presente, manda el ETag
+    both = make_request(if_none_match='"nope"', if_modified_since="Fri, 02 Jan 2026 03:04:05 GMT")
+    assert cached_response(both, b"{}", last_modified=modified).status_code == 200
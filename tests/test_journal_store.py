@@ -0,0 +1,85 @@
+# tests/test_journal_store.py
+
+import sys
+import os
+import json
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__ + "/..")))
+
+from utils.journal_store import JournalStore
+
+
+def test_replay_ignores_truncated_tail(tmp_path):
+    path = str(tmp_path / "users.json")
+    store = JournalStore(path, key_field="id", fsync="always", compact_every=0)
+    store.put("u1", {"id": "u1", "plan": "freemium"})
+    store.patch("u1", plan="pro")
+
+    # Simular un crash a mitad de escritura
+    with open(f"{path}.journal", "a") as f:
+        f.write('{"op": "put", "key": "u2", "val')
+
+    recovered = JournalStore(path, key_field="id", compact_every=0)
+    recovered.refresh()
+    assert recovered.as_dict() == {"u1": {"id": "u1", "plan": "pro"}}
+
+    # La siguiente escritura descarta la cola rota y el journal sigue siendo válido
+    recovered.put("u3", {"id": "u3", "plan": "basic"})
+    lines = open(f"{path}.journal").read().splitlines()
+    assert all(json.loads(line) for line in lines)
+    assert len(lines) == 3
+
+
+def test_compaction_keeps_original_snapshot_format(tmp_path):
+    path = str(tmp_path / "partner_keys.json")
+    with open(path, "w") as f:
+        json.dump({"partners": {"acme": {"api_key": "k1"}}}, f)
+
+    store = JournalStore(path, root_key="partners", compact_every=2)
+    store.refresh()
+    store.put("globex", {"api_key": "k2"})
+    store.delete("acme")
+
+    assert store.stats()["compactions"] == 1
+    assert os.path.getsize(f"{path}.journal") == 0
+    with open(path) as f:
+        assert json.load(f) == {"partners": {"globex": {"api_key": "k2"}}}
+
+
+def test_second_instance_follows_journal_tail(tmp_path):
+    path = str(tmp_path / "licenses.json")
+    writer = JournalStore(path, compact_every=0)
+    reader = JournalStore(path, compact_every=0)
+    reader.refresh()
+
+    writer.put("l1", {"id": "l1", "active": True})
+    assert reader.refresh() is True
+    assert reader.get("l1") == {"id": "l1", "active": True}
+    assert reader.refresh() is False
+
+
+def test_full_load_retries_when_compacted_mid_read(tmp_path):
+    path = str(tmp_path / "users.json")
+    writer = JournalStore(path, key_field="id", compact_every=0)
+    writer.put("u1", {"id": "u1"})
+    writer.compact()
+    writer.put("u2", {"id": "u2"})
+
+    reader = JournalStore(path, key_field="id", compact_every=0)
+    read_snapshot = reader._read_snapshot
+    calls = []
+
+    def racing_read():
+        state = read_snapshot()
+        if not calls:
+            # Otro proceso compacta entre la lectura del snapshot y la del journal
+            writer.put("u3", {"id": "u3"})
+            writer.compact()
+        calls.append(1)
+        return state
+
+    reader._read_snapshot = racing_read
+    reader.refresh()
+    assert sorted(reader.as_dict()) == ["u1", "u2", "u3"]
+    assert len(calls) == 2
+    assert not reader.refresh()
@@ -0,0 +1,81 @@
+# tests/test_kpi_engine.py
+
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__ + "/..")))
+
+from datetime import datetime, timedelta
+import json
+
+import fakeredis
+import numpy as np
+import pytest
+from fakeredis.aioredis import FakeAsyncRedisConnection
+from mongomock_motor import AsyncMongoMockClient
+from utils import redis_pool
+from utils.kpi_engine import KPIAccumulator, KPIEngine, read_snapshot
+
+
+def test_incremental_batches_match_single_pass():
+    rng = np.random.default_rng(7)
+    roi = rng.normal(0.01, 0.05, size=1000)
+    days = np.repeat(np.arange(20000, 20010), 100)
+
+    whole = KPIAccumulator()
+    whole.update(roi, days)
+
+    incremental = KPIAccumulator()
+    for start in range(0, 1000, 137):
+        # Pasar por el estado persistido entre lotes, como hace el motor
+        incremental = KPIAccumulator(incremental.to_state())
+        incremental.update(roi[start:start + 137], days[start:start + 137])
+
+    a, b = whole.metrics(20009), incremental.metrics(20009)
+    for key in a:
+        assert a[key] == pytest.approx(b[key])
+    assert a["win_rate"] == round(np.mean(roi > 0), 4)
+    assert a["sharpe"] == pytest.approx(round(roi.mean() / roi.std(), 4))
+
+
+def test_max_drawdown_from_equity_curve():
+    acc = KPIAccumulator()
+    acc.update(np.array([0.10, -0.50, 0.20]), np.zeros(3, dtype=np.int64))
+    acc.update(np.array([1.0, -0.25]), np.zeros(2, dtype=np.int64))
+    # equity: 1.1 -> 0.55 -> 0.66 -> 1.32 (pico) -> 0.99
+    assert acc.metrics(0)["drawdown"] == pytest.approx(0.5)
+
+
+@pytest.mark.asyncio
+async def test_engine_processes_only_new_signals_and_publishes_snapshot():
+    pool = redis_pool.build_pool(connection_class=FakeAsyncRedisConnection, server=fakeredis.FakeServer(),
+                                 health_check_interval=0)
+    redis_pool.init_redis(pool)
+    db = AsyncMongoMockClient()["zima"]
+    now = datetime(2026, 1, 31, 12)
+    await db.signals.insert_many([
+        {"roi": 0.1, "closed_at": now - timedelta(days=40), "timestamp": now - timedelta(days=41), "model_version": "v1"},
+        {"roi": -0.05, "closed_at": now - timedelta(days=2), "timestamp": now - timedelta(days=3), "model_version": "v2"},
+        {"timestamp": now - timedelta(hours=1)},  # abierta: sin roi
+    ])
+    try:
+        engine = KPIEngine(db, batch_size=1)
+        snapshot = await engine.refresh(now)
+        assert snapshot["closed_signals"] == 2
+        assert snapshot["roi_month"] == pytest.approx(-0.05)
+        assert snapshot["signals_last_24h"] == 1
+        assert snapshot["active_models"] == 2
+
+        await db.signals.insert_one({"roi": 0.2, "closed_at": now - timedelta(hours=1), "timestamp": now})
+        processed = engine.processed
+        snapshot = await engine.refresh(now)
+        assert engine.processed - processed == 1
+        assert snapshot["closed_signals"] == 3
+        assert snapshot["win_rate"] == pytest.approx(round(2 / 3, 4))
+
+        published = await read_snapshot(db)
+        assert published["version"] == snapshot["version"] == 2
+        assert json.loads(await redis_pool.get_redis().get("public:kpis:latest")) == published
+        assert (await db.kpis.find_one({"_id": "global"}))["closed_signals"] == 3
+    finally:
+        await redis_pool.close_redis()
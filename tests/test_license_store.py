@@ -0,0 +1,44 @@
+# tests/test_license_store.py
+
+import sys
+import os
+import json
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__ + "/..")))
+
+from utils.license_store import LicenseStore
+
+
+def make_license(i, active=True):
+    return {"id": f"id-{i}", "api_key": f"key-{i}", "partner_name": f"partner-{i}", "active": active}
+
+
+def test_add_lookup_and_revoke_write_through(tmp_path):
+    path = tmp_path / "licenses.json"
+    store = LicenseStore(str(path), recheck_interval=0)
+    store.add(make_license(1))
+    store.add(make_license(2))
+
+    assert store.get_by_key("key-2")["partner_name"] == "partner-2"
+    assert store.get_by_key("nope") is None
+
+    store.update("id-1", active=False)
+    assert store.get_by_id("id-1")["active"] is False
+
+    # Otro proceso (o un reinicio) ve el mismo estado replayando el journal
+    reopened = LicenseStore(str(path), recheck_interval=0)
+    assert [lic["active"] for lic in reopened.all()] == [False, True]
+
+
+def test_reloads_only_when_file_changes(tmp_path):
+    path = tmp_path / "licenses.json"
+    path.write_text(json.dumps([make_license(1)]))
+    store = LicenseStore(str(path), recheck_interval=0)
+
+    for _ in range(5):
+        assert store.get_by_key("key-1")
+    assert store.stats()["reloads"] == 1
+
+    path.write_text(json.dumps([make_license(1), make_license(3)]))
+    assert store.get_by_key("key-3")["id"] == "id-3"
+    assert store.stats()["reloads"] == 2
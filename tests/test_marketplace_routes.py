@@ -0,0 +1,77 @@
+# tests/test_marketplace_routes.py
+
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__ + "/..")))
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+
+# La app completa necesita el módulo database y todas las dependencias de los
+# routers; sin ellas el test se omite en lugar de fallar
+main = pytest.importorskip("main")
+marketplace = pytest.importorskip("routers.marketplace")
+
+
+def test_public_signals_feed_is_mounted(monkeypatch):
+    db = AsyncMongoMockClient()["zima"]
+    base = datetime(2026, 1, 1)
+    asyncio.run(db.signals.insert_many([
+        {"_id": ObjectId(), "asset": "BTC/USDT", "timeframe": "1h", "prediction": "up",
+         "confidence": 0.8, "timestamp": base + timedelta(minutes=i)}
+        for i in range(3)
+    ]))
+    calls = []
+
+    async def cached(key, fn):
+        calls.append(key)
+        return await fn()
+
+    monkeypatch.setattr(marketplace, "db", db)
+    monkeypatch.setattr(marketplace.public_flight, "cached", cached)
+    client = TestClient(main.app)
+    url = "/marketplace/api/marketplace/public_signals"
+
+    first = client.get(url, params={"limit": 2})
+    assert first.status_code == 200
+    assert [s["timestamp"] for s in first.json()] == ["2026-01-01T00:02:00", "2026-01-01T00:01:00"]
+    # Solo la primera página pasa por el cache compartido
+    assert len(calls) == 1
+
+    rest = client.get(url, params={"limit": 2, "cursor": first.headers["x-next-cursor"]})
+    assert [s["timestamp"] for s in rest.json()] == ["2026-01-01T00:00:00"]
+    assert "x-next-cursor" not in rest.headers
+    assert len(calls) == 1
+
+
+def test_ingested_signal_can_be_bought(monkeypatch):
+    import fakeredis
+    from fakeredis.aioredis import FakeAsyncRedisConnection
+    from utils import redis_pool
+    from utils.security import get_current_user
+    from utils.signal_ingest import ingest_signals
+
+    redis_pool.init_redis(redis_pool.build_pool(connection_class=FakeAsyncRedisConnection,
+                                                server=fakeredis.FakeServer(), health_check_interval=0))
+    db = AsyncMongoMockClient()["zima"]
+    result = asyncio.run(ingest_signals(db, [{"asset": "BTC/USDT", "timeframe": "1h", "prediction": "up",
+                                              "confidence": 0.8}]))
+    monkeypatch.setattr(marketplace, "db", db)
+    main.app.dependency_overrides[get_current_user] = lambda: {"sub": "trader@zima.ai"}
+    try:
+        client = TestClient(main.app)
+        url = "/marketplace/api/marketplace/purchase_signal"
+        bought = client.post(url, json={"signal_id": result["ids"][0], "buyer_id": "7", "price_usd": 5.0})
+        assert bought.status_code == 200 and bought.json()["access_granted"]
+        assert asyncio.run(db.purchases.count_documents({"signal_id": result["ids"][0]})) == 1
+
+        assert client.post(url, json={"signal_id": "not-an-id", "buyer_id": "7", "price_usd": 5.0}).status_code == 404
+    finally:
+        main.app.dependency_overrides.pop(get_current_user, None)
+        asyncio.run(redis_pool.close_redis())
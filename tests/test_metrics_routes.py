@@ -0,0 +1,113 @@
+# tests/test_metrics_routes.py
+
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__ + "/..")))
+
+import pytest
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+
+# La app completa necesita el módulo database y todas las dependencias de los
+# routers; sin ellas el test se omite en lugar de fallar
+main = pytest.importorskip("main")
+metrics = pytest.importorskip("routers.metrics")
+
+
+def test_feedback_endpoints_are_mounted(monkeypatch):
+    from utils.security import get_current_principal
+
+    monkeypatch.setattr(metrics, "db", AsyncMongoMockClient()["zima"])
+    main.app.dependency_overrides[get_current_principal] = lambda: {"sub": "trader@zima.ai"}
+    try:
+        client = TestClient(main.app)
+        base = "/metrics/metrics"
+        assert client.post(f"{base}/signal/sig-1/feedback", json={"rating": 4, "was_profitable": True}).status_code == 200
+        assert client.post(f"{base}/signal/sig-1/feedback", json={"rating": 2, "was_profitable": False}).status_code == 200
+
+        summary = client.get(f"{base}/signal/sig-1").json()
+        assert summary["feedback_count"] == 2
+        assert summary["avg_rating"] == 3.0
+
+        rows = client.post(f"{base}/signals/feedback", json={"signal_ids": ["sig-1", "sig-2"]}).json()
+        assert [r["feedback_count"] for r in rows] == [2, 0]
+    finally:
+        main.app.dependency_overrides.pop(get_current_principal, None)
+
+
+def test_snapshot_endpoints_are_mounted(tmp_path, monkeypatch):
+    from utils.metrics_snapshot import MetricsSnapshot
+
+    snapshot = MetricsSnapshot(str(tmp_path / "missing.json"), recheck_interval=60)
+    monkeypatch.setattr(metrics, "metrics_snapshot", snapshot)
+    client = TestClient(main.app)
+
+    kpis = client.get("/metrics/metrics/kpis")
+    assert kpis.status_code == 200 and kpis.content == snapshot.kpi_bytes
+
+    dashboard = client.get("/metrics/metrics/public/dashboard")
+    assert dashboard.status_code == 200
+    assert client.get("/metrics/metrics/public/dashboard",
+                      headers={"If-None-Match": dashboard.headers["etag"]}).status_code == 304
+
+
+class FakeRedis:
+    def __init__(self, values):
+        self.values = values
+
+    async def get(self, key):
+        return self.values.get(key)
+
+
+def test_public_kpis_revalidate_on_the_mounted_router(monkeypatch):
+    import json
+
+    snapshot = {"roi": 0.02, "win_rate": 0.6, "drawdown": 0.1, "sharpe": 1.2, "total_signals": 10,
+                "updated_at": "2026-01-02T03:04:05", "version": 7}
+    monkeypatch.setattr(metrics, "get_redis", lambda: FakeRedis({"public:kpis:latest": json.dumps(snapshot)}))
+    client = TestClient(main.app)
+
+    first = client.get("/metrics/metrics/public")
+    assert first.status_code == 200 and first.json()["total_signals"] == 10
+    again = client.get("/metrics/metrics/public", headers={"If-None-Match": first.headers["etag"]})
+    assert again.status_code == 304
+
+
+def test_summary_is_mounted_and_coalesced(monkeypatch):
+    calls = []
+
+    async def cached(key, fn):
+        calls.append(key)
+        return '{"total_signals":3}'
+
+    monkeypatch.setattr(metrics.summary_flight, "cached", cached)
+    client = TestClient(main.app)
+    assert client.get("/metrics/metrics/summary").json() == {"total_signals": 3}
+    assert calls == ["global"]
+
+
+def test_user_kpi_readers_are_mounted(monkeypatch):
+    import json
+    from datetime import datetime
+    from utils.security import get_current_user
+
+    class User:
+        id = 7
+
+    db = AsyncMongoMockClient()["zima"]
+    monkeypatch.setattr(metrics, "db", db)
+    monkeypatch.setattr(metrics, "get_redis", lambda: FakeRedis({"user:kpis:7": json.dumps({
+        "roi": 0.01, "roi_total": 0.04, "win_rate": 0.5, "drawdown": 0.2, "sharpe": 0.3,
+        "total_signals": 4, "updated_at": "2026-01-02T03:04:05"})}))
+    main.app.dependency_overrides[get_current_user] = lambda: User()
+    try:
+        import asyncio
+        asyncio.run(db.user_kpis.insert_one({"_id": "7:BTC:1h", "user_id": 7, "symbol": "BTC", "timeframe": "1h",
+                                             "roi": 0.01, "roi_total": 0.04, "win_rate": 0.5, "avg_holding": 2.0,
+                                             "updated_at": datetime(2026, 1, 2)}))
+        client = TestClient(main.app)
+        assert client.get("/metrics/metrics/me").json()["total_signals"] == 4
+        assert [m["roi_total"] for m in client.get("/metrics/metrics/user").json()] == [0.04]
+    finally:
+        main.app.dependency_overrides.pop(get_current_user, None)
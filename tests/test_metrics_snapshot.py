@@ -0,0 +1,87 @@
+# tests/test_metrics_snapshot.py
+
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__ + "/..")))
+
+import json
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from utils.metrics_snapshot import MetricsSnapshot
+
+
+def write_metrics(path, total_signals):
+    with open(path, "w") as f:
+        json.dump({"total_signals": total_signals, "win_rate": 0.5, "avg_rating": 4.0, "avg_roi": 0.25,
+                   "active_users": 10, "model_version": "ZIMA-RL-v5",
+                   "updated_at": "2026-01-02T03:04:05"}, f)
+
+
+def test_refresh_reloads_only_when_the_file_changes(tmp_path):
+    path = str(tmp_path / "metrics.json")
+    write_metrics(path, 100)
+    snapshot = MetricsSnapshot(path, recheck_interval=0)
+
+    snapshot.refresh()
+    snapshot.refresh()
+    assert snapshot.reloads == 1
+    assert json.loads(snapshot.kpi_bytes)["total_signals"] == 100
+    etag = snapshot.dashboard_etag
+
+    write_metrics(path, 1000)
+    snapshot.refresh()
+    assert snapshot.reloads == 2
+    assert json.loads(snapshot.kpi_bytes)["total_signals"] == 1000
+    assert json.loads(snapshot.dashboard_bytes)["global_metrics"]["signals_generated"] == 1000
+    assert snapshot.dashboard_etag != etag
+
+
+def test_refresh_rechecks_at_most_once_per_interval(tmp_path):
+    path = str(tmp_path / "metrics.json")
+    write_metrics(path, 100)
+    snapshot = MetricsSnapshot(path, recheck_interval=60)
+    snapshot.refresh()
+
+    write_metrics(path, 1000)
+    snapshot.refresh()
+    assert snapshot.reloads == 1
+    assert snapshot.data["total_signals"] == 100
+
+
+def test_missing_file_serves_defaults(tmp_path):
+    snapshot = MetricsSnapshot(str(tmp_path / "missing.json"), recheck_interval=0)
+    snapshot.refresh()
+    assert snapshot.loaded
+    assert snapshot.data["model_version"] == "ZIMA-RL-v5"
+
+
+def test_endpoints_serve_prerendered_bodies_and_304(tmp_path):
+    path = str(tmp_path / "metrics.json")
+    write_metrics(path, 100)
+    snapshot = MetricsSnapshot(path, recheck_interval=0)
+    app = FastAPI()
+
+    @app.get("/metrics/kpis")
+    def kpis():
+        return snapshot.kpis_response()
+
+    @app.get("/public/dashboard")
+    def dashboard(request: Request):
+        return snapshot.dashboard_response(request)
+
+    client = TestClient(app)
+    response = client.get("/metrics/kpis")
+    assert response.content == snapshot.kpi_bytes
+    assert response.json()["avg_roi"] == 0.25
+
+    response = client.get("/public/dashboard")
+    assert response.content == snapshot.dashboard_bytes
+    assert response.headers["etag"] == snapshot.dashboard_etag
+    assert response.headers["last-modified"] == "Fri, 02 Jan 2026 03:04:05 GMT"
+
+    revalidated = client.get("/public/dashboard", headers={"If-None-Match": snapshot.dashboard_etag})
+    assert revalidated.status_code == 304
+    assert revalidated.content == b""
+    assert snapshot.reloads == 1
@@ -0,0 +1,54 @@
+# tests/test_mongo_indexes.py
+
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__ + "/..")))
+
+import pytest
+from pymongo.errors import OperationFailure
+from utils.mongo_indexes import INDEXES, ensure_indexes, plan_stages, winning_plan
+
+
+class FakeCollection:
+    def __init__(self, name, calls):
+        self.name = name
+        self.calls = calls
+
+    async def create_index(self, keys, **options):
+        if self.name == "users":
+            raise OperationFailure("E11000 duplicate key")
+        self.calls.append((self.name, keys, options["name"]))
+        return options["name"]
+
+
+class FakeDB:
+    def __init__(self):
+        self.calls = []
+
+    def __getitem__(self, name):
+        return FakeCollection(name, self.calls)
+
+
+@pytest.mark.asyncio
+async def test_ensure_indexes_applies_registry_and_survives_failures():
+    db = FakeDB()
+    result = await ensure_indexes(db)
+    assert len(db.calls) + len(result["failed"]) == len(INDEXES)
+    assert "users.email_1" in result["failed"]
+    assert ("signals", [("timestamp", -1)], "timestamp_-1") in db.calls
+
+
+def test_plan_stages_detects_collscan():
+    explain = {
+        "queryPlanner": {
+            "winningPlan": {
+                "stage": "LIMIT",
+                "inputStage": {"stage": "SORT", "inputStage": {"stage": "COLLSCAN"}}
+            }
+        }
+    }
+    assert plan_stages(winning_plan(explain)) == ["LIMIT", "SORT", "COLLSCAN"]
+
+    indexed = {"queryPlanner": {"winningPlan": {"queryPlan": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN"}}}}}
+    assert plan_stages(winning_plan(indexed)) == ["FETCH", "IXSCAN"]
@@ -0,0 +1,96 @@
+# tests/test_principal_cache.py
+
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__ + "/..")))
+
+import pytest
+from utils.cache import TTLCache
+from utils import security
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_cache_lru_eviction_and_counters():
+    cache = TTLCache(maxsize=2, ttl=10)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "a" pasa a ser el más reciente
+    cache.set("c", 3)           # expulsa "b"
+    assert cache.get("b") is None
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["evictions"] == 1
+    assert stats["size"] == 2
+
+
+def test_ttl_cache_expiration():
+    clock = FakeClock()
+    cache = TTLCache(maxsize=10, ttl=5, clock=clock)
+    cache.set("a", 1)
+    clock.now = 4.9
+    assert cache.get("a") == 1
+    clock.now = 5.0
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+
+class FakeUser:
+    id = 7
+    email = "trader@zima.ai"
+    role = "user"
+    plan = "pro"
+
+
+class FakeSession:
+    def __init__(self):
+        self.queries = 0
+
+    def expunge(self, obj):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_get_current_user_uses_cache_and_invalidation(monkeypatch):
+    security.invalidate_all_principals()
+    db = FakeSession()
+
+    async def fake_lookup(session, email):
+        session.queries += 1
+        return FakeUser()
+
+    monkeypatch.setattr(security, "get_user_by_email_async", fake_lookup)
+    token = security.create_access_token({"sub": FakeUser.email})
+
+    await security.get_current_user(token, db)
+    await security.get_current_user(token, db)
+    assert db.queries == 1
+
+    await security.invalidate_principal(user_id=7)
+    await security.get_current_user(token, db)
+    assert db.queries == 2
+
+
+@pytest.mark.asyncio
+async def test_subject_by_user_id_is_bounded(monkeypatch):
+    monkeypatch.setattr(security, "_subject_by_user_id", TTLCache(maxsize=2, ttl=60))
+    monkeypatch.setattr(security, "principal_cache", TTLCache(maxsize=2, ttl=60))
+
+    async def fake_lookup(session, email):
+        user = FakeUser()
+        user.id, user.email = int(email.split("@")[0][1:]), email
+        return user
+
+    monkeypatch.setattr(security, "get_user_by_email_async", fake_lookup)
+    for i in range(5):
+        await security.get_current_user(security.create_access_token({"sub": f"u{i}@zima.ai"}), FakeSession())
+    assert len(security._subject_by_user_id) == 2
+    assert security._subject_by_user_id.get("4") == "u4@zima.ai"
@@ -0,0 +1,34 @@
+# tests/test_redis_pool.py
+
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__ + "/..")))
+
+import fakeredis
+import pytest
+from fakeredis.aioredis import FakeAsyncRedisConnection
+from utils import redis_pool
+
+
+@pytest.mark.asyncio
+async def test_shared_pool_reuses_connections_and_reports_usage():
+    pool = redis_pool.build_pool(connection_class=FakeAsyncRedisConnection, server=fakeredis.FakeServer(),
+                                 max_connections=4, health_check_interval=0)
+    redis_pool.init_redis(pool)
+    try:
+        client = redis_pool.get_redis()
+        assert redis_pool.get_redis() is client
+
+        await client.set("zima:kpis:global", '{"roi": 0.5}')
+        await client.rpush("zima:signals:public", "a", "b")
+        assert await client.get("zima:kpis:global") == '{"roi": 0.5}'
+        assert await client.lrange("zima:signals:public", -10, -1) == ["a", "b"]
+
+        stats = redis_pool.redis_stats()
+        assert stats["max_connections"] == 4
+        assert stats["in_use"] == 0
+        assert stats["idle"] == 1
+    finally:
+        await redis_pool.close_redis()
+    assert redis_pool.redis_stats() == {"initialized": False}
@@ -0,0 +1,75 @@
+# tests/test_signal_feed.py
+
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__ + "/..")))
+
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+from mongomock_motor import AsyncMongoMockClient
+from utils.signal_feed import decode_cursor, encode_cursor, fetch_page
+
+
+async def seed(db, n=25):
+    base = datetime(2026, 1, 1)
+    docs = []
+    for i in range(n):
+        docs.append({
+            "_id": ObjectId(),
+            "asset": "BTC/USDT" if i % 2 else "ETH/USDT",
+            "timeframe": "1h",
+            "prediction": "up" if i % 3 else "down",
+            "confidence": i / n,
+            # Pares con el mismo timestamp: el desempate es por _id
+            "timestamp": base + timedelta(minutes=i // 2),
+        })
+    await db.signals.insert_many(docs)
+    return docs
+
+
+@pytest.mark.asyncio
+async def test_pages_cover_everything_once_in_order():
+    db = AsyncMongoMockClient()["zima"]
+    docs = await seed(db)
+    expected = [d["_id"] for d in sorted(docs, key=lambda d: (d["timestamp"], d["_id"]), reverse=True)]
+
+    seen, cursor = [], None
+    while True:
+        page, cursor = await fetch_page(db, {}, cursor=cursor, limit=7)
+        seen.extend(d["_id"] for d in page)
+        if cursor is None:
+            break
+    assert seen == expected
+
+
+@pytest.mark.asyncio
+async def test_filters_and_min_confidence():
+    db = AsyncMongoMockClient()["zima"]
+    await seed(db)
+    page, cursor = await fetch_page(db, {"asset": "BTC/USDT", "prediction": "up"}, min_confidence=0.5, limit=50)
+    assert cursor is None
+    assert page and all(d["asset"] == "BTC/USDT" and d["prediction"] == "up" and d["confidence"] >= 0.5
+                        for d in page)
+
+
+def test_cursor_round_trip_and_rejects_garbage():
+    doc = {"_id": ObjectId(), "timestamp": datetime(2026, 1, 1, 12, 30)}
+    assert decode_cursor(encode_cursor(doc)) == (doc["timestamp"], doc["_id"])
+    assert decode_cursor(encode_cursor({"_id": "sig-1", "timestamp": doc["timestamp"]}))[1] == "sig-1"
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+
+def test_every_filter_combination_has_an_equality_then_sort_index():
+    from itertools import combinations
+    from utils.mongo_indexes import INDEXES
+    from utils.signal_feed import FEED_FILTERS, FEED_SORT
+
+    keys = [tuple(ix["keys"]) for ix in INDEXES if ix["collection"] == "signals"]
+    for size in range(len(FEED_FILTERS) + 1):
+        for fields in combinations(FEED_FILTERS, size):
+            assert any({k[0] for k in key[:size]} == set(fields) and list(key[size:size + 2]) == FEED_SORT
+                       for key in keys), fields
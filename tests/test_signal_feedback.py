@@ -0,0 +1,38 @@
+# tests/test_signal_feedback.py
+
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__ + "/..")))
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+from utils.signal_feedback import record_feedback, get_feedback, get_feedback_bulk
+
+
+@pytest.mark.asyncio
+async def test_feedback_aggregates_with_atomic_counters():
+    db = AsyncMongoMockClient()["zima"]
+    await record_feedback(db, "sig-1", 5, True)
+    await record_feedback(db, "sig-1", 4, True)
+    doc = await record_feedback(db, "sig-1", 3, False)
+
+    assert doc["count"] == 3
+    assert doc["ratings"] == {"5": 1, "4": 1, "3": 1}
+    assert await db.signal_feedback.count_documents({}) == 1
+    assert await get_feedback(db, "sig-1") == {
+        "signal_id": "sig-1", "feedback_count": 3, "avg_rating": 4.0, "win_rate": 66.67
+    }
+    assert await get_feedback(db, "sig-2") is None
+
+
+@pytest.mark.asyncio
+async def test_bulk_read_keeps_order_and_fills_missing():
+    db = AsyncMongoMockClient()["zima"]
+    await record_feedback(db, "b", 2, False)
+    await record_feedback(db, "a", 4, True)
+
+    rows = await get_feedback_bulk(db, ["a", "missing", "b", "a"])
+    assert [r["signal_id"] for r in rows] == ["a", "missing", "b"]
+    assert rows[1]["feedback_count"] == 0
+    assert rows[2]["win_rate"] == 0.0
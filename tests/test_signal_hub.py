@@ -0,0 +1,71 @@
+# tests/test_signal_hub.py
+
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__ + "/..")))
+
+import asyncio
+import json
+
+import fakeredis
+import pytest
+from fakeredis.aioredis import FakeAsyncRedisConnection
+from utils import redis_pool
+from utils.signal_hub import HubFull, SignalHub, Subscriber, publish_signal, SIGNALS_CHANNEL
+
+
+def init_fake_redis():
+    pool = redis_pool.build_pool(connection_class=FakeAsyncRedisConnection, server=fakeredis.FakeServer(),
+                                 health_check_interval=0)
+    return redis_pool.init_redis(pool)
+
+
+@pytest.mark.asyncio
+async def test_dispatch_filters_by_asset_and_evicts_slow_consumers():
+    hub = SignalHub()
+    everything = hub.subscribe()
+    btc = hub.subscribe("BTC/USDT")
+    slow = Subscriber(buffer=2)
+    hub.subscribers.add(slow)
+
+    for asset in ("BTC/USDT", "ETH/USDT", "BTC/USDT"):
+        hub.dispatch(json.dumps({"asset": asset}))
+
+    assert [json.loads(await everything.next(0.1))["asset"] for _ in range(3)] == ["BTC/USDT", "ETH/USDT", "BTC/USDT"]
+    assert [json.loads(await btc.next(0.1))["asset"] for _ in range(2)] == ["BTC/USDT", "BTC/USDT"]
+    assert await btc.next(0.01) is None
+
+    # El tercer mensaje no entra en su buffer: queda fuera del hub
+    assert slow.evicted and slow not in hub.subscribers
+    with pytest.raises(ConnectionAbortedError):
+        await slow.next(0.1)
+    assert hub.stats()["evicted"] == 1 and hub.stats()["clients"] == 2
+
+
+def test_max_clients():
+    hub = SignalHub(max_clients=1)
+    hub.subscribe()
+    with pytest.raises(HubFull):
+        hub.subscribe()
+
+
+@pytest.mark.asyncio
+async def test_redis_pubsub_fans_out_to_subscribers():
+    init_fake_redis()
+    hub = SignalHub(SIGNALS_CHANNEL)
+    task = asyncio.create_task(hub.run())
+    try:
+        clients = [hub.subscribe() for _ in range(20)]
+        for _ in range(50):
+            if hub.connected:
+                break
+            await asyncio.sleep(0.01)
+        await publish_signal(json.dumps({"asset": "BTC/USDT", "prediction": "up"}))
+        messages = await asyncio.gather(*(client.next(2) for client in clients))
+        assert all(json.loads(m)["prediction"] == "up" for m in messages)
+        assert hub.stats()["received"] == 1 and hub.stats()["delivered"] == 20
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await redis_pool.close_redis()
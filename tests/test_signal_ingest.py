@@ -0,0 +1,92 @@
+# tests/test_signal_ingest.py
+
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__ + "/..")))
+
+import json
+from datetime import datetime
+
+import fakeredis
+import pytest
+from fakeredis.aioredis import FakeAsyncRedisConnection
+from mongomock_motor import AsyncMongoMockClient
+from utils import redis_pool
+from utils.counters import get_count
+from utils.signal_ingest import ingest_signals, SIGNALS_HOT_LIST
+
+
+def init_fake_redis():
+    pool = redis_pool.build_pool(connection_class=FakeAsyncRedisConnection, server=fakeredis.FakeServer(),
+                                 health_check_interval=0)
+    return redis_pool.init_redis(pool)
+
+
+def signal(i, **extra):
+    return {"id": f"{i:024x}", "asset": "BTC/USDT", "timeframe": "1h", "prediction": "up",
+            "confidence": 0.8, "timestamp": datetime(2026, 1, 1, 0, i), **extra}
+
+
+@pytest.mark.asyncio
+async def test_batch_is_written_counted_and_pushed_to_hot_list(monkeypatch):
+    monkeypatch.setattr("utils.signal_ingest.SIGNALS_HOT_LIST_SIZE", 5)
+    redis = init_fake_redis()
+    db = AsyncMongoMockClient()["zima"]
+    try:
+        result = await ingest_signals(db, [signal(i) for i in range(8)])
+        assert result["inserted"] == 8 and result["duplicates"] == 0
+        assert await db.signals.count_documents({}) == 8
+        assert await get_count(db, "signals") == 8
+
+        hot = [json.loads(s) for s in await redis.lrange(SIGNALS_HOT_LIST, 0, -1)]
+        assert [s["id"] for s in hot] == [f"{i:024x}" for i in range(3, 8)]
+        assert hot[-1]["timestamp"].startswith("2026-01-01T00:07")
+    finally:
+        await redis_pool.close_redis()
+
+
+@pytest.mark.asyncio
+async def test_retried_batch_does_not_duplicate():
+    redis = init_fake_redis()
+    db = AsyncMongoMockClient()["zima"]
+    try:
+        await ingest_signals(db, [signal(0), signal(1)])
+        result = await ingest_signals(db, [signal(1), signal(2)])
+        assert result == {"inserted": 1, "duplicates": 1, "ids": [signal(2)["id"]]}
+        assert await get_count(db, "signals") == 3
+        assert await redis.llen(SIGNALS_HOT_LIST) == 3
+    finally:
+        await redis_pool.close_redis()
+
+
+@pytest.mark.asyncio
+async def test_signals_without_id_get_native_object_ids():
+    from bson import ObjectId
+
+    init_fake_redis()
+    db = AsyncMongoMockClient()["zima"]
+    try:
+        payload = signal(0)
+        del payload["id"]
+        result = await ingest_signals(db, [payload])
+        doc = await db.signals.find_one({})
+        assert isinstance(doc["_id"], ObjectId)
+        assert result["ids"] == [str(doc["_id"])]
+    finally:
+        await redis_pool.close_redis()
+
+
+@pytest.mark.asyncio
+async def test_pipeline_ids_are_stored_as_object_ids():
+    from bson import ObjectId
+
+    init_fake_redis()
+    db = AsyncMongoMockClient()["zima"]
+    try:
+        result = await ingest_signals(db, [signal(1)])
+        doc = await db.signals.find_one({})
+        assert doc["_id"] == ObjectId(signal(1)["id"])
+        assert result["ids"] == [signal(1)["id"]]
+    finally:
+        await redis_pool.close_redis()
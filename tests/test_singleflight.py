@@ -0,0 +1,100 @@
+# tests/test_singleflight.py
+
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__ + "/..")))
+
+import asyncio
+
+import fakeredis
+import pytest
+from fakeredis.aioredis import FakeAsyncRedisConnection
+from utils import redis_pool
+from utils.singleflight import SingleFlight
+
+
+def init_fake_redis():
+    pool = redis_pool.build_pool(connection_class=FakeAsyncRedisConnection, server=fakeredis.FakeServer(),
+                                 health_check_interval=0)
+    return redis_pool.init_redis(pool)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_callers_share_one_computation():
+    flight = SingleFlight("test_do")
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"total": 42}
+
+    results = await asyncio.gather(*(flight.do("k", compute) for _ in range(50)))
+    assert calls == 1
+    assert all(r == {"total": 42} for r in results)
+    assert flight.stats()["coalesced"] == 49
+
+    await flight.do("k", compute)  # terminado el vuelo, se recalcula
+    assert calls == 2
+
+
+@pytest.mark.asyncio
+async def test_errors_reach_every_waiter_and_are_not_cached():
+    flight = SingleFlight("test_errors")
+
+    async def boom():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("mongo caído")
+
+    results = await asyncio.gather(*(flight.do("k", boom) for _ in range(5)), return_exceptions=True)
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert flight.stats()["errors"] == 1
+    assert flight.stats()["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_cached_value_is_shared_through_redis():
+    init_fake_redis()
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return '{"total_signals": 7}'
+
+    try:
+        first = SingleFlight("test_cached")
+        await asyncio.gather(*(first.cached("summary", compute, ttl=5) for _ in range(10)))
+        # Otro proceso (otra instancia) encuentra el valor en Redis
+        second = SingleFlight("test_cached")
+        assert await second.cached("summary", compute, ttl=5) == '{"total_signals": 7}'
+        assert calls == 1
+        assert second.stats()["cache_hits"] == 1
+    finally:
+        await redis_pool.close_redis()
+
+
+@pytest.mark.asyncio
+async def test_redis_lock_lets_one_worker_recompute():
+    client = init_fake_redis()
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return "value"
+
+    # Dos "workers" con su propio estado en proceso, coordinados por el lock en Redis
+    try:
+        workers = [SingleFlight("test_lock", redis_lock=True, poll_interval=0.01) for _ in range(2)]
+        results = await asyncio.gather(*(w.cached("kpis", compute) for w in workers))
+        assert results == ["value", "value"]
+        assert calls == 1
+        assert sum(w.remote_coalesced for w in workers) == 1
+        assert await client.get("sf:test_lock:kpis:lock") is None
+    finally:
+        await redis_pool.close_redis()
@@ -0,0 +1,114 @@
+# tests/test_stripe_events.py
+
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__ + "/..")))
+
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+from utils import stripe_events
+from utils.stripe_events import StripeEventWorker, enqueue_event, replay_dead, STRIPE_EVENTS_COLLECTION
+
+
+def make_event(event_id, event_type="test.event", **data):
+    event = {"id": event_id, "type": event_type, "created": 1767225600, "data": {"object": data}}
+    return event, json.dumps(event).encode()
+
+
+@pytest.fixture
+def handlers(monkeypatch):
+    registry = {}
+    monkeypatch.setattr(stripe_events, "HANDLERS", registry)
+    return registry
+
+
+@pytest.mark.asyncio
+async def test_duplicate_deliveries_are_applied_once(handlers):
+    db = AsyncMongoMockClient()["zima"]
+    applied = []
+
+    async def handler(event):
+        applied.append(event["data"]["object"]["n"])
+    handlers["test.event"] = [handler]
+
+    assert await enqueue_event(db, *make_event("evt_1", n=1))
+    assert not await enqueue_event(db, *make_event("evt_1", n=1))
+    assert await enqueue_event(db, *make_event("evt_2", n=2))
+
+    worker = StripeEventWorker(db)
+    assert await worker.process_batch() == 2
+    assert await worker.process_batch() == 0
+    assert applied == [1, 2]
+    assert worker.stats()["processed"] == 2 and worker.stats()["pending"] == 0
+    doc = await db[STRIPE_EVENTS_COLLECTION].find_one({"_id": "evt_1"})
+    assert doc["status"] == "done" and doc["processed_at"]
+
+
+@pytest.mark.asyncio
+async def test_failures_back_off_then_go_dead_and_can_be_replayed(handlers, monkeypatch):
+    monkeypatch.setattr(stripe_events, "STRIPE_EVENTS_MAX_ATTEMPTS", 2)
+    db = AsyncMongoMockClient()["zima"]
+    calls = 0
+
+    async def failing(event):
+        nonlocal calls
+        calls += 1
+        raise RuntimeError("SQL caído")
+    handlers["test.event"] = [failing]
+
+    await enqueue_event(db, *make_event("evt_1"))
+    worker = StripeEventWorker(db)
+    now = datetime.utcnow()
+    assert await worker.process_batch(now) == 1
+    doc = await db[STRIPE_EVENTS_COLLECTION].find_one({"_id": "evt_1"})
+    assert doc["status"] == "retry" and doc["attempts"] == 1 and doc["next_attempt_at"] > now
+    assert worker.stats()["pending"] == 1 and worker.stats()["oldest_pending_seconds"] >= 0
+
+    # Antes del backoff no se reintenta; después sí, y al agotar intentos queda "dead"
+    assert await worker.process_batch(now + timedelta(seconds=1)) == 0
+    assert await worker.process_batch(now + timedelta(hours=2)) == 1
+    doc = await db[STRIPE_EVENTS_COLLECTION].find_one({"_id": "evt_1"})
+    assert doc["status"] == "dead" and calls == 2
+
+    assert await replay_dead(db) == 1
+    handlers["test.event"] = []
+    assert await worker.process_batch(datetime.utcnow() + timedelta(seconds=1)) == 1
+    assert (await db[STRIPE_EVENTS_COLLECTION].find_one({"_id": "evt_1"}))["status"] == "done"
+
+
+@pytest.mark.asyncio
+async def test_expired_lease_is_reclaimed(handlers):
+    db = AsyncMongoMockClient()["zima"]
+    await enqueue_event(db, *make_event("evt_1"))
+    worker = StripeEventWorker(db)
+    now = datetime.utcnow()
+    # Un worker lo tomó y murió sin terminar
+    assert await worker._claim(now)
+    assert await worker.process_batch(now) == 0
+    assert await worker.process_batch(now + timedelta(minutes=5)) == 1
+
+
+@pytest.mark.asyncio
+async def test_worker_that_lost_its_lease_does_not_close_the_event(handlers):
+    db = AsyncMongoMockClient()["zima"]
+    await enqueue_event(db, *make_event("evt_1"))
+    now = datetime.utcnow()
+    slow, other = StripeEventWorker(db), StripeEventWorker(db)
+    stale = await slow._claim(now)
+    # El lease vence y otro worker reclama el evento mientras el primero sigue
+    fresh = await other._claim(now + timedelta(minutes=5))
+    assert fresh["locked_until"] != stale["locked_until"]
+
+    await slow._failed(stale, RuntimeError("timeout"), now)
+    await slow._done(stale, now)
+    doc = await db[STRIPE_EVENTS_COLLECTION].find_one({"_id": "evt_1"})
+    assert doc["status"] == "processing" and doc["attempts"] == 0
+    assert slow.stats()["lost_leases"] == 2 and slow.stats()["processed"] == 0
+
+    await other._done(fresh, now + timedelta(minutes=5))
+    assert (await db[STRIPE_EVENTS_COLLECTION].find_one({"_id": "evt_1"}))["status"] == "done"
+    assert other.stats()["processed"] == 1
@@ -0,0 +1,114 @@
+# tests/test_stripe_gateway.py
+
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__ + "/..")))
+
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from utils.stripe_gateway import PriceCatalog, StripeBusy, StripeGateway
+
+PRICES = [{"id": f"price_{i}", "object": "price", "active": True, "currency": "usd", "unit_amount": 1000 * i,
+           "nickname": f"Plan {i}", "product": "prod_zima", "recurring": {"interval": "month"}} for i in range(5)]
+
+
+# Stub local de la API de Stripe: precios paginados de a 2 y checkout sessions
+class StubStripe(BaseHTTPRequestHandler):
+    requests = []
+    delay = 0.0
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except BrokenPipeError:
+            pass  # el cliente ya cortó por timeout
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        StubStripe.requests.append(("GET", url.path, query))
+        after = query.get("starting_after", [None])[0]
+        start = next((i + 1 for i, p in enumerate(PRICES) if p["id"] == after), 0)
+        self._reply({"object": "list", "url": "/v1/prices", "data": PRICES[start:start + 2],
+                     "has_more": start + 2 < len(PRICES)})
+
+    def do_POST(self):
+        time.sleep(StubStripe.delay)
+        form = parse_qs(self.rfile.read(int(self.headers["Content-Length"])).decode())
+        StubStripe.requests.append(("POST", self.path, form))
+        self._reply({"id": "cs_test_1", "object": "checkout.session", "url": "https://checkout.stripe.test/cs_test_1"})
+
+
+@pytest.fixture
+def stub_base():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubStripe)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    StubStripe.requests, StubStripe.delay = [], 0.0
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.asyncio
+async def test_catalog_loads_all_pages_and_validates_locally(stub_base):
+    gateway = StripeGateway("sk_test_stub", api_base=stub_base, max_retries=0)
+    catalog = PriceCatalog(gateway)
+    try:
+        # Sin cargar todavía: no se rechaza nada
+        assert catalog.is_valid("price_unknown")
+        assert await catalog.refresh() == 5
+        assert len([r for r in StubStripe.requests if r[1] == "/v1/prices"]) == 3
+        assert catalog.is_valid("price_3") and not catalog.is_valid("price_unknown")
+        assert catalog.get("price_2")["interval"] == "month"
+    finally:
+        await gateway.close()
+
+
+@pytest.mark.asyncio
+async def test_checkout_runs_async_with_connection_reuse(stub_base):
+    gateway = StripeGateway("sk_test_stub", api_base=stub_base, max_retries=0)
+    try:
+        params = {"customer": "cus_1", "mode": "subscription", "line_items": [{"price": "price_1", "quantity": 1}]}
+        sessions = await asyncio.gather(*(
+            gateway.call("checkout.session.create", lambda c: c.checkout.sessions.create_async(params=params))
+            for _ in range(4)
+        ))
+        assert {s.url for s in sessions} == {"https://checkout.stripe.test/cs_test_1"}
+        assert StubStripe.requests[0][2]["line_items[0][price]"] == ["price_1"]
+        assert gateway.stats()["completed"] == 4
+    finally:
+        await gateway.close()
+
+
+@pytest.mark.asyncio
+async def test_timeouts_and_bounded_queue(stub_base):
+    StubStripe.delay = 0.5
+    gateway = StripeGateway("sk_test_stub", api_base=stub_base, timeout=0.1, max_retries=0,
+                            max_concurrency=1, max_queue=0)
+    try:
+        call = lambda c: c.checkout.sessions.create_async(params={"mode": "subscription"})
+        first = asyncio.create_task(gateway.call("checkout.session.create", call))
+        await asyncio.sleep(0)
+        with pytest.raises(StripeBusy):
+            await gateway.call("checkout.session.create", call)
+        with pytest.raises(TimeoutError):
+            await first
+        assert gateway.stats()["timeouts"] == 1 and gateway.stats()["rejected"] == 1
+    finally:
+        await gateway.close()
@@ -0,0 +1,95 @@
+# tests/test_telemetry.py
+
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__ + "/..")))
+
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from utils import telemetry
+from utils.telemetry import Histogram, PrometheusMiddleware, instrument_sqlalchemy, render_metrics
+
+
+def test_histogram_renders_cumulative_buckets():
+    hist = Histogram("test_latency_seconds", "test", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        hist.observe(value, "/x")
+    lines = hist.render()
+    assert 'test_latency_seconds_bucket{route="/x",le="0.1"} 2' in lines
+    assert 'test_latency_seconds_bucket{route="/x",le="1.0"} 3' in lines
+    assert 'test_latency_seconds_bucket{route="/x",le="+Inf"} 4' in lines
+    assert 'test_latency_seconds_count{route="/x"} 4' in lines
+
+
+def test_middleware_labels_by_route_template():
+    app = FastAPI()
+
+    @app.get("/signals/{signal_id}")
+    def get_signal(signal_id: str):
+        return {"id": signal_id}
+
+    app.add_middleware(PrometheusMiddleware)
+    client = TestClient(app)
+    before = telemetry.http_latency.count("GET", "/signals/{signal_id}")
+    for i in range(3):
+        assert client.get(f"/signals/{i}").status_code == 200
+    client.get("/nope")
+
+    assert telemetry.http_latency.count("GET", "/signals/{signal_id}") - before == 3
+    assert telemetry.http_requests.value("GET", "unmatched", 404) >= 1
+    assert telemetry.http_in_flight.value("GET") == 0
+    assert 'route="/signals/1"' not in render_metrics()
+
+
+def test_sql_statements_are_timed():
+    engine = create_engine("sqlite://")
+    instrument_sqlalchemy(engine, system="sql_test")
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        with pytest.raises(Exception):
+            conn.execute(text("SELECT * FROM missing_table"))
+    assert telemetry.downstream_latency.count("sql_test", "SELECT") == 2
+    assert telemetry.downstream_errors.value("sql_test", "SELECT") == 1
+
+
+@pytest.mark.asyncio
+async def test_internal_port_serves_prometheus_text(monkeypatch):
+    monkeypatch.setattr(telemetry, "METRICS_TOKEN", "secret")
+    server = await telemetry.start_metrics_server(port=19109)
+    try:
+        async def scrape(headers: str) -> bytes:
+            reader, writer = await asyncio.open_connection("127.0.0.1", 19109)
+            writer.write(f"GET /metrics HTTP/1.1\r\nHost: x\r\n{headers}\r\n".encode())
+            await writer.drain()
+            data = await reader.read()
+            writer.close()
+            return data
+
+        assert (await scrape("")).startswith(b"HTTP/1.1 401")
+        ok = await scrape("Authorization: Bearer secret\r\n")
+        assert ok.startswith(b"HTTP/1.1 200")
+        assert b"# TYPE zima_http_request_duration_seconds histogram" in ok
+    finally:
+        server.close()
+        await server.wait_closed()
+
+
+def test_app_metrics_route_is_closed_without_token(monkeypatch):
+    monkeypatch.setattr(telemetry, "METRICS_TOKEN", None)
+    monkeypatch.setattr(telemetry, "METRICS_ALLOW_ANONYMOUS", False)
+    assert not telemetry.authorized(None)
+    assert not telemetry.authorized("Bearer anything")
+    # El puerto interno sigue sirviendo sin token
+    assert telemetry.authorized(None, internal=True)
+
+    monkeypatch.setattr(telemetry, "METRICS_ALLOW_ANONYMOUS", True)
+    assert telemetry.authorized(None)
+
+    monkeypatch.setattr(telemetry, "METRICS_TOKEN", "secret")
+    assert not telemetry.authorized(None, internal=True)
+    assert telemetry.authorized("Bearer secret")
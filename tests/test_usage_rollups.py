@@ -0,0 +1,64 @@
+# tests/test_usage_rollups.py
+
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__ + "/..")))
+
+from datetime import datetime, timedelta
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+from utils.usage_rollups import plan_range, query_usage, rollup_ops, usage_series
+
+
+async def apply_ops(db, events):
+    # mongomock no soporta bulk_write con pymongo 4.12: se aplican una a una
+    ops = rollup_ops(events)
+    for op in ops:
+        await db.usage_rollups.update_one(op._filter, op._doc, upsert=True)
+    return len(ops)
+
+
+def test_plan_range_uses_coarsest_buckets():
+    start = datetime(2026, 3, 1, 22, 45, 30)
+    end = datetime(2026, 3, 4, 1, 10)
+    assert plan_range(start, end) == [
+        ("minute", datetime(2026, 3, 1, 22, 45), datetime(2026, 3, 1, 23, 0)),
+        ("hour", datetime(2026, 3, 1, 23), datetime(2026, 3, 2)),
+        ("day", datetime(2026, 3, 2), datetime(2026, 3, 4)),
+        ("hour", datetime(2026, 3, 4), datetime(2026, 3, 4, 1)),
+        ("minute", datetime(2026, 3, 4, 1), datetime(2026, 3, 4, 1, 10)),
+    ]
+    # Rango dentro de una misma hora: solo minutos
+    assert plan_range(datetime(2026, 3, 1, 10, 5), datetime(2026, 3, 1, 10, 7)) == [
+        ("minute", datetime(2026, 3, 1, 10, 5), datetime(2026, 3, 1, 10, 7))
+    ]
+    assert plan_range(end, start) == []
+
+
+@pytest.mark.asyncio
+async def test_rollups_answer_ranges_like_raw_scan():
+    db = AsyncMongoMockClient()["zima"]
+    base = datetime(2026, 3, 1, 22, 0)
+    events = [
+        {"tenant_id": "t1" if i % 3 else "t2", "api_calls": 1, "signals_consumed": i % 4,
+         "executions": i % 2, "timestamp": base + timedelta(minutes=17 * i)}
+        for i in range(400)
+    ]
+    for i in range(0, len(events), 50):
+        # Eventos del mismo bucket se combinan en un solo $inc
+        assert await apply_ops(db, events[i:i + 50]) < 3 * 50
+
+    start, end = datetime(2026, 3, 2, 3, 30), datetime(2026, 3, 5, 18, 0)
+    expected = [e for e in events if e["tenant_id"] == "t1" and start <= e["timestamp"] < end]
+    result = await query_usage(db, "t1", start, end)
+    assert result["totals"] == {
+        "api_calls": len(expected),
+        "signals_consumed": sum(e["signals_consumed"] for e in expected),
+        "executions": sum(e["executions"] for e in expected),
+    }
+    assert result["buckets_read"] < len(expected)
+
+    days = await usage_series(db, "t1", start, end, "day")
+    assert [d["bucket"] for d in days] == [datetime(2026, 3, d) for d in range(2, 6)]
@@ -0,0 +1,135 @@
+# tests/test_user_kpis.py
+
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__ + "/..")))
+
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+from utils.user_kpis import compute_user_kpis
+
+
+def make_frames():
+    t0 = datetime(2026, 5, 1)
+    signals = pd.DataFrame([
+        {"_id": "s1", "asset": "BTCUSDT", "timeframe": "1h", "roi": 0.10, "timestamp": t0, "closed_at": t0 + timedelta(hours=2)},
+        {"_id": "s2", "asset": "BTCUSDT", "timeframe": "1h", "roi": -0.50, "timestamp": t0, "closed_at": t0 + timedelta(hours=4)},
+        {"_id": "s3", "asset": "BTCUSDT", "timeframe": "1h", "roi": 0.20, "timestamp": t0, "closed_at": t0 + timedelta(hours=6)},
+        {"_id": "s4", "asset": "ETHUSDT", "timeframe": "4h", "roi": 0.05, "timestamp": t0, "closed_at": t0 + timedelta(hours=8)},
+    ])
+    purchases = pd.DataFrame([
+        {"buyer_id": "7", "signal_id": "s3"},
+        {"buyer_id": "7", "signal_id": "s1"},
+        {"buyer_id": "7", "signal_id": "s2"},
+        {"buyer_id": "7", "signal_id": "s2"},  # compra duplicada
+        {"buyer_id": "7", "signal_id": "s4"},
+        {"buyer_id": "alice", "signal_id": "s4"},
+        {"buyer_id": "alice", "signal_id": "open-signal"},  # sin resultado todavía
+    ])
+    return purchases, signals
+
+
+def test_per_symbol_and_per_user_kpis():
+    per_symbol, per_user = compute_user_kpis(*make_frames())
+
+    btc = per_symbol[(per_symbol.user_id == 7) & (per_symbol.symbol == "BTCUSDT")].iloc[0]
+    rois = np.array([0.10, -0.50, 0.20])
+    assert btc.signals == 3
+    assert btc.roi_total == pytest.approx(rois.sum())
+    assert btc.roi == pytest.approx(rois.mean())
+    assert btc.win_rate == pytest.approx(2 / 3)
+    assert btc.avg_holding == pytest.approx(4.0)
+    assert btc.sharpe == pytest.approx(rois.mean() / rois.std())
+    # equity ordenada por cierre: 1.1 -> 0.55 -> 0.66
+    assert btc.drawdown == pytest.approx(0.5)
+
+    assert set(per_user.user_id) == {7, "alice"}
+    alice = per_user[per_user.user_id == "alice"].iloc[0]
+    assert alice.signals == 1
+    assert alice.sharpe == 0.0
+    assert alice.drawdown == 0.0
+    assert per_user[per_user.user_id == 7].iloc[0].signals == 4
+
+
+def test_empty_inputs():
+    purchases, signals = make_frames()
+    per_symbol, per_user = compute_user_kpis(purchases.iloc[0:0], signals)
+    assert per_symbol.empty and per_user.empty
+
+
+def test_roi_is_the_mean_and_roi_total_the_sum():
+    per_symbol, per_user = compute_user_kpis(*make_frames())
+    user = per_user[per_user.user_id == 7].iloc[0]
+    rois = np.array([0.10, -0.50, 0.20, 0.05])
+    assert user.roi_total == pytest.approx(rois.sum())
+    assert user.roi == pytest.approx(rois.mean())
+
+
+@pytest.mark.asyncio
+async def test_only_one_worker_runs_per_interval():
+    import fakeredis
+    from fakeredis.aioredis import FakeAsyncRedisConnection
+    from utils import redis_pool
+    from utils.job_lock import JobLock
+
+    server = fakeredis.FakeServer()
+    redis_pool.init_redis(redis_pool.build_pool(connection_class=FakeAsyncRedisConnection, server=server,
+                                                health_check_interval=0))
+    try:
+        runs = []
+
+        async def job():
+            runs.append(1)
+
+        workers = [JobLock("user_kpis", ttl=60) for _ in range(3)]
+        assert [await w.run(job) for w in workers] == [True, False, False]
+        assert len(runs) == 1
+
+        # Si el job falla, el lock se libera y otro worker puede reintentar
+        async def failing():
+            raise RuntimeError("boom")
+
+        other = JobLock("other", ttl=60)
+        with pytest.raises(RuntimeError):
+            await other.run(failing)
+        assert await JobLock("other", ttl=60).run(job)
+
+        # Redis caído: nadie corre
+        server.connected = False
+        down = JobLock("down", ttl=60)
+        assert not await down.run(job)
+        assert down.stats()["errors"] == 1
+        assert len(runs) == 2
+    finally:
+        await redis_pool.close_redis()
+
+
+@pytest.mark.asyncio
+async def test_builder_joins_hex_signal_ids_with_ingested_signals():
+    import fakeredis
+    from fakeredis.aioredis import FakeAsyncRedisConnection
+    from mongomock_motor import AsyncMongoMockClient
+    from utils import redis_pool
+    from utils.signal_ingest import ingest_signals
+    from utils.user_kpis import UserKPIBuilder
+
+    redis_pool.init_redis(redis_pool.build_pool(connection_class=FakeAsyncRedisConnection,
+                                                server=fakeredis.FakeServer(), health_check_interval=0))
+    db = AsyncMongoMockClient()["zima"]
+    try:
+        t0 = datetime(2026, 5, 1)
+        result = await ingest_signals(db, [{"asset": "BTCUSDT", "timeframe": "1h", "prediction": "up",
+                                            "confidence": 0.7, "roi": 0.1, "timestamp": t0,
+                                            "closed_at": t0 + timedelta(hours=2)}])
+        # Las compras guardan el id tal como lo devolvió la ingesta
+        await db.purchases.insert_one({"buyer_id": "7", "signal_id": result["ids"][0]})
+
+        per_symbol, per_user = compute_user_kpis(*await UserKPIBuilder(db)._load())
+        assert list(per_user.user_id) == [7]
+        assert per_symbol.iloc[0].roi_total == pytest.approx(0.1)
+    finally:
+        await redis_pool.close_redis()
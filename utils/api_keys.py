@@ -0,0 +1,113 @@
+# utils/api_keys.py
+
+from fastapi import HTTPException, Request, Security
+from fastapi.responses import JSONResponse
+from fastapi.security import APIKeyHeader
+from typing import Dict, Iterable, Optional
+import os
+
+from utils.cache import TTLCache
+from utils.license_store import LicenseStore, partner_key_store
+from utils.runtime_stats import register_stats
+
+# === Configuración ===
+API_KEY_POSITIVE_CACHE_SIZE = int(os.getenv("API_KEY_POSITIVE_CACHE_SIZE", 10000))
+API_KEY_POSITIVE_CACHE_TTL = float(os.getenv("API_KEY_POSITIVE_CACHE_TTL", 300))
+API_KEY_NEGATIVE_CACHE_SIZE = int(os.getenv("API_KEY_NEGATIVE_CACHE_SIZE", 50000))
+API_KEY_NEGATIVE_CACHE_TTL = float(os.getenv("API_KEY_NEGATIVE_CACHE_TTL", 60))
+PARTNER_API_PREFIXES = [p for p in os.getenv("PARTNER_API_PREFIXES", "").split(",") if p]
+
+api_key_header = APIKeyHeader(name="X-API-Key", auto_error=False)
+
+# ===============================
+# Autenticación de partners por X-API-Key
+# ===============================
+# Cache positiva (key -> licencia activa) y negativa acotada (keys inválidas):
+# una key inválida repetida no vuelve a consultar el store hasta que vence o
+# hasta que el store cambia. Cualquier alta o revocación cambia la versión del
+# store y vacía ambas caches, así que una revocación se aplica en el acto en
+# este proceso y, en los demás, en cuanto detectan el cambio del journal.
+# El store por defecto es el que escriben /api/licenses/generate y /revoke.
+class PartnerKeyAuth:
+    def __init__(self, store: LicenseStore = partner_key_store):
+        self.store = store
+        self.positive = TTLCache(maxsize=API_KEY_POSITIVE_CACHE_SIZE, ttl=API_KEY_POSITIVE_CACHE_TTL)
+        self.negative = TTLCache(maxsize=API_KEY_NEGATIVE_CACHE_SIZE, ttl=API_KEY_NEGATIVE_CACHE_TTL)
+        self._store_version = None
+        self.accepted = 0
+        self.rejected = 0
+        self.store_lookups = 0
+
+    def _sync_with_store(self):
+        version = self.store.current_version()
+        if version != self._store_version:
+            self.positive.clear()
+            self.negative.clear()
+            self._store_version = version
+
+    def authenticate(self, api_key: Optional[str]) -> Optional[Dict]:
+        if not api_key:
+            self.rejected += 1
+            return None
+        self._sync_with_store()
+        if self.negative.get(api_key) is not None:
+            self.rejected += 1
+            return None
+        partner = self.positive.get(api_key)
+        if partner is not None:
+            self.accepted += 1
+            return partner
+        self.store_lookups += 1
+        lic = self.store.get_by_key(api_key)
+        # Las keys de partners no llevan `active`: revocar las borra del store
+        if not lic or not lic.get("active", True):
+            self.negative.set(api_key, True)
+            self.rejected += 1
+            return None
+        partner = {k: v for k, v in lic.items() if k != "api_key"}
+        self.positive.set(api_key, partner)
+        self.accepted += 1
+        return partner
+
+    def stats(self) -> Dict:
+        return {
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "store_lookups": self.store_lookups,
+            "positive_cache": self.positive.stats(),
+            "negative_cache": self.negative.stats(),
+        }
+
+partner_auth = PartnerKeyAuth()
+register_stats("partner_api_keys", partner_auth.stats)
+
+# === Dependencia para rutas de partners ===
+def require_partner(api_key: Optional[str] = Security(api_key_header)) -> Dict:
+    if not api_key:
+        raise HTTPException(status_code=401, detail="Falta el header X-API-Key")
+    partner = partner_auth.authenticate(api_key)
+    if partner is None:
+        # Key desconocida o revocada: falla de autenticación (401), igual que sin key
+        raise HTTPException(status_code=401, detail="API Key inválida o revocada.")
+    return partner
+
+# === Middleware ASGI: protege prefijos completos (PARTNER_API_PREFIXES) ===
+class PartnerKeyMiddleware:
+    def __init__(self, app, prefixes: Iterable[str] = PARTNER_API_PREFIXES, auth: PartnerKeyAuth = partner_auth):
+        self.app = app
+        self.prefixes = tuple(prefixes)
+        self.auth = auth
+
+    async def __call__(self, scope, receive, send):
+        # Los preflight de CORS no llevan X-API-Key: los responde CORSMiddleware
+        if scope["type"] != "http" or scope["method"] == "OPTIONS" or not scope["path"].startswith(self.prefixes):
+            await self.app(scope, receive, send)
+            return
+        api_key = Request(scope).headers.get("x-api-key")
+        partner = self.auth.authenticate(api_key)
+        if partner is None:
+            detail = "Falta el header X-API-Key" if not api_key else "API Key inválida o revocada."
+            await JSONResponse({"detail": detail}, status_code=401)(scope, receive, send)
+            return
+        scope.setdefault("state", {})["partner"] = partner
+        await self.app(scope, receive, send)
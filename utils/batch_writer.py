@@ -0,0 +1,199 @@
+# utils/batch_writer.py
+
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+import logging
+import os
+import time
+
+from pymongo import WriteConcern
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from utils.runtime_stats import register_stats
+from utils.telemetry import Histogram
+
+# === Configuración ===
+# Cada lote se escribe al juntar BATCH_WRITER_MAX_BATCH documentos o a los
+# BATCH_WRITER_MAX_DELAY_MS del primero, lo que ocurra antes. La cola está
+# acotada (BATCH_WRITER_MAX_QUEUE): si se llena, submit() rechaza en vez de
+# crecer en memoria. BATCH_WRITER_W / BATCH_WRITER_J: write concern del insert
+# (sin definir se hereda el del cliente).
+BATCH_WRITER_MAX_BATCH = int(os.getenv("BATCH_WRITER_MAX_BATCH", 500))
+BATCH_WRITER_MAX_DELAY_MS = float(os.getenv("BATCH_WRITER_MAX_DELAY_MS", 200))
+BATCH_WRITER_MAX_QUEUE = int(os.getenv("BATCH_WRITER_MAX_QUEUE", 10_000))
+BATCH_WRITER_W = os.getenv("BATCH_WRITER_W")
+BATCH_WRITER_J = os.getenv("BATCH_WRITER_J")
+BATCH_WRITER_RETRIES = int(os.getenv("BATCH_WRITER_RETRIES", 3))
+BATCH_WRITER_RETRY_AFTER = int(os.getenv("BATCH_WRITER_RETRY_AFTER", 1))
+
+flush_latency = Histogram("zima_batch_flush_seconds", "Duración de cada flush de BatchWriter", ("writer",))
+
+DUPLICATE_KEY = 11000
+
+_STOP = object()
+
+class BatchWriterFull(Exception):
+    pass
+
+def write_concern_from_env(w: Optional[str] = BATCH_WRITER_W, j: Optional[str] = BATCH_WRITER_J) -> Optional[WriteConcern]:
+    if w is None and j is None:
+        return None
+    options = {}
+    if w is not None:
+        options["w"] = int(w) if w.isdigit() else w
+    if j is not None:
+        options["j"] = j.lower() in ("1", "true", "yes")
+    return WriteConcern(**options)
+
+# ===============================
+# Ingesta en lotes (insert_many sin orden)
+# ===============================
+# submit() encola y vuelve enseguida; una tarea de fondo agrupa y escribe. Un
+# documento con error (p.ej. clave duplicada) no frena al resto del lote. Si
+# falla el lote entero (Mongo caído) se reintenta con backoff y, agotados los
+# reintentos, se descarta y se cuenta en `dropped`. on_flush recibe los
+# documentos escritos (p.ej. para actualizar agregados).
+class BatchWriter:
+    def __init__(self, name: str, collection, on_flush: Optional[Callable[[List[Dict]], Awaitable]] = None,
+                 max_batch: int = BATCH_WRITER_MAX_BATCH, max_delay_ms: float = BATCH_WRITER_MAX_DELAY_MS,
+                 max_queue: int = BATCH_WRITER_MAX_QUEUE, write_concern: Optional[WriteConcern] = None,
+                 retries: int = BATCH_WRITER_RETRIES):
+        self.name = name
+        self.collection = collection.with_options(write_concern=write_concern) if write_concern else collection
+        self.on_flush = on_flush
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        self.max_queue = max_queue
+        self.retries = retries
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        self.enqueued = 0
+        self.rejected = 0
+        self.written = 0
+        self.failed = 0
+        self.dropped = 0
+        self.flushes = 0
+        self.last_batch = 0
+        self.flush_total = 0.0
+        self.flush_max = 0.0
+
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            if self._queue is None:
+                self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def submit(self, doc: Dict):
+        if self._closing:
+            self.rejected += 1
+            raise BatchWriterFull(f"{self.name}: cerrando")
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(doc)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise BatchWriterFull(f"{self.name}: cola llena ({self.max_queue})")
+        self.enqueued += 1
+
+    async def _collect(self, first) -> Tuple[List[Dict], bool]:
+        batch, stopping = [first], False
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            try:
+                doc = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    doc = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            if doc is _STOP:
+                stopping = True
+                break
+            batch.append(doc)
+        return batch, stopping
+
+    async def _run(self):
+        while True:
+            first = await self._queue.get()
+            if first is _STOP:
+                return
+            batch, stopping = await self._collect(first)
+            await self._flush(batch)
+            if stopping:
+                return
+
+    async def _flush(self, batch: List[Dict]):
+        started = time.perf_counter()
+        written = batch
+        for attempt in range(self.retries + 1):
+            try:
+                await self.collection.insert_many(batch, ordered=False)
+                break
+            except BulkWriteError as e:
+                errors = e.details.get("writeErrors", [])
+                if attempt:
+                    # En un reintento, clave duplicada = documento que ya entró en el intento
+                    # anterior (el error llegó después de escribir): cuenta como escrito
+                    errors = [err for err in errors if err.get("code") != DUPLICATE_KEY]
+                failed_indexes = {err["index"] for err in errors}
+                written = [doc for i, doc in enumerate(batch) if i not in failed_indexes]
+                self.failed += len(failed_indexes)
+                if failed_indexes:
+                    logging.warning(f"[BATCH] {self.name}: {len(failed_indexes)} documentos rechazados en el lote")
+                break
+            except PyMongoError as e:
+                if attempt == self.retries:
+                    self.dropped += len(batch)
+                    logging.error(f"[BATCH] {self.name}: lote de {len(batch)} descartado: {e}")
+                    written = []
+                    break
+                await asyncio.sleep(min(0.1 * 2 ** attempt, 2.0))
+
+        elapsed = time.perf_counter() - started
+        self.flushes += 1
+        self.written += len(written)
+        self.last_batch = len(batch)
+        self.flush_total += elapsed
+        self.flush_max = max(self.flush_max, elapsed)
+        flush_latency.observe(elapsed, self.name)
+
+        if written and self.on_flush:
+            try:
+                await self.on_flush(written)
+            except Exception as e:
+                logging.warning(f"[BATCH] {self.name}: falló on_flush: {e}")
+
+    async def stop(self, timeout: float = 10.0):
+        # Deja de aceptar documentos y vacía lo encolado antes de volver
+        self._closing = True
+        if self._task is None or self._task.done():
+            return
+        await self._queue.put(_STOP)
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            self._task.cancel()
+            logging.error(f"[BATCH] {self.name}: {self._queue.qsize()} documentos sin escribir al cerrar")
+
+    def stats(self) -> Dict:
+        return {
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "max_queue": self.max_queue,
+            "enqueued": self.enqueued,
+            "rejected": self.rejected,
+            "written": self.written,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "flushes": self.flushes,
+            "last_batch": self.last_batch,
+            "flush_avg_ms": round(self.flush_total / self.flushes * 1000, 3) if self.flushes else 0.0,
+            "flush_max_ms": round(self.flush_max * 1000, 3),
+        }
+
+def register_writer(writer: BatchWriter) -> BatchWriter:
+    register_stats(f"batch_writer:{writer.name}", writer.stats)
+    return writer
@@ -0,0 +1,224 @@
+# utils/counters.py
+
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+import asyncio
+import json
+import logging
+import os
+import sys
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from utils.job_lock import JobLock
+
+# === Configuración ===
+COUNTERS_RECONCILE_SECONDS = float(os.getenv("COUNTERS_RECONCILE_SECONDS", 300))
+COUNTERS_COLLECTION = "counters"
+
+# ===============================
+# Registro de contadores
+# ===============================
+# Un documento por contador en `counters` ({_id: nombre, value}). Quien escribe
+# en la colección contada hace el $inc correspondiente; la reconciliación
+# periódica recuenta contra la colección y corrige cualquier deriva (escrituras
+# hechas por fuera de la app, procesos caídos entre el insert y el $inc).
+#
+# - register_counter(nombre, colección, filtro): total de un filtro fijo. Con
+#   periodic=False solo se siembra desde la colección cuando falta (cupos: un
+#   recuento en medio de una reserva podría bajar el valor y pasarse del límite).
+# - register_group(prefijo, colección, campo): un contador por valor del campo
+#   ("users:plan:pro", "users:plan:freemium", ...).
+COUNTERS: Dict[str, Dict] = {}
+GROUPS: Dict[str, Dict] = {}
+
+def register_counter(name: str, collection: str, filter: Optional[Dict] = None, periodic: bool = True):
+    COUNTERS[name] = {"collection": collection, "filter": filter or {}, "periodic": periodic}
+
+def register_group(prefix: str, collection: str, field: str):
+    GROUPS[prefix] = {"collection": collection, "field": field}
+
+def group_key(prefix: str, value) -> str:
+    return f"{prefix}:{value}"
+
+register_counter("signals", "signals")
+register_counter("users", "users")
+register_counter("founding_member_slots", "founding_members", periodic=False)
+register_counter("purchases", "purchases")
+register_group("users:plan", "users", "plan")
+
+# ===============================
+# Escritura
+# ===============================
+async def incr(db, name: str, amount: int = 1):
+    await db[COUNTERS_COLLECTION].update_one(
+        {"_id": name},
+        {"$inc": {"value": amount}, "$set": {"updated_at": datetime.utcnow()}},
+        upsert=True
+    )
+
+async def incr_many(db, deltas: Dict[str, int]):
+    now = datetime.utcnow()
+    ops = [
+        UpdateOne({"_id": name}, {"$inc": {"value": delta}, "$set": {"updated_at": now}}, upsert=True)
+        for name, delta in deltas.items() if delta
+    ]
+    if ops:
+        await db[COUNTERS_COLLECTION].bulk_write(ops, ordered=False)
+
+async def update_grouped_field(db, prefix: str, query: Dict, value) -> bool:
+    # Cambia el campo agrupado de un documento y mueve el conteo entre grupos.
+    # Devuelve False si no hubo documento o el valor ya era ese.
+    group = GROUPS[prefix]
+    previous = await db[group["collection"]].find_one_and_update(
+        query, {"$set": {group["field"]: value}}, projection={group["field"]: 1}
+    )
+    if previous is None or previous.get(group["field"]) == value:
+        return False
+    await incr_many(db, {
+        group_key(prefix, previous.get(group["field"])): -1,
+        group_key(prefix, value): 1
+    })
+    return True
+
+# ===============================
+# Cupos (p.ej. Founding Members)
+# ===============================
+async def claim_slot(db, name: str, limit: int) -> Optional[int]:
+    # Reserva atómica: el $inc solo se aplica si el contador está debajo del
+    # límite, así que dos requests concurrentes no pueden pasarse del cupo.
+    # Devuelve el número de cupo obtenido, o None si está lleno.
+    for _ in range(2):
+        doc = await db[COUNTERS_COLLECTION].find_one_and_update(
+            {"_id": name, "value": {"$lt": limit}},
+            {"$inc": {"value": 1}, "$set": {"updated_at": datetime.utcnow()}},
+            return_document=ReturnDocument.AFTER
+        )
+        if doc is not None:
+            return doc["value"]
+        if await db[COUNTERS_COLLECTION].find_one({"_id": name}, {"_id": 1}):
+            return None
+        # Contador todavía inexistente: sembrarlo desde la colección y reintentar
+        await seed_counter(db, name)
+    return None
+
+# Un cupo reservado no se devuelve si el alta falla: con A=5 y B=6 en vuelo,
+# devolver el 5 haría que el próximo alta reciba otra vez el 6. El número
+# queda sin usar y reclaim_slots lo recupera más tarde, fuera de horario de
+# altas: el contador vuelve al mayor número efectivamente asignado, así los
+# cupos quemados al final de la serie se reutilizan sin repetir números.
+async def reclaim_slots(db, name: str, number_field: str) -> int:
+    spec = COUNTERS[name]
+    last = await db[spec["collection"]].find({number_field: {"$ne": None}}, {number_field: 1}) \
+        .sort(number_field, -1).limit(1).to_list(1)
+    # Nunca por debajo del total de altas (registros viejos sin número)
+    highest = max(last[0][number_field] if last else 0, await db[spec["collection"]].count_documents(spec["filter"]))
+    await db[COUNTERS_COLLECTION].update_one(
+        {"_id": name, "value": {"$gt": highest}},
+        {"$set": {"value": highest, "updated_at": datetime.utcnow()}}
+    )
+    return highest
+
+# ===============================
+# Lectura
+# ===============================
+async def get_count(db, name: str) -> int:
+    doc = await db[COUNTERS_COLLECTION].find_one({"_id": name}, {"value": 1})
+    if doc is None and name in COUNTERS:
+        return await seed_counter(db, name)
+    return doc["value"] if doc else 0
+
+async def get_counts(db, names: Iterable[str]) -> Dict[str, int]:
+    names = list(names)
+    docs = await db[COUNTERS_COLLECTION].find({"_id": {"$in": names}}, {"value": 1}).to_list(len(names))
+    values = {d["_id"]: d["value"] for d in docs}
+    for name in names:
+        if name not in values:
+            values[name] = await seed_counter(db, name) if name in COUNTERS else 0
+    return values
+
+# ===============================
+# Reconciliación
+# ===============================
+async def _set(db, name: str, value: int, now: datetime):
+    await db[COUNTERS_COLLECTION].update_one(
+        {"_id": name},
+        {"$set": {"value": value, "updated_at": now, "reconciled_at": now}},
+        upsert=True
+    )
+
+async def seed_counter(db, name: str) -> int:
+    # Solo crea el contador si no existe: nunca pisa incrementos concurrentes
+    spec = COUNTERS[name]
+    value = await db[spec["collection"]].count_documents(spec["filter"])
+    now = datetime.utcnow()
+    try:
+        await db[COUNTERS_COLLECTION].update_one(
+            {"_id": name},
+            {"$setOnInsert": {"value": value, "updated_at": now, "reconciled_at": now}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        pass  # otro proceso lo sembró en paralelo
+    doc = await db[COUNTERS_COLLECTION].find_one({"_id": name}, {"value": 1})
+    return doc["value"]
+
+async def reconcile_counter(db, name: str) -> int:
+    spec = COUNTERS[name]
+    value = await db[spec["collection"]].count_documents(spec["filter"])
+    try:
+        await _set(db, name, value, datetime.utcnow())
+    except DuplicateKeyError:
+        pass  # otro proceso lo sembró en paralelo
+    return value
+
+async def reconcile_group(db, prefix: str) -> Dict[str, int]:
+    group = GROUPS[prefix]
+    now = datetime.utcnow()
+    rows = await db[group["collection"]].aggregate([
+        {"$group": {"_id": f"${group['field']}", "n": {"$sum": 1}}}
+    ]).to_list(None)
+    values = {group_key(prefix, row["_id"]): row["n"] for row in rows}
+    # Grupos que quedaron vacíos vuelven a 0
+    existing = await db[COUNTERS_COLLECTION].find(
+        {"_id": {"$regex": f"^{prefix}:"}}, {"_id": 1}
+    ).to_list(None)
+    for doc in existing:
+        values.setdefault(doc["_id"], 0)
+    for name, value in values.items():
+        await _set(db, name, value, now)
+    return values
+
+async def reconcile_all(db) -> Dict[str, int]:
+    report = {}
+    for name, spec in COUNTERS.items():
+        if spec["periodic"]:
+            report[name] = await reconcile_counter(db, name)
+    for prefix in GROUPS:
+        report.update(await reconcile_group(db, prefix))
+    return report
+
+# Cada recuento recorre las colecciones contadas: con varios workers solo uno
+# reconcilia por intervalo (lock en Redis, ver utils/job_lock.py)
+reconcile_lock = JobLock("counters_reconcile", COUNTERS_RECONCILE_SECONDS)
+
+async def run_reconciliation(db, interval: float = COUNTERS_RECONCILE_SECONDS, lock: JobLock = reconcile_lock):
+    while True:
+        try:
+            await lock.run(lambda: reconcile_all(db))
+        except Exception as e:
+            logging.warning(f"[COUNTERS] Falló la reconciliación de contadores: {e}")
+        await asyncio.sleep(interval)
+
+# Uso: python -m utils.counters reconcile
+#      python -m utils.counters reclaim <contador> <campo>   (p.ej. founding_member_slots founding_member_number)
+if __name__ == "__main__":
+    from routers.database import mongo_db
+
+    if sys.argv[1:] == ["reconcile"]:
+        print(json.dumps(asyncio.run(reconcile_all(mongo_db)), indent=2))
+    elif len(sys.argv) == 4 and sys.argv[1] == "reclaim":
+        print(asyncio.run(reclaim_slots(mongo_db, sys.argv[2], sys.argv[3])))
+    else:
+        sys.exit("Uso: python -m utils.counters reconcile | reclaim <contador> <campo>")
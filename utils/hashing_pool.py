@@ -0,0 +1,109 @@
+# utils/hashing_pool.py
+
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from collections import deque
+from passlib.context import CryptContext
+from typing import Dict
+import asyncio
+import os
+import threading
+import time
+
+from utils.runtime_stats import register_stats
+
+# === Configuración ===
+# HASH_POOL_KIND: "thread" (por defecto) o "process". bcrypt libera el GIL,
+# así que los threads alcanzan; "process" aísla por completo la CPU de hashing.
+HASH_POOL_KIND = os.getenv("HASH_POOL_KIND", "thread")
+HASH_POOL_WORKERS = int(os.getenv("HASH_POOL_WORKERS", 2))
+HASH_POOL_MAX_QUEUE = int(os.getenv("HASH_POOL_MAX_QUEUE", 32))
+HASH_POOL_RETRY_AFTER = int(os.getenv("HASH_POOL_RETRY_AFTER", 1))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# Funciones a nivel de módulo para que sean picklables en el pool de procesos
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+def _verify(plain_pw: str, hashed_pw: str) -> bool:
+    return pwd_context.verify(plain_pw, hashed_pw)
+
+class HashingPoolBusy(Exception):
+    pass
+
+# === Pool dedicado de hashing con cola acotada ===
+class HashingPool:
+    def __init__(self, kind: str = HASH_POOL_KIND, workers: int = HASH_POOL_WORKERS, max_queue: int = HASH_POOL_MAX_QUEUE):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"HASH_POOL_KIND inválido: {kind}")
+        self.kind = kind
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.failed = 0
+        self._latencies = deque(maxlen=512)
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="hashing")
+        return self._executor
+
+    def submit(self, fn, *args) -> Future:
+        with self._lock:
+            if self._pending >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise HashingPoolBusy()
+            self._pending += 1
+            executor = self._get_executor()
+        started = time.perf_counter()
+        future = executor.submit(fn, *args)
+        future.add_done_callback(lambda f: self._on_done(f, started))
+        return future
+
+    def _on_done(self, future: Future, started: float):
+        with self._lock:
+            self._pending -= 1
+            if future.exception() is not None:
+                self.failed += 1
+            else:
+                self.completed += 1
+            self._latencies.append(time.perf_counter() - started)
+
+    async def hash(self, password: str) -> str:
+        return await asyncio.wrap_future(self.submit(_hash, password))
+
+    async def verify(self, plain_pw: str, hashed_pw: str) -> bool:
+        return await asyncio.wrap_future(self.submit(_verify, plain_pw, hashed_pw))
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+    def stats(self) -> Dict:
+        latencies = sorted(self._latencies)
+        pending = self._pending
+        return {
+            "kind": self.kind,
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "in_flight": min(pending, self.workers),
+            "queue_depth": max(0, pending - self.workers),
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "latency_avg_ms": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+            "latency_p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 2) if latencies else 0.0,
+            "latency_max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        }
+
+hashing_pool = HashingPool()
+register_stats("hashing_pool", hashing_pool.stats)
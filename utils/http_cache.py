@@ -0,0 +1,89 @@
+# utils/http_cache.py
+
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional, Union
+import hashlib
+import json
+import os
+
+from bson import ObjectId
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+# === Configuración ===
+# Endpoints públicos: los navegadores y la CDN pueden servir la copia durante
+# PUBLIC_CACHE_MAX_AGE segundos y, ya vencida, hasta PUBLIC_CACHE_SWR segundos
+# más mientras revalidan en segundo plano (If-None-Match / If-Modified-Since).
+PUBLIC_CACHE_MAX_AGE = int(os.getenv("PUBLIC_CACHE_MAX_AGE", 15))
+PUBLIC_CACHE_SWR = int(os.getenv("PUBLIC_CACHE_SWR", 60))
+
+def json_bytes(payload) -> bytes:
+    data = jsonable_encoder(payload, custom_encoder={ObjectId: str})
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def make_etag(value: Union[bytes, str, int]) -> str:
+    # Versión del snapshot (int/str) o, a falta de ella, el cuerpo ya serializado
+    raw = value if isinstance(value, bytes) else str(value).encode()
+    return f'W/"{hashlib.blake2b(raw, digest_size=12).hexdigest()}"'
+
+def cache_control(max_age: Optional[int] = None, swr: Optional[int] = None) -> str:
+    max_age = PUBLIC_CACHE_MAX_AGE if max_age is None else max_age
+    swr = PUBLIC_CACHE_SWR if swr is None else swr
+    value = f"public, max-age={max_age}, s-maxage={max_age}"
+    return f"{value}, stale-while-revalidate={swr}" if swr else value
+
+def to_datetime(value) -> Optional[datetime]:
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    return None
+
+def _as_utc(dt: datetime) -> datetime:
+    # Los datetimes naive del backend son UTC (datetime.utcnow)
+    dt = dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt.astimezone(timezone.utc)
+    return dt.replace(microsecond=0)
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    # Comparación débil: W/"x" y "x" representan la misma versión
+    bare = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if (candidate[2:] if candidate.startswith("W/") else candidate) == bare:
+            return True
+    return False
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime]) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-None-Match tiene prioridad sobre If-Modified-Since (RFC 9110)
+        return _etag_matches(if_none_match, etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return _as_utc(last_modified) <= _as_utc(since)
+    return False
+
+# ===============================
+# Respuesta con validadores y GET condicional
+# ===============================
+def cached_response(request: Request, body: bytes, *, etag: Optional[str] = None,
+                    last_modified=None, max_age: Optional[int] = None, swr: Optional[int] = None,
+                    media_type: str = "application/json") -> Response:
+    etag = etag or make_etag(body)
+    last_modified = to_datetime(last_modified)
+    headers = {"ETag": etag, "Cache-Control": cache_control(max_age, swr)}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(_as_utc(last_modified), usegmt=True)
+    if is_not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type=media_type, headers=headers)
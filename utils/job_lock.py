@@ -0,0 +1,66 @@
+# utils/job_lock.py
+
+from typing import Awaitable, Callable, Dict, Optional
+import logging
+import uuid
+
+from redis.exceptions import RedisError, WatchError
+
+from utils.redis_pool import get_redis
+
+# ===============================
+# Jobs periódicos: una corrida por intervalo en todo el cluster
+# ===============================
+# Cada worker corre el mismo loop, pero solo el que toma la clave en Redis
+# (SET NX PX) ejecuta el job. La clave no se borra al terminar bien: vence
+# sola a los `ttl` segundos (el intervalo del job), así el resto de los
+# workers no repite el trabajo en ese lapso. Si el job falla se libera para
+# que otro worker pueda reintentar. Sin Redis no se corre: mejor saltear una
+# vuelta que tener a todos los workers recalculando a la vez.
+class JobLock:
+    def __init__(self, name: str, ttl: float):
+        self.name = name
+        self.key = f"zima:jobs:{name}:lock"
+        self.ttl = ttl
+        self.acquired = 0
+        self.skipped = 0
+        self.errors = 0
+
+    async def _acquire(self) -> Optional[str]:
+        token = uuid.uuid4().hex
+        try:
+            if await get_redis().set(self.key, token, nx=True, px=int(self.ttl * 1000)):
+                self.acquired += 1
+                return token
+        except RedisError as e:
+            self.errors += 1
+            logging.warning(f"[JOBS] {self.name}: no se pudo tomar el lock en Redis: {e}")
+            return None
+        self.skipped += 1
+        return None
+
+    async def _release(self, token: str):
+        # Borrar el lock solo si sigue siendo nuestro (puede haber expirado)
+        try:
+            async with get_redis().pipeline(transaction=True) as pipe:
+                await pipe.watch(self.key)
+                if await pipe.get(self.key) == token:
+                    pipe.multi()
+                    pipe.delete(self.key)
+                    await pipe.execute()
+        except (RedisError, WatchError):
+            pass
+
+    async def run(self, fn: Callable[[], Awaitable]) -> bool:
+        token = await self._acquire()
+        if token is None:
+            return False
+        try:
+            await fn()
+        except BaseException:
+            await self._release(token)
+            raise
+        return True
+
+    def stats(self) -> Dict:
+        return {"acquired": self.acquired, "skipped": self.skipped, "errors": self.errors}
@@ -0,0 +1,251 @@
+# utils/journal_store.py
+
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+
+# === Configuración ===
+# JOURNAL_FSYNC: "always" (fsync por evento), "interval" (como mucho cada
+# JOURNAL_FSYNC_INTERVAL segundos) o "never" (lo decide el sistema operativo).
+JOURNAL_FSYNC = os.getenv("JOURNAL_FSYNC", "interval")
+JOURNAL_FSYNC_INTERVAL = float(os.getenv("JOURNAL_FSYNC_INTERVAL", 1))
+JOURNAL_COMPACT_EVERY = int(os.getenv("JOURNAL_COMPACT_EVERY", 1000))
+
+# ===============================
+# Store clave -> registro: snapshot + journal append-only
+# ===============================
+# El snapshot conserva el formato JSON original del archivo (lista de registros
+# con `key_field`, o un objeto {root_key: {clave: registro}}). Cada alta, cambio
+# o baja se agrega como una línea JSON en `<snapshot>.journal`; cada
+# `compact_every` eventos el estado se vuelca al snapshot y el journal se vacía.
+# Todos los eventos son idempotentes ("put" con el registro completo, "patch"
+# de campos, "delete"), así que releer un evento ya aplicado no cambia nada.
+class JournalStore:
+    def __init__(self, snapshot_path: str, key_field: str = "id", root_key: Optional[str] = None,
+                 fsync: str = JOURNAL_FSYNC, compact_every: int = JOURNAL_COMPACT_EVERY):
+        if fsync not in ("always", "interval", "never"):
+            raise ValueError(f"JOURNAL_FSYNC inválido: {fsync}")
+        self.snapshot_path = snapshot_path
+        self.journal_path = f"{snapshot_path}.journal"
+        self.key_field = key_field
+        self.root_key = root_key
+        self.fsync = fsync
+        self.compact_every = compact_every
+        self._lock = threading.RLock()
+        self._state: "OrderedDict[str, Dict]" = OrderedDict()
+        self._snapshot_sig = None
+        self._journal_offset = 0
+        self._pending_events = 0
+        self._last_fsync = 0.0
+        self.loaded = False
+        self.version = 0
+        self.appends = 0
+        self.compactions = 0
+        self.replayed = 0
+        self.skipped_lines = 0
+        os.makedirs(os.path.dirname(snapshot_path) or ".", exist_ok=True)
+
+    # === Lectura de disco ===
+    @staticmethod
+    def _sig(path: str):
+        try:
+            st = os.stat(path)
+            return (st.st_ino, st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            return None
+
+    def _read_snapshot(self) -> "OrderedDict[str, Dict]":
+        state = OrderedDict()
+        if not os.path.exists(self.snapshot_path):
+            return state
+        with open(self.snapshot_path, "r") as f:
+            data = json.load(f)
+        if self.root_key is not None:
+            for key, record in data.get(self.root_key, {}).items():
+                state[key] = record
+        else:
+            for record in data:
+                state[str(record[self.key_field])] = record
+        return state
+
+    def _apply(self, event: Dict):
+        op, key = event.get("op"), event.get("key")
+        if op == "put":
+            self._state[key] = dict(event["value"])
+        elif op == "patch":
+            if key in self._state:
+                self._state[key].update(event["fields"])
+        elif op == "delete":
+            self._state.pop(key, None)
+
+    def _replay_from(self, offset: int) -> int:
+        # Devuelve el offset hasta la última línea completa. Una línea final sin
+        # "\n" es una escritura interrumpida (crash): se ignora.
+        if not os.path.exists(self.journal_path):
+            return 0
+        with open(self.journal_path, "rb") as f:
+            f.seek(offset)
+            chunk = f.read()
+        end = chunk.rfind(b"\n") + 1
+        for line in chunk[:end].splitlines():
+            if not line.strip():
+                continue
+            try:
+                self._apply(json.loads(line))
+                self.replayed += 1
+                self._pending_events += 1
+            except (ValueError, KeyError):
+                self.skipped_lines += 1
+                logging.warning(f"[JOURNAL] Línea inválida ignorada en {self.journal_path}")
+        return offset + end
+
+    def _full_load(self):
+        # La firma se toma antes de leer y se verifica después: si otro proceso
+        # compactó en el medio (snapshot nuevo + journal vaciado) lo leído mezcla
+        # dos estados y se vuelve a leer. No se puede usar flock acá: refresh()
+        # también corre con el LOCK_EX del journal tomado por este proceso.
+        while True:
+            sig = self._sig(self.snapshot_path)
+            self._state = self._read_snapshot()
+            self._pending_events = 0
+            self._journal_offset = self._replay_from(0)
+            if self._sig(self.snapshot_path) == sig:
+                break
+        self._snapshot_sig = sig
+        self.loaded = True
+        self.version += 1
+
+    def refresh(self) -> bool:
+        # Relee solo lo que cambió: si otro proceso compactó (snapshot nuevo) se
+        # recarga todo; si el journal creció, se aplican solo las líneas nuevas.
+        with self._lock:
+            if not self.loaded or self._sig(self.snapshot_path) != self._snapshot_sig:
+                self._full_load()
+                return True
+            size = os.path.getsize(self.journal_path) if os.path.exists(self.journal_path) else 0
+            if size < self._journal_offset:
+                self._full_load()
+                return True
+            if size > self._journal_offset:
+                self._journal_offset = self._replay_from(self._journal_offset)
+                self.version += 1
+                return True
+            return False
+
+    # === Escritura ===
+    def _write_event(self, event: Dict, require: Optional[str] = None) -> bool:
+        # require: "exists" / "absent" se evalúa con el lock tomado, ya al día con disco
+        line = (json.dumps(event, default=str) + "\n").encode()
+        with self._lock:
+            fd = os.open(self.journal_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                # Ponerse al día con otros procesos antes de aplicar el evento
+                self.refresh()
+                present = event["key"] in self._state
+                if (require == "exists" and not present) or (require == "absent" and present):
+                    return False
+                size = os.fstat(fd).st_size
+                if size > self._journal_offset:
+                    # Cola de una escritura interrumpida: descartarla antes de agregar
+                    os.ftruncate(fd, self._journal_offset)
+                os.write(fd, line)
+                self._maybe_fsync(fd)
+                self._journal_offset += len(line)
+                self._apply(event)
+                self.appends += 1
+                self._pending_events += 1
+                self.version += 1
+                if self.compact_every and self._pending_events >= self.compact_every:
+                    self._compact_locked(fd)
+                return True
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+
+    def _maybe_fsync(self, fd: int):
+        now = time.monotonic()
+        if self.fsync == "always" or (self.fsync == "interval" and now - self._last_fsync >= JOURNAL_FSYNC_INTERVAL):
+            os.fsync(fd)
+            self._last_fsync = now
+
+    def _snapshot_payload(self):
+        if self.root_key is not None:
+            return {self.root_key: dict(self._state)}
+        return list(self._state.values())
+
+    def _compact_locked(self, fd: int):
+        tmp_path = f"{self.snapshot_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._snapshot_payload(), f, indent=2, default=str)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        dir_fd = os.open(os.path.dirname(os.path.abspath(self.snapshot_path)), os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+        os.ftruncate(fd, 0)
+        os.fsync(fd)
+        self._journal_offset = 0
+        self._pending_events = 0
+        self._snapshot_sig = self._sig(self.snapshot_path)
+        self.compactions += 1
+
+    def compact(self):
+        with self._lock:
+            fd = os.open(self.journal_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                self.refresh()
+                self._compact_locked(fd)
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+
+    # === API ===
+    def put(self, key: str, record: Dict):
+        self._write_event({"op": "put", "key": str(key), "value": record})
+
+    def insert(self, key: str, record: Dict) -> bool:
+        return self._write_event({"op": "put", "key": str(key), "value": record}, require="absent")
+
+    def patch(self, key: str, **fields) -> bool:
+        return self._write_event({"op": "patch", "key": str(key), "fields": fields}, require="exists")
+
+    def delete(self, key: str) -> bool:
+        return self._write_event({"op": "delete", "key": str(key)}, require="exists")
+
+    def get(self, key: str) -> Optional[Dict]:
+        record = self._state.get(str(key))
+        return dict(record) if record is not None else None
+
+    def __contains__(self, key: str) -> bool:
+        return str(key) in self._state
+
+    def items(self) -> Iterator:
+        return iter(list(self._state.items()))
+
+    def values(self) -> List[Dict]:
+        return [dict(r) for r in self._state.values()]
+
+    def as_dict(self) -> Dict[str, Dict]:
+        return {k: dict(v) for k, v in self._state.items()}
+
+    def stats(self) -> Dict:
+        return {
+            "snapshot": self.snapshot_path,
+            "records": len(self._state),
+            "fsync": self.fsync,
+            "appends": self.appends,
+            "pending_events": self._pending_events,
+            "compactions": self.compactions,
+            "replayed": self.replayed,
+            "skipped_lines": self.skipped_lines,
+        }
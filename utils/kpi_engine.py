@@ -0,0 +1,247 @@
+# utils/kpi_engine.py
+
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+import asyncio
+import json
+import logging
+import os
+
+import numpy as np
+from pymongo import ASCENDING
+
+from utils.counters import get_count
+from utils.mongo_indexes import register_index
+from utils.redis_pool import get_redis
+from utils.singleflight import SingleFlight
+
+# === Configuración ===
+KPI_BATCH_SIZE = int(os.getenv("KPI_BATCH_SIZE", 5000))
+KPI_REFRESH_SECONDS = float(os.getenv("KPI_REFRESH_SECONDS", 60))
+KPI_SHARPE_PERIODS = float(os.getenv("KPI_SHARPE_PERIODS", 1))  # factor de anualización (√periodos)
+KPI_ROI_WINDOW_DAYS = int(os.getenv("KPI_ROI_WINDOW_DAYS", 30))
+
+# Claves donde se publica el snapshot (las que leen los endpoints de KPIs)
+KPI_REDIS_KEYS = ("zima:kpis:global", "public:kpis:latest")
+KPI_STATE_ID = "engine_state"
+KPI_SNAPSHOT_ID = "global"
+
+# Señales cerradas: tienen `roi` (fracción, 0.05 = +5%) y `closed_at`
+register_index("signals", [("closed_at", ASCENDING), ("_id", ASCENDING)])
+
+_EPOCH = np.datetime64("1970-01-01T00:00:00", "us")
+
+# ===============================
+# Acumulador incremental (NumPy)
+# ===============================
+# Todo lo que mantiene es combinable por lotes: conteos y sumas, la curva de
+# equity en log (para el drawdown) y buckets diarios de ROI para la ventana móvil.
+class KPIAccumulator:
+    def __init__(self, state: Optional[Dict] = None):
+        state = state or {}
+        self.count = int(state.get("count", 0))
+        self.wins = int(state.get("wins", 0))
+        self.sum_roi = float(state.get("sum_roi", 0.0))
+        self.sum_sq = float(state.get("sum_sq", 0.0))
+        self.log_equity = float(state.get("log_equity", 0.0))
+        self.peak_log_equity = float(state.get("peak_log_equity", 0.0))
+        self.max_drawdown = float(state.get("max_drawdown", 0.0))
+        self.sum_drawdown = float(state.get("sum_drawdown", 0.0))
+        self.daily = {int(k): v for k, v in state.get("daily", {}).items()}
+        self.models = set(state.get("models", []))
+
+    def update(self, roi: np.ndarray, closed_day: np.ndarray, models=()):
+        if roi.size == 0:
+            return
+        roi = np.clip(roi.astype(np.float64), -0.999999, None)
+        self.count += int(roi.size)
+        self.wins += int(np.count_nonzero(roi > 0))
+        self.sum_roi += float(roi.sum())
+        self.sum_sq += float(np.dot(roi, roi))
+
+        curve = self.log_equity + np.cumsum(np.log1p(roi))
+        peaks = np.maximum.accumulate(np.maximum(curve, self.peak_log_equity))
+        drawdowns = 1.0 - np.exp(curve - peaks)
+        self.max_drawdown = max(self.max_drawdown, float(drawdowns.max()))
+        self.sum_drawdown += float(drawdowns.sum())
+        self.log_equity = float(curve[-1])
+        self.peak_log_equity = float(peaks[-1])
+
+        days, inverse = np.unique(closed_day, return_inverse=True)
+        counts = np.bincount(inverse)
+        sums = np.bincount(inverse, weights=roi)
+        for day, n, total in zip(days.tolist(), counts.tolist(), sums.tolist()):
+            bucket = self.daily.setdefault(day, [0, 0.0])
+            bucket[0] += n
+            bucket[1] += total
+        self.models.update(m for m in models if m)
+
+    def prune(self, today: int, window_days: int = KPI_ROI_WINDOW_DAYS):
+        self.daily = {d: v for d, v in self.daily.items() if d > today - window_days}
+
+    def to_state(self) -> Dict:
+        return {
+            "count": self.count,
+            "wins": self.wins,
+            "sum_roi": self.sum_roi,
+            "sum_sq": self.sum_sq,
+            "log_equity": self.log_equity,
+            "peak_log_equity": self.peak_log_equity,
+            "max_drawdown": self.max_drawdown,
+            "sum_drawdown": self.sum_drawdown,
+            "daily": {str(k): v for k, v in self.daily.items()},
+            "models": sorted(self.models),
+        }
+
+    def metrics(self, today: int) -> Dict:
+        n = self.count
+        mean = self.sum_roi / n if n else 0.0
+        variance = max(self.sum_sq / n - mean * mean, 0.0) if n else 0.0
+        std = variance ** 0.5
+        window = [v for d, v in self.daily.items() if d > today - KPI_ROI_WINDOW_DAYS]
+        return {
+            "win_rate": round(self.wins / n, 4) if n else 0.0,
+            "avg_roi": round(mean, 6),
+            "roi_month": round(sum(v[1] for v in window), 6),
+            "sharpe": round(mean / std * KPI_SHARPE_PERIODS ** 0.5, 4) if std > 0 else 0.0,
+            "drawdown": round(self.max_drawdown, 6),
+            "drawdown_avg": round(self.sum_drawdown / n, 6) if n else 0.0,
+            "closed_signals": n,
+            "active_models": len(self.models),
+        }
+
+def to_epoch_days(values) -> np.ndarray:
+    stamps = np.array(values, dtype="datetime64[us]")
+    return ((stamps - _EPOCH) // np.timedelta64(1, "D")).astype(np.int64)
+
+# ===============================
+# Motor: lotes incrementales desde el high-water mark
+# ===============================
+class KPIEngine:
+    def __init__(self, db, batch_size: int = KPI_BATCH_SIZE):
+        self.db = db
+        self.batch_size = batch_size
+        self.runs = 0
+        self.conflicts = 0
+        self.processed = 0
+
+    def _pending_filter(self, hwm: Optional[Dict]) -> Dict:
+        query = {"roi": {"$ne": None}, "closed_at": {"$ne": None}}
+        if hwm:
+            query["$or"] = [
+                {"closed_at": {"$gt": hwm["closed_at"]}},
+                {"closed_at": hwm["closed_at"], "_id": {"$gt": hwm["_id"]}},
+            ]
+        return query
+
+    async def refresh(self, now: Optional[datetime] = None) -> Dict:
+        now = now or datetime.utcnow()
+        state = await self.db.kpis.find_one({"_id": KPI_STATE_ID}) or {}
+        seq = state.get("seq", 0)
+        acc = KPIAccumulator(state.get("accumulator"))
+        hwm = state.get("hwm")
+
+        while True:
+            batch = await self.db.signals.find(
+                self._pending_filter(hwm),
+                {"roi": 1, "closed_at": 1, "model_version": 1}
+            ).sort([("closed_at", ASCENDING), ("_id", ASCENDING)]).limit(self.batch_size).to_list(self.batch_size)
+            if not batch:
+                break
+            roi = np.fromiter((d["roi"] for d in batch), dtype=np.float64, count=len(batch))
+            acc.update(roi, to_epoch_days([d["closed_at"] for d in batch]), (d.get("model_version") for d in batch))
+            hwm = {"closed_at": batch[-1]["closed_at"], "_id": batch[-1]["_id"]}
+            self.processed += len(batch)
+            if len(batch) < self.batch_size:
+                break
+
+        today = int(to_epoch_days([now])[0])
+        acc.prune(today)
+        snapshot = acc.metrics(today)
+        snapshot.update({
+            "total_signals": await get_count(self.db, "signals"),
+            "signals_last_24h": await self.db.signals.count_documents({"timestamp": {"$gte": now - timedelta(hours=24)}}),
+            "updated_at": now,
+            "version": seq + 1,
+        })
+        # Alias para los distintos contratos de respuesta existentes
+        snapshot["roi"] = snapshot["avg_roi"]
+        snapshot["sharpe_ratio"] = snapshot["sharpe"]
+        snapshot["last_updated"] = now
+
+        # Escritura condicional: si otro worker avanzó el estado, se descarta este pase
+        result = await self.db.kpis.update_one(
+            {"_id": KPI_STATE_ID, "seq": seq} if state else {"_id": KPI_STATE_ID, "seq": {"$exists": False}},
+            {"$set": {"seq": seq + 1, "hwm": hwm, "accumulator": acc.to_state(), "updated_at": now}},
+            upsert=not state
+        )
+        if not state or result.matched_count:
+            self.runs += 1
+            await self.db.kpis.replace_one({"_id": KPI_SNAPSHOT_ID}, {"_id": KPI_SNAPSHOT_ID, **snapshot}, upsert=True)
+            await publish_snapshot(snapshot)
+        else:
+            self.conflicts += 1
+        return snapshot
+
+    def stats(self) -> Dict:
+        return {"runs": self.runs, "conflicts": self.conflicts, "processed_signals": self.processed}
+
+# ===============================
+# Publicación y lectura del snapshot
+# ===============================
+async def publish_snapshot(snapshot: Dict):
+    payload = json.dumps(snapshot, default=lambda v: v.isoformat() if isinstance(v, datetime) else str(v))
+    pipe = get_redis().pipeline(transaction=True)
+    for key in KPI_REDIS_KEYS:
+        pipe.set(key, payload)
+    await pipe.execute()
+
+snapshot_flight = SingleFlight("kpi_snapshot")
+
+async def _load_snapshot(db) -> Optional[Dict]:
+    doc = await db.kpis.find_one({"_id": KPI_SNAPSHOT_ID})
+    if doc:
+        doc.pop("_id", None)
+        await publish_snapshot(doc)  # recalentar las claves de Redis
+    return doc
+
+async def read_snapshot(db) -> Optional[Dict]:
+    data = await get_redis().get(KPI_REDIS_KEYS[0])
+    if data:
+        return json.loads(data)
+    # Miss en Redis: una sola lectura a Mongo por proceso, el resto la espera
+    return await snapshot_flight.do(KPI_SNAPSHOT_ID, lambda: _load_snapshot(db))
+
+# Quien escribe señales cerradas puede adelantar el próximo pase del worker
+# local en vez de esperar el intervalo completo
+_wake = asyncio.Event()
+
+def request_refresh():
+    _wake.set()
+
+async def run_kpi_engine(engine: KPIEngine, interval: float = KPI_REFRESH_SECONDS):
+    while True:
+        _wake.clear()
+        try:
+            await engine.refresh()
+        except Exception as e:
+            logging.warning(f"[KPI] Falló el recálculo de KPIs: {e}")
+        try:
+            await asyncio.wait_for(_wake.wait(), interval)
+        except asyncio.TimeoutError:
+            pass
+
+# Uso: python -m utils.kpi_engine  (un pase de recálculo e imprime el snapshot)
+if __name__ == "__main__":
+    from routers.database import mongo_db
+    from utils.redis_pool import init_redis, close_redis
+
+    async def _main():
+        init_redis()
+        try:
+            snapshot = await KPIEngine(mongo_db).refresh()
+            print(json.dumps(snapshot, indent=2, default=str))
+        finally:
+            await close_redis()
+
+    asyncio.run(_main())
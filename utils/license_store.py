@@ -0,0 +1,117 @@
+# utils/license_store.py
+
+from typing import Dict, List, Optional
+import os
+import threading
+import time
+
+from utils.journal_store import JournalStore
+from utils.runtime_stats import register_stats
+
+LICENSES_PATH = "data/licenses.json"
+# Keys de partners emitidas por /api/licenses/generate: {"partners": {nombre: registro}}
+PARTNER_KEYS_PATH = "config/partner_keys.json"
+LICENSE_STORE_RECHECK_SECONDS = float(os.getenv("LICENSE_STORE_RECHECK_SECONDS", 1))
+
+# ===============================
+# Store de licencias en memoria
+# ===============================
+# Se carga una vez y queda indexado por api_key e id. Las altas y revocaciones
+# se agregan al journal append-only (utils/journal_store.py) y el índice se
+# actualiza solo cuando el snapshot o el journal cambian en disco.
+class LicenseStore:
+    def __init__(self, path: str = LICENSES_PATH, recheck_interval: float = LICENSE_STORE_RECHECK_SECONDS,
+                 root_key: Optional[str] = None):
+        self.path = path
+        self.recheck_interval = recheck_interval
+        self._journal = JournalStore(path, key_field="id", root_key=root_key)
+        self._lock = threading.RLock()
+        self._by_key: Dict[str, Dict] = {}
+        self._by_id: Dict[str, Dict] = {}
+        self._indexed_version = None
+        self._last_check = 0.0
+        self.reloads = 0
+        self.lookups = 0
+
+    def _reindex(self):
+        records = self._journal.values()
+        self._by_key = {r["api_key"]: r for r in records if "api_key" in r}
+        self._by_id = {key: r for key, r in self._journal.items()}
+        self._indexed_version = self._journal.version
+        self.reloads += 1
+
+    def _refresh(self, force: bool = False):
+        now = time.monotonic()
+        if not force and self._indexed_version is not None and now - self._last_check < self.recheck_interval:
+            return
+        with self._lock:
+            self._last_check = now
+            self._journal.refresh()
+            if self._journal.version != self._indexed_version:
+                self._reindex()
+
+    # === Lecturas (sin I/O salvo el chequeo periódico de cambios) ===
+    def all(self) -> List[Dict]:
+        self._refresh()
+        return [dict(r) for r in self._by_id.values()]
+
+    def get_by_key(self, api_key: str) -> Optional[Dict]:
+        self._refresh()
+        self.lookups += 1
+        record = self._by_key.get(api_key)
+        return dict(record) if record else None
+
+    def get_by_id(self, license_id: str) -> Optional[Dict]:
+        self._refresh()
+        record = self._by_id.get(license_id)
+        return dict(record) if record else None
+
+    # Versión del índice: cambia con cada alta/revocación (propia o de otro proceso)
+    def current_version(self) -> int:
+        self._refresh()
+        return self._indexed_version
+
+    # === Escrituras (write-through al journal) ===
+    def add(self, record: Dict) -> Dict:
+        with self._lock:
+            self._journal.put(record["id"], dict(record))
+            self._refresh(force=True)
+        return record
+
+    def insert(self, key: str, record: Dict) -> bool:
+        # Alta solo si la clave no existe (p.ej. un partner por nombre)
+        with self._lock:
+            inserted = self._journal.insert(key, dict(record))
+            self._refresh(force=True)
+        return inserted
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            deleted = self._journal.delete(key)
+            self._refresh(force=True)
+        return deleted
+
+    def as_dict(self) -> Dict[str, Dict]:
+        self._refresh()
+        return {key: dict(r) for key, r in self._by_id.items()}
+
+    def update(self, license_id: str, **fields) -> Optional[Dict]:
+        with self._lock:
+            if not self._journal.patch(license_id, **fields):
+                return None
+            self._refresh(force=True)
+            return self.get_by_id(license_id)
+
+    def stats(self) -> Dict:
+        return {
+            "path": self.path,
+            "licenses": len(self._by_id),
+            "reloads": self.reloads,
+            "lookups": self.lookups,
+            "journal": self._journal.stats(),
+        }
+
+license_store = LicenseStore()
+register_stats("license_store", license_store.stats)
+partner_key_store = LicenseStore(PARTNER_KEYS_PATH, root_key="partners")
+register_stats("partner_key_store", partner_key_store.stats)
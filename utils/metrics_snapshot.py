@@ -0,0 +1,103 @@
+# utils/metrics_snapshot.py
+
+from datetime import datetime
+from typing import Dict
+import json
+import os
+import time
+
+from fastapi import Request, Response
+from pydantic import BaseModel
+
+from utils.http_cache import cached_response, json_bytes, make_etag
+
+# === Configuración ===
+# Ruta de simulación para métricas
+METRICS_PATH = "data/metrics.json"
+METRICS_RECHECK_SECONDS = float(os.getenv("METRICS_RECHECK_SECONDS", 1))
+
+class KPI(BaseModel):
+    total_signals: int
+    win_rate: float
+    avg_rating: float
+    avg_roi: float
+    active_users: int
+    model_version: str
+    updated_at: datetime
+
+def _read_metrics_file(path: str = METRICS_PATH) -> Dict:
+    if not os.path.exists(path):
+        return {
+            "total_signals": 4200,
+            "win_rate": 0.864,
+            "avg_rating": 4.6,
+            "avg_roi": 0.72,
+            "active_users": 137,
+            "model_version": "ZIMA-RL-v5",
+            "updated_at": datetime.utcnow().isoformat()
+        }
+    with open(path, "r") as f:
+        return json.load(f)
+
+def build_dashboard(data: Dict) -> Dict:
+    return {
+        "status": "✅ ZIMA Metrics API Online",
+        "global_metrics": {
+            "signals_generated": data["total_signals"],
+            "average_roi": f"{round(data['avg_roi'] * 100, 2)}%",
+            "win_rate": f"{round(data['win_rate'] * 100, 2)}%",
+            "active_users": data["active_users"],
+            "model_version": data["model_version"]
+        },
+        "last_update": data["updated_at"]
+    }
+
+# ===============================
+# Documento de métricas en memoria
+# ===============================
+# Se relee solo si cambia el mtime/tamaño del archivo (como mucho una vez cada
+# recheck_interval) y guarda ya serializadas las respuestas de /metrics/kpis y
+# /public/dashboard: sin lectura, parseo ni validación por request.
+class MetricsSnapshot:
+    def __init__(self, path: str = METRICS_PATH, recheck_interval: float = METRICS_RECHECK_SECONDS):
+        self.path = path
+        self.recheck_interval = recheck_interval
+        self._sig = None
+        self._last_check = 0.0
+        self.loaded = False
+        self.data: Dict = {}
+        self.kpi_bytes = b""
+        self.dashboard_bytes = b""
+        self.dashboard_etag = ""
+        self.reloads = 0
+
+    def _file_sig(self):
+        try:
+            st = os.stat(self.path)
+            return (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            return None
+
+    def refresh(self):
+        now = time.monotonic()
+        if self.loaded and now - self._last_check < self.recheck_interval:
+            return
+        self._last_check = now
+        sig = self._file_sig()
+        if self.loaded and sig == self._sig:
+            return
+        data = _read_metrics_file(self.path)
+        self.kpi_bytes = json_bytes(KPI(**data))
+        self.dashboard_bytes = json_bytes(build_dashboard(data))
+        self.dashboard_etag = make_etag(self.dashboard_bytes)
+        self.data, self._sig, self.loaded = data, sig, True
+        self.reloads += 1
+
+    def kpis_response(self) -> Response:
+        self.refresh()
+        return Response(content=self.kpi_bytes, media_type="application/json")
+
+    def dashboard_response(self, request: Request) -> Response:
+        self.refresh()
+        return cached_response(request, self.dashboard_bytes, etag=self.dashboard_etag,
+                               last_modified=self.data.get("updated_at"))
@@ -0,0 +1,125 @@
+# utils/mongo_indexes.py
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import PyMongoError
+from typing import Dict, List, Optional
+import asyncio
+import json
+import logging
+import sys
+
+# ===============================
+# Registro declarativo de índices
+# ===============================
+# Cada módulo que introduce una consulta caliente registra acá su índice;
+# el arranque de la app los aplica de forma idempotente (create_index no
+# hace nada si el índice ya existe con la misma definición).
+INDEXES: List[Dict] = []
+HOT_QUERIES: List[Dict] = []
+
+def register_index(collection: str, keys: List[tuple], **options):
+    options.setdefault("name", "_".join(f"{field}_{direction}" for field, direction in keys))
+    INDEXES.append({"collection": collection, "keys": keys, "options": options})
+
+def register_hot_query(name: str, collection: str, filter: Dict = None, sort: Optional[List[tuple]] = None, limit: int = 0):
+    HOT_QUERIES.append({
+        "name": name,
+        "collection": collection,
+        "filter": filter or {},
+        "sort": sort,
+        "limit": limit
+    })
+
+# ===============================
+# Índices y consultas calientes actuales
+# ===============================
+register_index("signals", [("timestamp", DESCENDING)])
+register_index("signals", [("created_at", DESCENDING)])
+register_index("licenses", [("token_id", ASCENDING)], unique=True)
+register_index("user_kpis", [("user_id", ASCENDING)])
+register_index("users", [("email", ASCENDING)], unique=True)
+register_index("tenants", [("stripe_customer_id", ASCENDING)])
+register_index("usage_logs", [("tenant_id", ASCENDING), ("timestamp", DESCENDING)])
+register_index("purchases", [("buyer_id", ASCENDING), ("timestamp", DESCENDING)])
+register_index("purchases", [("signal_id", ASCENDING)])
+register_index("founding_members", [("user_id", ASCENDING)])
+# Red de seguridad de los cupos: un número de Founding Member no se repite
+register_index("founding_members", [("founding_member_number", ASCENDING)], unique=True,
+               partialFilterExpression={"founding_member_number": {"$exists": True}})
+
+register_hot_query("public_signals", "signals", sort=[("timestamp", DESCENDING)], limit=20)
+register_hot_query("last_signal", "signals", sort=[("created_at", DESCENDING)], limit=1)
+register_hot_query("license_by_token", "licenses", {"token_id": "audit"})
+register_hot_query("user_kpis_by_user", "user_kpis", {"user_id": 0}, limit=100)
+register_hot_query("user_by_email", "users", {"email": "audit@zima.ai"})
+register_hot_query("tenant_by_stripe_customer", "tenants", {"stripe_customer_id": "cus_audit"})
+
+# ===============================
+# Aplicar índices (arranque)
+# ===============================
+async def ensure_indexes(db) -> Dict:
+    created, failed = [], []
+    for spec in INDEXES:
+        try:
+            name = await db[spec["collection"]].create_index(spec["keys"], **spec["options"])
+            created.append(f"{spec['collection']}.{name}")
+        except PyMongoError as e:
+            failed.append(f"{spec['collection']}.{spec['options']['name']}")
+            logging.warning(f"[MONGO] No se pudo crear el índice {spec['collection']}.{spec['options']['name']}: {e}")
+    return {"created": created, "failed": failed}
+
+# ===============================
+# Auditoría de planes de ejecución
+# ===============================
+def plan_stages(plan: Dict) -> List[str]:
+    stages = []
+    if not isinstance(plan, dict):
+        return stages
+    if "stage" in plan:
+        stages.append(plan["stage"])
+    for key in ("inputStage", "queryPlan"):
+        stages.extend(plan_stages(plan.get(key)))
+    for child in plan.get("inputStages", []):
+        stages.extend(plan_stages(child))
+    return stages
+
+def winning_plan(explain: Dict) -> Dict:
+    planner = explain.get("queryPlanner", {})
+    plan = planner.get("winningPlan", {})
+    # Con el motor SBE el plan clásico viene anidado en "queryPlan"
+    return plan.get("queryPlan", plan)
+
+async def audit_hot_queries(db) -> List[Dict]:
+    report = []
+    for query in HOT_QUERIES:
+        cursor = db[query["collection"]].find(query["filter"])
+        if query["sort"]:
+            cursor = cursor.sort(query["sort"])
+        if query["limit"]:
+            cursor = cursor.limit(query["limit"])
+        explain = await cursor.explain()
+        stages = plan_stages(winning_plan(explain))
+        report.append({
+            "name": query["name"],
+            "collection": query["collection"],
+            "stages": stages,
+            "collscan": "COLLSCAN" in stages,
+            "in_memory_sort": "SORT" in stages
+        })
+    return report
+
+# Uso: python -m utils.mongo_indexes [ensure|audit]
+if __name__ == "__main__":
+    from routers.database import mongo_db
+
+    async def _main(command: str) -> int:
+        if command == "ensure":
+            print(json.dumps(await ensure_indexes(mongo_db), indent=2))
+            return 0
+        report = await audit_hot_queries(mongo_db)
+        for row in report:
+            flag = "❌ COLLSCAN" if row["collscan"] else ("⚠️ SORT en memoria" if row["in_memory_sort"] else "✅")
+            print(f"{flag:<20} {row['collection']}.{row['name']}: {' <- '.join(row['stages'])}")
+        return 1 if any(row["collscan"] for row in report) else 0
+
+    sys.exit(asyncio.run(_main(sys.argv[1] if len(sys.argv) > 1 else "audit")))
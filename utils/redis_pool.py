@@ -0,0 +1,100 @@
+# utils/redis_pool.py
+
+from typing import Dict, Optional
+import os
+import time
+
+import redis.asyncio as aioredis
+from redis.asyncio.client import Pipeline
+
+from utils.runtime_stats import register_stats
+from utils.telemetry import observe_downstream
+
+# === Configuración Redis (async) ===
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 50))
+REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", 2))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", 1))
+REDIS_CONNECT_TIMEOUT = float(os.getenv("REDIS_CONNECT_TIMEOUT", 1))
+REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", 30))
+
+# ===============================
+# Pool compartido por todo el proceso
+# ===============================
+# BlockingConnectionPool: si se agotan las conexiones, espera hasta
+# REDIS_POOL_TIMEOUT en lugar de abrir conexiones sin límite.
+_pool: Optional[aioredis.BlockingConnectionPool] = None
+_client: Optional[aioredis.Redis] = None
+
+# Cliente que mide cada comando (y cada pipeline como una sola operación)
+class InstrumentedPipeline(Pipeline):
+    async def execute(self, raise_on_error: bool = True):
+        start, failed = time.perf_counter(), False
+        try:
+            return await super().execute(raise_on_error)
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            observe_downstream("redis", "PIPELINE", time.perf_counter() - start, failed)
+
+class InstrumentedRedis(aioredis.Redis):
+    async def execute_command(self, *args, **options):
+        start, failed = time.perf_counter(), False
+        try:
+            return await super().execute_command(*args, **options)
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            observe_downstream("redis", str(args[0]).upper(), time.perf_counter() - start, failed)
+
+    def pipeline(self, transaction: bool = True, shard_hint: Optional[str] = None) -> Pipeline:
+        return InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+def build_pool(url: str = REDIS_URL, **overrides) -> aioredis.BlockingConnectionPool:
+    kwargs = dict(
+        max_connections=REDIS_MAX_CONNECTIONS,
+        timeout=REDIS_POOL_TIMEOUT,
+        socket_timeout=REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+        health_check_interval=REDIS_HEALTH_CHECK_INTERVAL,
+        decode_responses=True,
+    )
+    kwargs.update(overrides)
+    return aioredis.BlockingConnectionPool.from_url(url, **kwargs)
+
+def init_redis(pool: Optional[aioredis.BlockingConnectionPool] = None) -> aioredis.Redis:
+    global _pool, _client
+    _pool = pool or build_pool()
+    _client = InstrumentedRedis(connection_pool=_pool)
+    return _client
+
+# Dependencia / accesor: el cliente es liviano, las conexiones viven en el pool
+def get_redis() -> aioredis.Redis:
+    if _client is None:
+        return init_redis()
+    return _client
+
+async def close_redis():
+    global _pool, _client
+    if _client is not None:
+        await _client.aclose()
+    if _pool is not None:
+        await _pool.disconnect()
+    _pool, _client = None, None
+
+def redis_stats() -> Dict:
+    if _pool is None:
+        return {"initialized": False}
+    in_use = len(_pool._in_use_connections)
+    idle = sum(1 for c in _pool._available_connections if c is not None)
+    return {
+        "initialized": True,
+        "max_connections": _pool.max_connections,
+        "in_use": in_use,
+        "idle": idle,
+        "utilization": round(in_use / _pool.max_connections, 4) if _pool.max_connections else 0.0,
+    }
+
+register_stats("redis_pool", redis_stats)
@@ -0,0 +1,20 @@
+# utils/runtime_stats.py
+
+from typing import Callable, Dict
+
+# === Registro de estadísticas de runtime ===
+# Cada componente (caches, pools, colas...) registra una función que devuelve
+# un dict con sus contadores; los endpoints internos los exponen juntos.
+_providers: Dict[str, Callable[[], Dict]] = {}
+
+def register_stats(name: str, provider: Callable[[], Dict]):
+    _providers[name] = provider
+
+def collect_stats() -> Dict[str, Dict]:
+    snapshot = {}
+    for name, provider in list(_providers.items()):
+        try:
+            snapshot[name] = provider()
+        except Exception as e:
+            snapshot[name] = {"error": str(e)}
+    return snapshot
@@ -7,45 +7,152 @@ from datetime import datetime, timedelta
 import os
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from models.user import get_user_by_email, User, get_db
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from models.user import get_user_by_email_async, User, get_db, get_async_db, AsyncSessionLocal
+from utils.cache import TTLCache
+from utils.runtime_stats import register_stats
+from utils.token_revocation import TokenRevocations
 
 # === Configuración JWT ===
 SECRET_KEY = os.getenv("JWT_SECRET", "supersecretkeyzima")
 ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 1440))
+# Opt-in: tokens que firman role/plan/tenant_id para autorizar sin consultar la DB
+JWT_CLAIMS_TOKENS = os.getenv("JWT_CLAIMS_TOKENS", "false").lower() in ("1", "true", "yes")
 
 # === Criptografía de contraseñas ===
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
+# === Cache de principales autenticados (sub del token -> User) ===
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", 10000))
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", 60))
+principal_cache = TTLCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL)
+# id de usuario -> sub, para invalidar por id. Mismo tamaño y TTL que el cache:
+# una entrada que ya salió de principal_cache no hace falta encontrarla por id
+_subject_by_user_id = TTLCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL)
+register_stats("principal_cache", principal_cache.stats)
+
+# === Versiones de token (revocación de claims) ===
+token_revocations = TokenRevocations()
+register_stats("token_revocations", token_revocations.stats)
+
+# === Principal autenticado (lo que viaja en un token con claims) ===
+class Principal(BaseModel):
+    email: str
+    id: Optional[int] = None
+    role: str = "user"
+    plan: str = "freemium"
+    tenant_id: Optional[str] = None
+
+    @classmethod
+    def from_user(cls, user) -> "Principal":
+        return cls(
+            email=user.email,
+            id=user.id,
+            role=user.role or "user",
+            plan=user.plan or "freemium",
+            tenant_id=getattr(user, "tenant_id", None)
+        )
+
 # === Funciones de contraseña ===
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    return pwd_context.hash(password)
 
 def verify_password(plain_pw: str, hashed_pw: str) -> bool:
-    return pwd_context.verify(plain_pw, hashed_pw)
+    return pwd_context.verify(plain_pw, hashed_pw)
 
 # === Funciones JWT ===
 def create_access_token(data: dict, expires_delta: timedelta = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)):
-    to_encode = data.copy()
-    expire = datetime.utcnow() + expires_delta
-    to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    to_encode = data.copy()
+    expire = datetime.utcnow() + expires_delta
+    to_encode.update({"exp": expire})
+    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 def decode_access_token(token: str):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload.get("sub")
-    except JWTError:
-        return None
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        return payload.get("sub")
+    except JWTError:
+        return None
+
+def decode_token_claims(token: str) -> Optional[dict]:
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+
+def _version_subjects(email: str, user_id) -> tuple:
+    return (email, f"id:{user_id}" if user_id is not None else None)
+
+async def create_claims_token(user, expires_delta: timedelta = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)):
+    principal = Principal.from_user(user)
+    return create_access_token({
+        "sub": principal.email,
+        "uid": principal.id,
+        "role": principal.role,
+        "plan": principal.plan,
+        "tid": principal.tenant_id,
+        "ver": await token_revocations.current_version(*_version_subjects(principal.email, principal.id)),
+        "typ": "claims"
+    }, expires_delta)
+
+# Formato de token según configuración (clásico con solo "sub" o con claims)
+async def issue_access_token(user) -> str:
+    if JWT_CLAIMS_TOKENS:
+        return await create_claims_token(user)
+    return create_access_token(data={"sub": user.email})
+
+# === Invalidación de principales cacheados ===
+# Llamar siempre que cambie el plan o el rol de un usuario (admin, webhooks de Stripe).
+async def invalidate_principal(email: str = None, user_id=None):
+    if user_id is not None:
+        await token_revocations.bump(f"id:{user_id}")
+        email = _subject_by_user_id.get(str(user_id)) or email
+        _subject_by_user_id.invalidate(str(user_id))
+    if email:
+        await token_revocations.bump(email)
+        principal_cache.invalidate(email)
+
+def invalidate_all_principals():
+    principal_cache.clear()
+    _subject_by_user_id.clear()
 
 # === Dependencia para obtener usuario autenticado ===
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
-    email = decode_access_token(token)
-    if not email:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token inválido")
-    user = get_user_by_email(db, email)
-    if not user:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Usuario no encontrado")
-    return user
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)) -> User:
+    email = decode_access_token(token)
+    if not email:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token inválido")
+    user = principal_cache.get(email)
+    if user is not None:
+        return user
+    user = await get_user_by_email_async(db, email)
+    if not user:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Usuario no encontrado")
+    # Se cachea desacoplado de la sesión: solo se leen atributos ya cargados
+    db.expunge(user)
+    principal_cache.set(email, user)
+    _subject_by_user_id.set(str(user.id), email)
+    return user
+
+# === Dependencia liviana: principal autenticado ===
+# Con un token de claims vigente autoriza sin I/O; si el token es clásico o sus
+# claims quedaron desactualizados (versión revocada) resuelve contra cache/DB.
+async def get_current_principal(token: str = Depends(oauth2_scheme)) -> Principal:
+    payload = decode_token_claims(token)
+    if not payload or not payload.get("sub"):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token inválido")
+    if payload.get("typ") == "claims":
+        subjects = _version_subjects(payload["sub"], payload.get("uid"))
+        if not await token_revocations.is_stale(payload.get("ver", 0), *subjects):
+            return Principal(
+                email=payload["sub"],
+                id=payload.get("uid"),
+                role=payload.get("role", "user"),
+                plan=payload.get("plan", "freemium"),
+                tenant_id=payload.get("tid")
+            )
+    async with AsyncSessionLocal() as db:
+        return Principal.from_user(await get_current_user(token, db))
@@ -0,0 +1,86 @@
+# utils/signal_feed.py
+
+from datetime import datetime
+from itertools import combinations
+from typing import Dict, List, Optional, Tuple
+import base64
+import json
+import os
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ASCENDING, DESCENDING
+
+from utils.mongo_indexes import register_index, register_hot_query
+
+# === Configuración ===
+FEED_DEFAULT_LIMIT = int(os.getenv("FEED_DEFAULT_LIMIT", 20))
+FEED_MAX_LIMIT = int(os.getenv("FEED_MAX_LIMIT", 100))
+
+FEED_FILTERS = ("asset", "timeframe", "prediction")
+FEED_SORT = [("timestamp", DESCENDING), ("_id", DESCENDING)]
+
+# ===============================
+# Índices del feed (igualdad -> orden; confidence se filtra sobre el rango)
+# ===============================
+# Cada combinación de filtros tiene su índice: los campos de igualdad como
+# prefijo y después (timestamp, _id). Así la página es un recorrido de índice
+# acotado por el cursor, sin SORT en memoria, a cualquier profundidad. Un
+# índice solo sirve a su combinación exacta: (asset, timeframe, timestamp)
+# no ordena un filtro por asset solo, porque entre asset y timestamp queda
+# timeframe. Con 3 filtros son 8 índices (incluido el de sin filtros).
+def feed_index(fields: Tuple[str, ...]) -> List[tuple]:
+    return [(field, ASCENDING) for field in fields] + FEED_SORT
+
+for size in range(len(FEED_FILTERS) + 1):
+    for fields in combinations(FEED_FILTERS, size):
+        register_index("signals", feed_index(fields))
+
+register_hot_query("signal_feed", "signals", sort=FEED_SORT, limit=FEED_DEFAULT_LIMIT)
+register_hot_query("signal_feed_by_asset", "signals", {"asset": "BTC/USDT"},
+                   sort=FEED_SORT, limit=FEED_DEFAULT_LIMIT)
+register_hot_query("signal_feed_by_asset_timeframe", "signals", {"asset": "BTC/USDT", "timeframe": "1h"},
+                   sort=FEED_SORT, limit=FEED_DEFAULT_LIMIT)
+
+# ===============================
+# Cursor opaco (timestamp + _id de la última fila)
+# ===============================
+def encode_cursor(doc: Dict) -> str:
+    _id = doc["_id"]
+    raw = {"t": doc["timestamp"].isoformat(), "i": str(_id), "o": isinstance(_id, ObjectId)}
+    return base64.urlsafe_b64encode(json.dumps(raw, separators=(",", ":")).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, object]:
+    # ValueError si el cursor no es uno emitido por encode_cursor
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        timestamp = datetime.fromisoformat(raw["t"])
+        _id = ObjectId(raw["i"]) if raw["o"] else raw["i"]
+    except (ValueError, KeyError, TypeError, InvalidId) as e:
+        raise ValueError("Cursor inválido") from e
+    return timestamp, _id
+
+# ===============================
+# Consulta por página
+# ===============================
+def build_query(filters: Dict, min_confidence: Optional[float] = None, cursor: Optional[str] = None) -> Dict:
+    query = {field: filters[field] for field in FEED_FILTERS if filters.get(field) is not None}
+    if min_confidence is not None:
+        query["confidence"] = {"$gte": min_confidence}
+    if cursor:
+        timestamp, _id = decode_cursor(cursor)
+        query["$or"] = [
+            {"timestamp": {"$lt": timestamp}},
+            {"timestamp": timestamp, "_id": {"$lt": _id}}
+        ]
+    return query
+
+async def fetch_page(db, filters: Dict, min_confidence: Optional[float] = None, cursor: Optional[str] = None,
+                     limit: int = FEED_DEFAULT_LIMIT) -> Tuple[List[Dict], Optional[str]]:
+    # Se pide una fila de más para saber si hay página siguiente sin un count
+    query = build_query(filters, min_confidence, cursor)
+    docs = await db.signals.find(query).sort(FEED_SORT).limit(limit + 1).to_list(limit + 1)
+    if len(docs) <= limit:
+        return docs, None
+    docs = docs[:limit]
+    return docs, encode_cursor(docs[-1])
@@ -0,0 +1,53 @@
+# utils/signal_feedback.py
+
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from pymongo import ReturnDocument
+
+# ===============================
+# Agregados de feedback por señal
+# ===============================
+# Un documento por señal en `signal_feedback` con contadores acumulados; cada
+# feedback es un único upsert con $inc, así que leer una señal cuesta lo mismo
+# tenga 5 o 50.000 feedbacks.
+FEEDBACK_COLLECTION = "signal_feedback"
+MAX_BULK_SIGNALS = 500
+
+def feedback_update(rating: int, was_profitable: bool, now: Optional[datetime] = None) -> Dict:
+    return {
+        "$inc": {
+            "count": 1,
+            "rating_sum": rating,
+            "profitable": 1 if was_profitable else 0,
+            f"ratings.{rating}": 1
+        },
+        "$set": {"updated_at": now or datetime.utcnow()}
+    }
+
+async def record_feedback(db, signal_id: str, rating: int, was_profitable: bool) -> Dict:
+    return await db[FEEDBACK_COLLECTION].find_one_and_update(
+        {"_id": signal_id},
+        feedback_update(rating, was_profitable),
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+
+def summarize(signal_id: str, doc: Optional[Dict]) -> Dict:
+    count = (doc or {}).get("count", 0)
+    return {
+        "signal_id": signal_id,
+        "feedback_count": count,
+        "avg_rating": round(doc["rating_sum"] / count, 2) if count else 0.0,
+        "win_rate": round(doc["profitable"] / count * 100, 2) if count else 0.0
+    }
+
+async def get_feedback(db, signal_id: str) -> Optional[Dict]:
+    doc = await db[FEEDBACK_COLLECTION].find_one({"_id": signal_id})
+    return summarize(signal_id, doc) if doc else None
+
+async def get_feedback_bulk(db, signal_ids: List[str]) -> List[Dict]:
+    ids = list(dict.fromkeys(signal_ids))
+    docs = await db[FEEDBACK_COLLECTION].find({"_id": {"$in": ids}}).to_list(len(ids))
+    by_id = {d["_id"]: d for d in docs}
+    return [summarize(signal_id, by_id.get(signal_id)) for signal_id in ids]
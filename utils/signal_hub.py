@@ -0,0 +1,144 @@
+# utils/signal_hub.py
+
+from typing import Dict, Optional, Set
+import asyncio
+import json
+import logging
+import os
+
+from redis.exceptions import RedisError
+
+from utils.redis_pool import get_redis
+from utils.runtime_stats import register_stats
+
+# === Configuración ===
+# SIGNALS_CHANNEL: canal de Redis donde se publica cada señal nueva (JSON).
+# SIGNAL_HUB_CLIENT_BUFFER: mensajes pendientes por cliente; un cliente que
+# llega al tope está leyendo más lento de lo que se publica y se desconecta
+# para no retener memoria ni frenar al resto.
+SIGNALS_CHANNEL = os.getenv("SIGNALS_CHANNEL", "zima:signals:events")
+SIGNAL_HUB_CLIENT_BUFFER = int(os.getenv("SIGNAL_HUB_CLIENT_BUFFER", 100))
+SIGNAL_HUB_MAX_CLIENTS = int(os.getenv("SIGNAL_HUB_MAX_CLIENTS", 10_000))
+SIGNAL_HUB_KEEPALIVE = float(os.getenv("SIGNAL_HUB_KEEPALIVE", 15))
+
+_EVICTED = object()
+
+class HubFull(Exception):
+    pass
+
+# ===============================
+# Suscriptor (una conexión SSE/WebSocket)
+# ===============================
+class Subscriber:
+    def __init__(self, asset: Optional[str] = None, buffer: int = SIGNAL_HUB_CLIENT_BUFFER):
+        self.asset = asset
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=buffer)
+        self.evicted = False
+
+    def wants(self, signal: Dict) -> bool:
+        return self.asset is None or signal.get("asset") == self.asset
+
+    async def next(self, timeout: Optional[float] = None) -> Optional[str]:
+        # Devuelve el próximo mensaje, None si venció el timeout (keepalive);
+        # lanza ConnectionAbortedError si el hub lo desconectó por lento
+        try:
+            message = await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        if message is _EVICTED:
+            raise ConnectionAbortedError("Cliente demasiado lento")
+        return message
+
+# ===============================
+# Hub: una suscripción a Redis, fan-out en memoria
+# ===============================
+# Cada worker mantiene una sola conexión pub/sub sin importar cuántos clientes
+# tenga. El mensaje llega ya serializado y se reparte tal cual: el costo por
+# cliente es un put_nowait.
+class SignalHub:
+    def __init__(self, channel: str = SIGNALS_CHANNEL, max_clients: int = SIGNAL_HUB_MAX_CLIENTS):
+        self.channel = channel
+        self.max_clients = max_clients
+        self.subscribers: Set[Subscriber] = set()
+        self.received = 0
+        self.delivered = 0
+        self.evicted = 0
+        self.rejected = 0
+        self.reconnects = 0
+        self.connected = False
+
+    def subscribe(self, asset: Optional[str] = None) -> Subscriber:
+        if len(self.subscribers) >= self.max_clients:
+            self.rejected += 1
+            raise HubFull("Demasiados clientes conectados")
+        subscriber = Subscriber(asset)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self.subscribers.discard(subscriber)
+
+    def _evict(self, subscriber: Subscriber):
+        # Se descarta lo pendiente: el cliente se reconecta y relee el feed
+        subscriber.evicted = True
+        self.subscribers.discard(subscriber)
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait(_EVICTED)
+        self.evicted += 1
+
+    def dispatch(self, message: str):
+        self.received += 1
+        try:
+            signal = json.loads(message)
+        except ValueError:
+            logging.warning(f"[SIGNAL HUB] Mensaje inválido en {self.channel}")
+            return
+        for subscriber in list(self.subscribers):
+            if not subscriber.wants(signal):
+                continue
+            try:
+                subscriber.queue.put_nowait(message)
+                self.delivered += 1
+            except asyncio.QueueFull:
+                self._evict(subscriber)
+
+    async def run(self):
+        backoff = 1.0
+        while True:
+            pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.channel)
+                self.connected, backoff = True, 1.0
+                while True:
+                    message = await pubsub.get_message(timeout=1.0)
+                    if message and message["type"] == "message":
+                        data = message["data"]
+                        self.dispatch(data.decode("utf-8") if isinstance(data, bytes) else data)
+            except (RedisError, OSError) as e:
+                self.connected = False
+                self.reconnects += 1
+                logging.warning(f"[SIGNAL HUB] Se perdió la suscripción a {self.channel}: {e}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                self.connected = False
+                await pubsub.aclose()
+
+    def stats(self) -> Dict:
+        return {
+            "clients": len(self.subscribers),
+            "connected": int(self.connected),
+            "received": self.received,
+            "delivered": self.delivered,
+            "evicted": self.evicted,
+            "rejected": self.rejected,
+            "reconnects": self.reconnects,
+        }
+
+signal_hub = SignalHub()
+register_stats("signal_hub", signal_hub.stats)
+
+async def publish_signal(message: str):
+    # Para quien produce señales: llega a todos los workers suscriptos
+    await get_redis().publish(SIGNALS_CHANNEL, message)
@@ -0,0 +1,82 @@
+# utils/signal_ingest.py
+
+from datetime import datetime
+from typing import Dict, List
+import logging
+import os
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+from redis.exceptions import RedisError
+
+from utils.counters import incr
+from utils.http_cache import json_bytes
+from utils.kpi_engine import request_refresh
+from utils.redis_pool import get_redis
+from utils.signal_hub import SIGNALS_CHANNEL
+
+# === Configuración ===
+# SIGNALS_HOT_LIST: lista de Redis con las últimas señales públicas (la lee
+# /metrics/signals/public); se recorta a SIGNALS_HOT_LIST_SIZE en cada lote.
+SIGNALS_HOT_LIST = "zima:signals:public"
+SIGNALS_HOT_LIST_SIZE = int(os.getenv("SIGNALS_HOT_LIST_SIZE", 100))
+SIGNALS_INGEST_MAX_BATCH = int(os.getenv("SIGNALS_INGEST_MAX_BATCH", 1000))
+
+PUBLIC_FIELDS = ("asset", "timeframe", "prediction", "confidence", "timestamp", "model_version")
+
+def public_view(doc: Dict) -> str:
+    view = {"id": str(doc["_id"])}
+    view.update({field: doc[field] for field in PUBLIC_FIELDS if doc.get(field) is not None})
+    return json_bytes(view).decode("utf-8")
+
+# ===============================
+# Ingesta en bloque
+# ===============================
+# Un lote son ~4 round trips sin importar su tamaño: insert_many, un pipeline
+# de Redis (RPUSH + LTRIM + PUBLISH por señal) y el $inc del contador. Los _id
+# que manda el pipeline de modelos hacen idempotentes los reintentos: los
+# duplicados se informan y no se vuelven a publicar ni contar.
+async def ingest_signals(db, signals: List[Dict]) -> Dict:
+    now = datetime.utcnow()
+    docs = []
+    for signal in signals:
+        doc = {k: v for k, v in signal.items() if v is not None and k != "id"}
+        # _id siempre ObjectId (el cursor del feed compara _id por tipo y un str
+        # ordenaría aparte): el id propio del pipeline es su forma hexadecimal
+        doc["_id"] = ObjectId(signal["id"]) if signal.get("id") else ObjectId()
+        doc.setdefault("timestamp", now)
+        doc["created_at"] = now
+        docs.append(doc)
+
+    failed = set()
+    try:
+        await db.signals.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(err.get("code") != 11000 for err in errors):
+            raise
+        failed = {err["index"] for err in errors}
+    inserted = [doc for i, doc in enumerate(docs) if i not in failed]
+
+    if inserted:
+        await incr(db, "signals", len(inserted))
+        # El hot list es derivado: si Redis falla, Mongo ya tiene las señales
+        try:
+            pipe = get_redis().pipeline(transaction=False)
+            payloads = [public_view(doc) for doc in inserted]
+            pipe.rpush(SIGNALS_HOT_LIST, *payloads)
+            pipe.ltrim(SIGNALS_HOT_LIST, -SIGNALS_HOT_LIST_SIZE, -1)
+            for payload in payloads:
+                pipe.publish(SIGNALS_CHANNEL, payload)
+            await pipe.execute()
+        except RedisError as e:
+            logging.warning(f"[SIGNALS] No se pudo publicar el lote en Redis: {e}")
+        # Señales que ya llegan cerradas: adelantar el recálculo de KPIs
+        if any(doc.get("closed_at") and doc.get("roi") is not None for doc in inserted):
+            request_refresh()
+
+    return {
+        "inserted": len(inserted),
+        "duplicates": len(failed),
+        "ids": [str(doc["_id"]) for doc in inserted],
+    }
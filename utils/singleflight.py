@@ -0,0 +1,172 @@
+# utils/singleflight.py
+
+from typing import Awaitable, Callable, Dict, Optional
+import asyncio
+import logging
+import os
+import time
+import uuid
+
+from redis.exceptions import RedisError, WatchError
+
+from utils.redis_pool import get_redis
+from utils.runtime_stats import register_stats
+
+# === Configuración ===
+# SINGLEFLIGHT_REDIS_LOCK: además de coalescer dentro del proceso, un solo
+# worker (de todos los procesos) recalcula cada clave; el resto espera hasta
+# SINGLEFLIGHT_WAIT_TIMEOUT a que el resultado aparezca en Redis.
+SINGLEFLIGHT_REDIS_LOCK = os.getenv("SINGLEFLIGHT_REDIS_LOCK", "false").lower() in ("1", "true", "yes")
+SINGLEFLIGHT_LOCK_TTL = float(os.getenv("SINGLEFLIGHT_LOCK_TTL", 10))
+SINGLEFLIGHT_WAIT_TIMEOUT = float(os.getenv("SINGLEFLIGHT_WAIT_TIMEOUT", 5))
+SINGLEFLIGHT_POLL_INTERVAL = float(os.getenv("SINGLEFLIGHT_POLL_INTERVAL", 0.05))
+READ_CACHE_TTL = float(os.getenv("READ_CACHE_TTL", 5))
+
+FLIGHTS: Dict[str, "SingleFlight"] = {}
+
+# ===============================
+# Coalescencia de recálculos (single-flight)
+# ===============================
+# do(key, fn): si ya hay un recálculo en curso para `key`, se espera ese mismo
+# resultado (o excepción) en lugar de lanzar otro. cached(key, fn, ttl) agrega
+# un valor serializado compartido en Redis, de modo que solo los misses llegan
+# a fn, y como mucho uno a la vez por clave.
+class SingleFlight:
+    def __init__(self, name: str, redis_lock: bool = SINGLEFLIGHT_REDIS_LOCK,
+                 lock_ttl: float = SINGLEFLIGHT_LOCK_TTL, wait_timeout: float = SINGLEFLIGHT_WAIT_TIMEOUT,
+                 poll_interval: float = SINGLEFLIGHT_POLL_INTERVAL):
+        self.name = name
+        self.redis_lock = redis_lock
+        self.lock_ttl = lock_ttl
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.calls = 0
+        self.leaders = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.cache_hits = 0
+        self.remote_waits = 0
+        self.remote_coalesced = 0
+        self.lock_timeouts = 0
+        FLIGHTS[name] = self
+
+    async def do(self, key: str, fn: Callable[[], Awaitable]):
+        self.calls += 1
+        while key in self._inflight:
+            future = self._inflight[key]
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # Si se canceló el líder (no esta request), se reintenta
+                if not future.cancelled():
+                    raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        self.leaders += 1
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            self.errors += 1
+            future.set_exception(e)
+            future.exception()  # marcada como leída aunque no haya seguidores
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    # === Valor compartido en Redis ===
+    def _cache_key(self, key: str) -> str:
+        return f"sf:{self.name}:{key}"
+
+    async def _cache_get(self, cache_key: str) -> Optional[str]:
+        try:
+            return await get_redis().get(cache_key)
+        except RedisError as e:
+            logging.warning(f"[SINGLEFLIGHT] Redis no disponible ({self.name}): {e}")
+            return None
+
+    async def cached(self, key: str, fn: Callable[[], Awaitable[str]], ttl: float = READ_CACHE_TTL) -> str:
+        cache_key = self._cache_key(key)
+        value = await self._cache_get(cache_key)
+        if value is not None:
+            self.cache_hits += 1
+            return value
+        return await self.do(key, lambda: self._fill(cache_key, fn, ttl))
+
+    async def _fill(self, cache_key: str, fn: Callable[[], Awaitable[str]], ttl: float) -> str:
+        redis = get_redis()
+        lock_key, token = f"{cache_key}:lock", None
+        if self.redis_lock:
+            try:
+                token = uuid.uuid4().hex
+                if not await redis.set(lock_key, token, nx=True, px=int(self.lock_ttl * 1000)):
+                    token = None
+                    value = await self._wait_remote(cache_key)
+                    if value is not None:
+                        return value
+            except RedisError:
+                token = None
+        try:
+            value = await fn()
+            try:
+                await redis.set(cache_key, value, px=int(ttl * 1000))
+            except RedisError:
+                pass
+            return value
+        finally:
+            if token:
+                await self._release(lock_key, token)
+
+    async def _wait_remote(self, cache_key: str) -> Optional[str]:
+        # Otro worker tiene el lock: esperar su resultado, y si no llega a
+        # tiempo (worker caído o lento) recalcular igual
+        self.remote_waits += 1
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.poll_interval)
+            value = await self._cache_get(cache_key)
+            if value is not None:
+                self.remote_coalesced += 1
+                return value
+        self.lock_timeouts += 1
+        return None
+
+    async def _release(self, lock_key: str, token: str):
+        # Borrar el lock solo si sigue siendo nuestro (puede haber expirado)
+        try:
+            async with get_redis().pipeline(transaction=True) as pipe:
+                await pipe.watch(lock_key)
+                if await pipe.get(lock_key) == token:
+                    pipe.multi()
+                    pipe.delete(lock_key)
+                    await pipe.execute()
+        except (RedisError, WatchError):
+            pass
+
+    def stats(self) -> Dict:
+        return {
+            "calls": self.calls,
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "cache_hits": self.cache_hits,
+            "in_flight": len(self._inflight),
+            "redis_lock": self.redis_lock,
+            "remote_waits": self.remote_waits,
+            "remote_coalesced": self.remote_coalesced,
+            "lock_timeouts": self.lock_timeouts,
+        }
+
+def singleflight_stats() -> Dict:
+    return {name: flight.stats() for name, flight in FLIGHTS.items()}
+
+register_stats("singleflight", singleflight_stats)
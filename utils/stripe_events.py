@@ -0,0 +1,202 @@
+# utils/stripe_events.py
+
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+import asyncio
+import json
+import logging
+import os
+import sys
+
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from utils.mongo_indexes import register_index
+from utils.runtime_stats import register_stats
+from utils.telemetry import Histogram
+
+# === Configuración ===
+# Los webhooks solo verifican la firma y guardan el evento crudo en
+# `stripe_events` (_id = id del evento); un worker lo aplica después.
+# Reintentos con backoff exponencial (STRIPE_EVENTS_BACKOFF * 2^intentos, hasta
+# STRIPE_EVENTS_MAX_BACKOFF); tras STRIPE_EVENTS_MAX_ATTEMPTS queda en "dead".
+STRIPE_EVENTS_COLLECTION = "stripe_events"
+STRIPE_EVENTS_BATCH = int(os.getenv("STRIPE_EVENTS_BATCH", 50))
+STRIPE_EVENTS_POLL_SECONDS = float(os.getenv("STRIPE_EVENTS_POLL_SECONDS", 1))
+STRIPE_EVENTS_LEASE_SECONDS = float(os.getenv("STRIPE_EVENTS_LEASE_SECONDS", 60))
+STRIPE_EVENTS_MAX_ATTEMPTS = int(os.getenv("STRIPE_EVENTS_MAX_ATTEMPTS", 8))
+STRIPE_EVENTS_BACKOFF = float(os.getenv("STRIPE_EVENTS_BACKOFF", 5))
+STRIPE_EVENTS_MAX_BACKOFF = float(os.getenv("STRIPE_EVENTS_MAX_BACKOFF", 3600))
+# Los procesados se borran solos (índice TTL); cubre de sobra la ventana de reintentos de Stripe
+STRIPE_EVENTS_RETENTION_DAYS = int(os.getenv("STRIPE_EVENTS_RETENTION_DAYS", 30))
+
+register_index(STRIPE_EVENTS_COLLECTION, [("status", ASCENDING), ("next_attempt_at", ASCENDING)])
+register_index(STRIPE_EVENTS_COLLECTION, [("processed_at", ASCENDING)],
+               expireAfterSeconds=STRIPE_EVENTS_RETENTION_DAYS * 86400)
+
+event_lag = Histogram("zima_stripe_event_lag_seconds", "Demora entre la recepción y la aplicación de eventos de Stripe",
+                      ("type",), buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600))
+
+# ===============================
+# Handlers por tipo de evento
+# ===============================
+# Cada router registra lo que hace con cada tipo. Todos los handlers de un tipo
+# corren para cada evento, sin importar por cuál endpoint haya llegado; deben
+# ser idempotentes (el mismo evento puede aplicarse de nuevo tras un fallo).
+HANDLERS: Dict[str, List[Callable[[Dict], Awaitable]]] = {}
+
+def stripe_handler(event_type: str):
+    def decorator(fn):
+        HANDLERS.setdefault(event_type, []).append(fn)
+        return fn
+    return decorator
+
+# ===============================
+# Recepción (webhook)
+# ===============================
+async def enqueue_event(db, event: Dict, payload: bytes) -> bool:
+    # False si el evento ya estaba (reintento de Stripe o llegó por el otro endpoint)
+    now = datetime.utcnow()
+    try:
+        await db[STRIPE_EVENTS_COLLECTION].insert_one({
+            "_id": event["id"],
+            "type": event["type"],
+            "payload": payload.decode("utf-8"),
+            "status": "pending",
+            "attempts": 0,
+            "received_at": now,
+            "next_attempt_at": now,
+        })
+        return True
+    except DuplicateKeyError:
+        return False
+
+# ===============================
+# Worker
+# ===============================
+class StripeEventWorker:
+    def __init__(self, db, batch_size: int = STRIPE_EVENTS_BATCH):
+        self.db = db
+        self.batch_size = batch_size
+        self.processed = 0
+        self.retried = 0
+        self.dead = 0
+        self.lost_leases = 0
+        self.pending = 0
+        self.oldest_pending_seconds = 0.0
+
+    async def _claim(self, now: datetime) -> Optional[Dict]:
+        # Lease: si el worker muere a mitad de camino, el evento vuelve a estar
+        # disponible cuando vence locked_until
+        return await self.db[STRIPE_EVENTS_COLLECTION].find_one_and_update(
+            {"$or": [
+                {"status": {"$in": ["pending", "retry"]}, "next_attempt_at": {"$lte": now}},
+                {"status": "processing", "locked_until": {"$lt": now}},
+            ]},
+            {"$set": {"status": "processing", "locked_until": now + timedelta(seconds=STRIPE_EVENTS_LEASE_SECONDS)}},
+            sort=[("next_attempt_at", ASCENDING)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _apply(self, doc: Dict):
+        event = json.loads(doc["payload"])
+        for handler in HANDLERS.get(doc["type"], []):
+            await handler(event)
+
+    def _leased(self, doc: Dict) -> Dict:
+        # Solo el dueño del lease cierra el evento: si venció y otro worker lo
+        # reclamó, locked_until ya es otro y la actualización no aplica
+        return {"_id": doc["_id"], "status": "processing", "locked_until": doc["locked_until"]}
+
+    async def _done(self, doc: Dict, now: datetime):
+        result = await self.db[STRIPE_EVENTS_COLLECTION].update_one(
+            self._leased(doc),
+            {"$set": {"status": "done", "processed_at": now}, "$unset": {"locked_until": "", "last_error": ""}}
+        )
+        if not result.matched_count:
+            self.lost_leases += 1
+            logging.warning(f"[STRIPE] Evento {doc['_id']} ({doc['type']}): lease vencido, lo cierra otro worker")
+            return
+        event_lag.observe((now - doc["received_at"]).total_seconds(), doc["type"])
+        self.processed += 1
+
+    async def _failed(self, doc: Dict, error: Exception, now: datetime):
+        attempts = doc.get("attempts", 0) + 1
+        update = {"attempts": attempts, "last_error": str(error)[:500]}
+        dead = attempts >= STRIPE_EVENTS_MAX_ATTEMPTS
+        delay = min(STRIPE_EVENTS_BACKOFF * 2 ** (attempts - 1), STRIPE_EVENTS_MAX_BACKOFF)
+        if dead:
+            update["status"] = "dead"
+        else:
+            update.update({"status": "retry", "next_attempt_at": now + timedelta(seconds=delay)})
+        result = await self.db[STRIPE_EVENTS_COLLECTION].update_one(
+            self._leased(doc), {"$set": update, "$unset": {"locked_until": ""}}
+        )
+        if not result.matched_count:
+            self.lost_leases += 1
+            logging.warning(f"[STRIPE] Evento {doc['_id']} ({doc['type']}): lease vencido, lo reintenta otro worker")
+        elif dead:
+            self.dead += 1
+            logging.error(f"[STRIPE] Evento {doc['_id']} ({doc['type']}) descartado tras {attempts} intentos: {error}")
+        else:
+            self.retried += 1
+            logging.warning(f"[STRIPE] Evento {doc['_id']} ({doc['type']}) falló, reintento en {delay:.0f}s: {error}")
+
+    async def process_batch(self, now: Optional[datetime] = None) -> int:
+        now = now or datetime.utcnow()
+        count = 0
+        while count < self.batch_size:
+            doc = await self._claim(now)
+            if doc is None:
+                break
+            count += 1
+            try:
+                await self._apply(doc)
+            except Exception as e:
+                await self._failed(doc, e, now)
+            else:
+                await self._done(doc, datetime.utcnow())
+        await self._update_lag(now)
+        return count
+
+    async def _update_lag(self, now: datetime):
+        collection = self.db[STRIPE_EVENTS_COLLECTION]
+        query = {"status": {"$in": ["pending", "retry", "processing"]}}
+        self.pending = await collection.count_documents(query)
+        oldest = await collection.find(query, {"received_at": 1}).sort("received_at", ASCENDING).limit(1).to_list(1)
+        self.oldest_pending_seconds = round((now - oldest[0]["received_at"]).total_seconds(), 1) if oldest else 0.0
+
+    def stats(self) -> Dict:
+        return {
+            "pending": self.pending,
+            "oldest_pending_seconds": self.oldest_pending_seconds,
+            "processed": self.processed,
+            "retried": self.retried,
+            "dead": self.dead,
+            "lost_leases": self.lost_leases,
+        }
+
+async def run_stripe_events(worker: StripeEventWorker, interval: float = STRIPE_EVENTS_POLL_SECONDS):
+    while True:
+        try:
+            # Lote lleno: puede haber más, seguir sin esperar
+            if await worker.process_batch() >= worker.batch_size:
+                continue
+        except Exception as e:
+            logging.warning(f"[STRIPE] Falló el procesamiento de eventos: {e}")
+        await asyncio.sleep(interval)
+
+async def replay_dead(db) -> int:
+    result = await db[STRIPE_EVENTS_COLLECTION].update_many(
+        {"status": "dead"},
+        {"$set": {"status": "retry", "attempts": 0, "next_attempt_at": datetime.utcnow()}}
+    )
+    return result.modified_count
+
+# Uso: python -m utils.stripe_events replay  (reencola los eventos en "dead")
+if __name__ == "__main__":
+    from routers.database import mongo_db
+
+    if sys.argv[1:] != ["replay"]:
+        sys.exit("Uso: python -m utils.stripe_events replay")
+    print(json.dumps({"requeued": asyncio.run(replay_dead(mongo_db))}, indent=2))
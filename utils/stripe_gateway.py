@@ -0,0 +1,172 @@
+# utils/stripe_gateway.py
+
+from typing import Awaitable, Callable, Dict, Optional
+import asyncio
+import logging
+import os
+import time
+
+import stripe
+
+from utils.runtime_stats import register_stats
+from utils.telemetry import timed
+
+# === Configuración ===
+# Cliente async nativo de stripe-python (httpx): una sola conexión reutilizable
+# por worker, sin bloquear el event loop. STRIPE_API_BASE permite apuntar a un
+# stub local. STRIPE_MAX_CONCURRENCY acota las llamadas simultáneas y
+# STRIPE_MAX_QUEUE las que pueden esperar turno; el resto se rechaza rápido.
+STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY")
+STRIPE_API_BASE = os.getenv("STRIPE_API_BASE")
+STRIPE_TIMEOUT = float(os.getenv("STRIPE_TIMEOUT", 10))
+STRIPE_MAX_RETRIES = int(os.getenv("STRIPE_MAX_RETRIES", 2))
+STRIPE_MAX_CONCURRENCY = int(os.getenv("STRIPE_MAX_CONCURRENCY", 16))
+STRIPE_MAX_QUEUE = int(os.getenv("STRIPE_MAX_QUEUE", 64))
+STRIPE_RETRY_AFTER = int(os.getenv("STRIPE_RETRY_AFTER", 2))
+PRICE_CATALOG_REFRESH_SECONDS = float(os.getenv("PRICE_CATALOG_REFRESH_SECONDS", 300))
+
+class StripeBusy(Exception):
+    pass
+
+# ===============================
+# Llamadas a Stripe (async, acotadas, con timeout)
+# ===============================
+class StripeGateway:
+    def __init__(self, api_key: Optional[str] = STRIPE_SECRET_KEY, api_base: Optional[str] = STRIPE_API_BASE,
+                 timeout: float = STRIPE_TIMEOUT, max_retries: int = STRIPE_MAX_RETRIES,
+                 max_concurrency: int = STRIPE_MAX_CONCURRENCY, max_queue: int = STRIPE_MAX_QUEUE):
+        self.api_key = api_key
+        self.api_base = api_base
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self._client: Optional[stripe.StripeClient] = None
+        self._http: Optional[stripe.HTTPXClient] = None
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.rejected = 0
+
+    @property
+    def client(self) -> stripe.StripeClient:
+        if self._client is None:
+            self._http = stripe.HTTPXClient(timeout=self.timeout)
+            self._client = stripe.StripeClient(
+                self.api_key or "",
+                base_addresses={"api": self.api_base} if self.api_base else {},
+                http_client=self._http,
+                max_network_retries=self.max_retries,
+            )
+        return self._client
+
+    async def call(self, operation: str, fn: Callable[[stripe.StripeClient], Awaitable]):
+        # El timeout total cubre la espera de turno y los reintentos del SDK
+        if self._pending >= self.max_concurrency + self.max_queue:
+            self.rejected += 1
+            raise StripeBusy()
+        self._pending += 1
+        try:
+            async with asyncio.timeout(self.timeout * (self.max_retries + 1)):
+                async with self._semaphore:
+                    with timed("stripe", operation):
+                        result = await fn(self.client)
+            self.completed += 1
+            return result
+        except TimeoutError:
+            self.timeouts += 1
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self._pending -= 1
+
+    async def close(self):
+        http, self._client, self._http = self._http, None, None
+        if http is not None:
+            await http.close_async()
+
+    def stats(self) -> Dict:
+        return {
+            "in_flight": min(self._pending, self.max_concurrency),
+            "queue_depth": max(0, self._pending - self.max_concurrency),
+            "completed": self.completed,
+            "failed": self.failed,
+            "timeouts": self.timeouts,
+            "rejected": self.rejected,
+        }
+
+# ===============================
+# Catálogo de precios en memoria
+# ===============================
+# Precios activos de Stripe, refrescados en segundo plano: un plan_id que no
+# está en el catálogo se rechaza sin salir a la red. Mientras el catálogo no
+# se haya cargado nunca (Stripe caído al arrancar) no se rechaza nada y decide
+# Stripe, para no cortar los checkouts por un problema del catálogo.
+class PriceCatalog:
+    def __init__(self, gateway: StripeGateway):
+        self.gateway = gateway
+        self.prices: Dict[str, Dict] = {}
+        self.loaded_at: Optional[float] = None
+        self.refreshes = 0
+        self.failures = 0
+
+    async def refresh(self) -> int:
+        prices, params = {}, {"active": True, "limit": 100}
+        while True:
+            page = await self.gateway.call("prices.list", lambda c: c.prices.list_async(params=dict(params)))
+            for price in page.data:
+                recurring = price.get("recurring")
+                prices[price["id"]] = {
+                    "id": price["id"],
+                    "product": price.get("product"),
+                    "nickname": price.get("nickname"),
+                    "lookup_key": price.get("lookup_key"),
+                    "currency": price.get("currency"),
+                    "unit_amount": price.get("unit_amount"),
+                    "interval": recurring.get("interval") if recurring else None,
+                }
+            if not page.has_more or not page.data:
+                break
+            params["starting_after"] = page.data[-1]["id"]
+        # Reemplazo atómico: los lectores ven el catálogo viejo o el nuevo entero
+        self.prices = prices
+        self.loaded_at = time.time()
+        self.refreshes += 1
+        return len(prices)
+
+    @property
+    def loaded(self) -> bool:
+        return self.loaded_at is not None
+
+    def get(self, price_id: str) -> Optional[Dict]:
+        return self.prices.get(price_id)
+
+    def is_valid(self, price_id: str) -> bool:
+        return not self.loaded or price_id in self.prices
+
+    def stats(self) -> Dict:
+        return {
+            "loaded": int(self.loaded),
+            "prices": len(self.prices),
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+            "age_seconds": round(time.time() - self.loaded_at, 1) if self.loaded else -1,
+        }
+
+async def run_price_catalog(catalog: PriceCatalog, interval: float = PRICE_CATALOG_REFRESH_SECONDS):
+    while True:
+        try:
+            await catalog.refresh()
+        except Exception as e:
+            catalog.failures += 1
+            logging.warning(f"[STRIPE] Falló la actualización del catálogo de precios: {e}")
+        await asyncio.sleep(interval)
+
+stripe_gateway = StripeGateway()
+price_catalog = PriceCatalog(stripe_gateway)
+register_stats("stripe", stripe_gateway.stats)
+register_stats("price_catalog", price_catalog.stats)
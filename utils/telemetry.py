@@ -0,0 +1,294 @@
+# utils/telemetry.py
+
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+import asyncio
+import hmac
+import logging
+import os
+import threading
+import time
+
+from pymongo import monitoring
+from sqlalchemy import event
+
+from utils.runtime_stats import collect_stats
+
+# === Configuración ===
+# METRICS_PATH: ruta interna donde la app expone las métricas (formato texto
+# de Prometheus). METRICS_TOKEN: si está definido, se exige como Bearer.
+# METRICS_PORT: si está definido, además se sirve en ese puerto aparte
+# (pensado para escuchar solo en la red interna).
+# Sin METRICS_TOKEN la ruta de la app responde 401 (solo el puerto interno
+# sirve sin token), salvo que se active METRICS_ALLOW_ANONYMOUS.
+METRICS_PATH = os.getenv("METRICS_PATH", "/internal/metrics")
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+METRICS_ALLOW_ANONYMOUS = os.getenv("METRICS_ALLOW_ANONYMOUS", "false").lower() in ("1", "true", "yes")
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+# ===============================
+# Métricas en memoria (sin dependencias)
+# ===============================
+# Cada observación es un bisect + un par de sumas bajo un lock; el formateo
+# a texto ocurre solo cuando Prometheus hace scrape.
+_registry: List["_Metric"] = []
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        for labels, value in list(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}")
+        return lines
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # [conteo por bucket (+Inf al final), suma, total]
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, *labels) -> int:
+        series = self._series.get(labels)
+        return series[2] if series else 0
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        for labels, (counts, total, n) in list(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {n}")
+        return lines
+
+# ===============================
+# Métricas de la app
+# ===============================
+http_latency = Histogram("zima_http_request_duration_seconds", "Latencia de requests HTTP por ruta",
+                         ("method", "route"))
+http_requests = Counter("zima_http_requests_total", "Requests HTTP por ruta y código", ("method", "route", "status"))
+http_in_flight = Gauge("zima_http_requests_in_flight", "Requests HTTP en curso", ("method",))
+http_response_size = Histogram("zima_http_response_size_bytes", "Tamaño de las respuestas HTTP por ruta",
+                               ("method", "route"), buckets=SIZE_BUCKETS)
+downstream_latency = Histogram("zima_downstream_duration_seconds", "Latencia de llamadas a dependencias",
+                               ("system", "operation"))
+downstream_errors = Counter("zima_downstream_errors_total", "Errores en llamadas a dependencias",
+                            ("system", "operation"))
+
+def observe_downstream(system: str, operation: str, seconds: float, failed: bool = False):
+    downstream_latency.observe(seconds, system, operation)
+    if failed:
+        downstream_errors.inc(system, operation)
+
+@contextmanager
+def timed(system: str, operation: str):
+    # Para llamadas sin hooks propios (Stripe, Web3, OpenAI vía httpx)
+    start = time.perf_counter()
+    failed = False
+    try:
+        yield
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        observe_downstream(system, operation, time.perf_counter() - start, failed)
+
+# ===============================
+# Middleware ASGI: latencia por ruta plantilla
+# ===============================
+# La etiqueta es el path de la ruta ("/metrics/signal/{signal_id}"), no la URL,
+# para que la cardinalidad no crezca con los ids. Lo que no matchea ninguna
+# ruta se agrupa como "unmatched".
+class PrometheusMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        start = time.perf_counter()
+        state = {"status": 500, "size": 0}
+        # La ruta se conoce recién después del routing: el in-flight va por método
+        http_in_flight.inc(method)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                state["size"] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_in_flight.dec(method)
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            http_latency.observe(time.perf_counter() - start, method, path)
+            http_requests.inc(method, path, state["status"])
+            http_response_size.observe(state["size"], method, path)
+
+# ===============================
+# Hooks de dependencias
+# ===============================
+class MongoCommandTimer(monitoring.CommandListener):
+    # pymongo ya mide cada comando (duration_micros): no hay estado por request
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        observe_downstream("mongo", event.command_name, event.duration_micros / 1e6)
+
+    def failed(self, event):
+        observe_downstream("mongo", event.command_name, event.duration_micros / 1e6, failed=True)
+
+def _sql_operation(statement: Optional[str]) -> str:
+    return statement.lstrip().split(None, 1)[0].upper() if statement and statement.strip() else "UNKNOWN"
+
+def instrument_sqlalchemy(engine, system: str = "sql"):
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        context._zima_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        observe_downstream(system, _sql_operation(statement), time.perf_counter() - context._zima_start)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(exception_context):
+        context = exception_context.execution_context
+        start = getattr(context, "_zima_start", None)
+        if start is not None:
+            observe_downstream(system, _sql_operation(exception_context.statement), time.perf_counter() - start,
+                               failed=True)
+
+# ===============================
+# Exposición en formato Prometheus
+# ===============================
+def _runtime_lines() -> List[str]:
+    # Contadores de /admin/runtime/stats (caches, pools, colas) como gauges
+    lines = ["# HELP zima_runtime_stat Estadísticas internas de runtime", "# TYPE zima_runtime_stat gauge"]
+
+    def walk(component: str, prefix: str, data: Dict):
+        for key, value in data.items():
+            stat = f"{prefix}{key}"
+            if isinstance(value, dict):
+                walk(component, f"{stat}.", value)
+            elif isinstance(value, (int, float)):
+                lines.append(f'zima_runtime_stat{{component="{_escape(component)}",stat="{_escape(stat)}"}} '
+                             f"{_number(float(value))}")
+
+    for component, stats in collect_stats().items():
+        if isinstance(stats, dict):
+            walk(component, "", stats)
+    return lines
+
+def render_metrics() -> str:
+    lines: List[str] = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    lines.extend(_runtime_lines())
+    return "\n".join(lines) + "\n"
+
+def authorized(authorization: Optional[str], internal: bool = False) -> bool:
+    if METRICS_TOKEN:
+        return hmac.compare_digest(authorization or "", f"Bearer {METRICS_TOKEN}")
+    return internal or METRICS_ALLOW_ANONYMOUS
+
+async def _serve_metrics(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout=5)
+        auth = None
+        for line in head.decode("latin-1").split("\r\n")[1:]:
+            name, _, value = line.partition(":")
+            if name.strip().lower() == "authorization":
+                auth = value.strip()
+        if authorized(auth, internal=True):
+            status, body = "200 OK", render_metrics().encode()
+        else:
+            status, body = "401 Unauthorized", b""
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+async def start_metrics_server(port: int = METRICS_PORT, host: str = METRICS_HOST) -> Optional[asyncio.AbstractServer]:
+    if not port:
+        return None
+    server = await asyncio.start_server(_serve_metrics, host, port)
+    logging.info(f"[METRICS] Exponiendo métricas en http://{host}:{port}/")
+    return server
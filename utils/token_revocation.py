@@ -0,0 +1,90 @@
+# utils/token_revocation.py
+
+from typing import Dict, Optional
+import logging
+import os
+import time
+
+from redis.exceptions import RedisError
+
+from utils.redis_pool import get_redis
+
+REVOCATION_REDIS_KEY = os.getenv("TOKEN_REVOCATION_REDIS_KEY", "zima:auth:token_versions")
+REVOCATION_SYNC_SECONDS = float(os.getenv("TOKEN_REVOCATION_SYNC_SECONDS", 5))
+# Sin una sincronización exitosa en este lapso los claims no se usan para autorizar
+REVOCATION_MAX_STALENESS = float(os.getenv("TOKEN_REVOCATION_MAX_STALENESS", 30))
+
+# === Versiones de token por usuario ===
+# Cada token con claims lleva la versión vigente de su usuario ("ver"). Cambiar
+# plan o rol incrementa la versión y deja a los tokens anteriores sin validez
+# para autorizar por claims. Las versiones viven en un hash de Redis (pool
+# compartido) que todos los workers leen; cada worker guarda una copia local y
+# la refresca como mucho cada REVOCATION_SYNC_SECONDS, así que la verificación
+# por request casi nunca hace I/O.
+#
+# Falla cerrado: si la copia local no se pudo sincronizar recientemente (Redis
+# caído, worker recién arrancado) todo token con claims se trata como
+# desactualizado y el principal se resuelve contra cache/DB.
+class TokenRevocations:
+    def __init__(self, sync_interval: float = REVOCATION_SYNC_SECONDS,
+                 max_staleness: float = REVOCATION_MAX_STALENESS):
+        self._versions: Dict[str, int] = {}
+        self._sync_interval = sync_interval
+        self._max_staleness = max_staleness
+        self._last_attempt = float("-inf")
+        self._last_sync: Optional[float] = None
+        self.revocations = 0
+        self.sync_errors = 0
+
+    @property
+    def fresh(self) -> bool:
+        return self._last_sync is not None and time.monotonic() - self._last_sync <= self._max_staleness
+
+    def _merge(self, subject: str, version: int):
+        if version > self._versions.get(subject, 0):
+            self._versions[subject] = version
+
+    async def sync(self, force: bool = False) -> bool:
+        now = time.monotonic()
+        if not force and now - self._last_attempt < self._sync_interval:
+            return self.fresh
+        # Se marca antes del await: un solo request por intervalo sale a Redis
+        self._last_attempt = now
+        try:
+            remote = await get_redis().hgetall(REVOCATION_REDIS_KEY)
+        except RedisError as e:
+            self.sync_errors += 1
+            logging.warning(f"[AUTH] No se pudo sincronizar revocaciones desde Redis: {e}")
+            return self.fresh
+        for subject, value in remote.items():
+            self._merge(subject, int(value))
+        self._last_sync = time.monotonic()
+        return True
+
+    async def current_version(self, *subjects: str) -> int:
+        await self.sync()
+        return max((self._versions.get(s, 0) for s in subjects if s), default=0)
+
+    async def bump(self, subject: str) -> int:
+        self._merge(subject, self._versions.get(subject, 0) + 1)
+        self.revocations += 1
+        try:
+            self._merge(subject, int(await get_redis().hincrby(REVOCATION_REDIS_KEY, subject, 1)))
+        except RedisError as e:
+            self.sync_errors += 1
+            logging.warning(f"[AUTH] No se pudo propagar la revocación a Redis: {e}")
+        return self._versions[subject]
+
+    async def is_stale(self, version: int, *subjects: str) -> bool:
+        if not await self.sync():
+            return True
+        return version < max((self._versions.get(s, 0) for s in subjects if s), default=0)
+
+    def stats(self) -> Dict:
+        return {
+            "tracked_subjects": len(self._versions),
+            "revocations": self.revocations,
+            "fresh": int(self.fresh),
+            "last_sync_age_seconds": round(time.monotonic() - self._last_sync, 1) if self._last_sync else -1,
+            "sync_errors": self.sync_errors,
+        }
@@ -0,0 +1,159 @@
+# utils/usage_rollups.py
+
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Tuple
+import asyncio
+import json
+import sys
+
+from pymongo import ASCENDING, UpdateOne
+
+from utils.mongo_indexes import register_index, register_hot_query
+
+# ===============================
+# Rollups de uso por tenant
+# ===============================
+# Cada registro de uso incrementa tres buckets (minuto, hora y día) en
+# `usage_rollups`. Un rango arbitrario se responde leyendo los buckets más
+# gruesos que entran completos en él (ver plan_range), así que el costo de
+# una consulta no depende de cuánta historia cruda haya en usage_logs.
+ROLLUP_COLLECTION = "usage_rollups"
+USAGE_FIELDS = ("api_calls", "signals_consumed", "executions")
+GRANULARITIES = {
+    "minute": timedelta(minutes=1),
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+}
+
+register_index(ROLLUP_COLLECTION, [("tenant_id", ASCENDING), ("granularity", ASCENDING), ("bucket", ASCENDING)])
+register_hot_query("usage_rollups_by_tenant", ROLLUP_COLLECTION,
+                   {"tenant_id": "audit", "granularity": "hour", "bucket": {"$gte": datetime(2025, 1, 1)}})
+
+def floor_to(ts: datetime, granularity: str) -> datetime:
+    if granularity == "day":
+        return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    if granularity == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(second=0, microsecond=0)
+
+def ceil_to(ts: datetime, granularity: str) -> datetime:
+    floored = floor_to(ts, granularity)
+    return floored if floored == ts else floored + GRANULARITIES[granularity]
+
+# ===============================
+# Escritura: $inc agrupado por bucket
+# ===============================
+def rollup_ops(events: Iterable[Dict]) -> List[UpdateOne]:
+    # Varios eventos del mismo tenant y minuto se combinan en un solo $inc
+    totals: Dict[Tuple, Dict[str, int]] = defaultdict(lambda: dict.fromkeys(USAGE_FIELDS, 0))
+    for event in events:
+        for granularity in GRANULARITIES:
+            key = (event["tenant_id"], granularity, floor_to(event["timestamp"], granularity))
+            bucket = totals[key]
+            for field in USAGE_FIELDS:
+                bucket[field] += int(event.get(field, 0))
+
+    return [
+        UpdateOne(
+            {"_id": f"{tenant_id}:{granularity}:{bucket.isoformat()}"},
+            {"$inc": inc, "$setOnInsert": {"tenant_id": tenant_id, "granularity": granularity, "bucket": bucket}},
+            upsert=True
+        )
+        for (tenant_id, granularity, bucket), inc in totals.items()
+    ]
+
+async def apply_usage(db, events: Iterable[Dict]) -> int:
+    ops = rollup_ops(events)
+    if ops:
+        await db[ROLLUP_COLLECTION].bulk_write(ops, ordered=False)
+    return len(ops)
+
+# ===============================
+# Lectura: plan de buckets para un rango
+# ===============================
+def plan_range(start: datetime, end: datetime) -> List[Tuple[str, datetime, datetime]]:
+    # Cubre [start, end) redondeado al minuto con la menor cantidad de
+    # buckets: minutos hasta la primera hora entera, horas hasta el primer día
+    # entero, días, y de nuevo horas y minutos en la cola.
+    start, end = floor_to(start, "minute"), ceil_to(end, "minute")
+    if end <= start:
+        return []
+
+    segments = []
+
+    def cover(lo: datetime, hi: datetime, levels: List[str]):
+        if lo >= hi:
+            return
+        if not levels:
+            segments.append(("minute", lo, hi))
+            return
+        level = levels[0]
+        inner_lo, inner_hi = ceil_to(lo, level), floor_to(hi, level)
+        if inner_lo >= inner_hi:
+            cover(lo, hi, levels[1:])
+            return
+        cover(lo, inner_lo, levels[1:])
+        segments.append((level, inner_lo, inner_hi))
+        cover(inner_hi, hi, levels[1:])
+
+    cover(start, end, ["day", "hour"])
+    return sorted(segments, key=lambda s: s[1])
+
+def _segments_filter(tenant_id: str, segments) -> Dict:
+    return {
+        "tenant_id": tenant_id,
+        "$or": [{"granularity": g, "bucket": {"$gte": lo, "$lt": hi}} for g, lo, hi in segments]
+    }
+
+async def query_usage(db, tenant_id: str, start: datetime, end: datetime) -> Dict:
+    segments = plan_range(start, end)
+    totals = dict.fromkeys(USAGE_FIELDS, 0)
+    buckets_read = 0
+    if segments:
+        projection = {field: 1 for field in USAGE_FIELDS}
+        async for doc in db[ROLLUP_COLLECTION].find(_segments_filter(tenant_id, segments), projection):
+            buckets_read += 1
+            for field in USAGE_FIELDS:
+                totals[field] += doc.get(field, 0)
+    return {
+        "tenant_id": tenant_id,
+        "start": floor_to(start, "minute"),
+        "end": ceil_to(end, "minute"),
+        "totals": totals,
+        "buckets_read": buckets_read,
+    }
+
+async def usage_series(db, tenant_id: str, start: datetime, end: datetime, granularity: str) -> List[Dict]:
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Granularidad inválida: {granularity}")
+    query = {
+        "tenant_id": tenant_id,
+        "granularity": granularity,
+        "bucket": {"$gte": floor_to(start, granularity), "$lt": ceil_to(end, granularity)}
+    }
+    projection = {"_id": 0, "bucket": 1, **{field: 1 for field in USAGE_FIELDS}}
+    return await db[ROLLUP_COLLECTION].find(query, projection).sort("bucket", ASCENDING).to_list(None)
+
+# ===============================
+# Reconstrucción desde usage_logs
+# ===============================
+async def rebuild_rollups(db, batch_size: int = 5000) -> Dict:
+    await db[ROLLUP_COLLECTION].delete_many({})
+    events, processed = [], 0
+    async for doc in db.usage_logs.find({}, {"_id": 0, "tenant_id": 1, "timestamp": 1, **{f: 1 for f in USAGE_FIELDS}}):
+        events.append(doc)
+        if len(events) >= batch_size:
+            await apply_usage(db, events)
+            processed += len(events)
+            events = []
+    await apply_usage(db, events)
+    return {"usage_logs": processed + len(events)}
+
+# Uso: python -m utils.usage_rollups rebuild
+if __name__ == "__main__":
+    from routers.database import mongo_db
+
+    if sys.argv[1:] != ["rebuild"]:
+        sys.exit("Uso: python -m utils.usage_rollups rebuild")
+    print(json.dumps(asyncio.run(rebuild_rollups(mongo_db)), indent=2))
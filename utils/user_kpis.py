@@ -0,0 +1,197 @@
+# utils/user_kpis.py
+
+from datetime import datetime
+from typing import Dict, List, Tuple
+import asyncio
+import json
+import logging
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from utils.job_lock import JobLock
+from utils.redis_pool import get_redis
+
+# === Configuración ===
+USER_KPIS_REFRESH_SECONDS = float(os.getenv("USER_KPIS_REFRESH_SECONDS", 900))
+USER_KPIS_CHUNK = int(os.getenv("USER_KPIS_CHUNK", 1000))
+
+GROUP_KEYS = ["user_id", "symbol", "timeframe"]
+
+# ===============================
+# Cálculo vectorizado (pandas/NumPy)
+# ===============================
+# Entrada: compras (buyer_id, signal_id) y señales cerradas (roi, timestamp de
+# apertura, closed_at). Salida: una fila por usuario/símbolo/timeframe y una
+# por usuario. Todo con groupby, sin loops por usuario.
+def _user_key(value):
+    # Los usuarios SQL tienen id entero; buyer_id llega como texto
+    text = str(value)
+    return int(text) if text.isdigit() else text
+
+def _group_stats(df: pd.DataFrame, keys: List[str]) -> pd.DataFrame:
+    df = df.sort_values(keys + ["closed_at"], kind="mergesort")
+    # Curva de equity en log por grupo; el pico arranca en 0 (capital inicial)
+    df["log_equity"] = df.groupby(keys, sort=False)["log_return"].cumsum()
+    peak = df.groupby(keys, sort=False)["log_equity"].cummax().clip(lower=0.0)
+    df["drawdown"] = 1.0 - np.exp(df["log_equity"] - peak)
+
+    stats = df.groupby(keys, sort=False).agg(
+        signals=("roi", "size"),
+        roi_total=("roi", "sum"),
+        roi_sq=("roi_sq", "sum"),
+        win_rate=("win", "mean"),
+        avg_holding=("holding_hours", "mean"),
+        drawdown=("drawdown", "max"),
+    ).reset_index()
+    n = stats["signals"].to_numpy(dtype=np.float64)
+    mean = stats["roi_total"].to_numpy() / n
+    # roi: media por señal, igual que el roi global de utils/kpi_engine.py
+    stats["roi"] = mean
+    std = np.sqrt(np.maximum(stats.pop("roi_sq").to_numpy() / n - mean * mean, 0.0))
+    stats["sharpe"] = np.divide(mean, std, out=np.zeros_like(mean), where=std > 1e-12)
+    return stats
+
+def compute_user_kpis(purchases: pd.DataFrame, signals: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    empty = pd.DataFrame()
+    if purchases.empty or signals.empty:
+        return empty, empty
+    owned = purchases.drop_duplicates(["buyer_id", "signal_id"])
+    df = owned.merge(signals, left_on="signal_id", right_on="_id", how="inner")
+    if df.empty:
+        return empty, empty
+
+    df["user_id"] = df["buyer_id"].map(_user_key)
+    df["symbol"] = df["asset"].fillna("UNKNOWN").astype(str)
+    df["timeframe"] = df["timeframe"].fillna("UNKNOWN").astype(str)
+    df["roi"] = df["roi"].astype(np.float64)
+    df["roi_sq"] = df["roi"] ** 2
+    df["win"] = (df["roi"] > 0).astype(np.float64)
+    df["log_return"] = np.log1p(df["roi"].clip(lower=-0.999999))
+    holding = (pd.to_datetime(df["closed_at"]) - pd.to_datetime(df["timestamp"])).dt.total_seconds() / 3600
+    df["holding_hours"] = holding.clip(lower=0)
+
+    per_symbol = _group_stats(df, GROUP_KEYS)
+    per_user = _group_stats(df, ["user_id"])
+    return per_symbol, per_user
+
+# ===============================
+# Job: lectura columnar + escritura en bloque
+# ===============================
+class UserKPIBuilder:
+    def __init__(self, db, chunk: int = USER_KPIS_CHUNK):
+        self.db = db
+        self.chunk = chunk
+        self.runs = 0
+        self.last_duration_ms = 0.0
+        self.last_users = 0
+        self.last_rows = 0
+
+    async def _load(self) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        purchases = await self.db.purchases.find({}, {"_id": 0, "buyer_id": 1, "signal_id": 1}).to_list(None)
+        purchases_df = pd.DataFrame(purchases, columns=["buyer_id", "signal_id"])
+        # signal_id se guarda en hex; el _id de signals es ObjectId
+        signal_ids = [ObjectId(s) for s in purchases_df["signal_id"].dropna().unique() if ObjectId.is_valid(s)]
+        docs = []
+        projection = {"asset": 1, "timeframe": 1, "roi": 1, "timestamp": 1, "closed_at": 1}
+        for i in range(0, len(signal_ids), 10_000):
+            docs.extend(await self.db.signals.find(
+                {"_id": {"$in": signal_ids[i:i + 10_000]}, "roi": {"$ne": None}, "closed_at": {"$ne": None}},
+                projection
+            ).to_list(None))
+        signals_df = pd.DataFrame(docs, columns=["_id", "asset", "timeframe", "roi", "timestamp", "closed_at"])
+        signals_df["_id"] = signals_df["_id"].astype(str)
+        return purchases_df, signals_df
+
+    async def _write(self, per_symbol: pd.DataFrame, per_user: pd.DataFrame, now: datetime):
+        ops = [
+            UpdateOne(
+                {"_id": f"{row['user_id']}:{row['symbol']}:{row['timeframe']}"},
+                {"$set": {
+                    "user_id": _user_key(row["user_id"]),
+                    "symbol": row["symbol"],
+                    "timeframe": row["timeframe"],
+                    "roi": round(float(row["roi"]), 6),
+                    "roi_total": round(float(row["roi_total"]), 6),
+                    "win_rate": round(float(row["win_rate"]), 4),
+                    "avg_holding": round(float(row["avg_holding"]), 2),
+                    "sharpe": round(float(row["sharpe"]), 4),
+                    "drawdown": round(float(row["drawdown"]), 6),
+                    "signals": int(row["signals"]),
+                    "updated_at": now
+                }},
+                upsert=True
+            )
+            for row in per_symbol.to_dict("records")
+        ]
+        for i in range(0, len(ops), self.chunk):
+            await self.db.user_kpis.bulk_write(ops[i:i + self.chunk], ordered=False)
+
+        # Resumen por usuario para /metrics/me (KPIResponse)
+        rows = per_user.to_dict("records")
+        for i in range(0, len(rows), self.chunk):
+            pipe = get_redis().pipeline(transaction=False)
+            for row in rows[i:i + self.chunk]:
+                pipe.set(f"user:kpis:{row['user_id']}", json.dumps({
+                    "roi": round(float(row["roi"]), 6),
+                    "roi_total": round(float(row["roi_total"]), 6),
+                    "win_rate": round(float(row["win_rate"]), 4),
+                    "drawdown": round(float(row["drawdown"]), 6),
+                    "sharpe": round(float(row["sharpe"]), 4),
+                    "total_signals": int(row["signals"]),
+                    "updated_at": now.isoformat()
+                }))
+            await pipe.execute()
+
+    async def refresh(self) -> Dict:
+        start = time.perf_counter()
+        now = datetime.utcnow()
+        purchases, signals = await self._load()
+        # El cálculo es CPU puro: fuera del event loop
+        per_symbol, per_user = await asyncio.to_thread(compute_user_kpis, purchases, signals)
+        if not per_symbol.empty:
+            await self._write(per_symbol, per_user, now)
+        self.runs += 1
+        self.last_users = len(per_user)
+        self.last_rows = len(per_symbol)
+        self.last_duration_ms = round((time.perf_counter() - start) * 1000, 1)
+        return self.stats()
+
+    def stats(self) -> Dict:
+        return {
+            "runs": self.runs,
+            "last_users": self.last_users,
+            "last_rows": self.last_rows,
+            "last_duration_ms": self.last_duration_ms,
+        }
+
+# Cada recálculo carga todas las compras: con varios workers solo uno lo corre
+# por intervalo (lock en Redis, ver utils/job_lock.py)
+user_kpis_lock = JobLock("user_kpis", USER_KPIS_REFRESH_SECONDS)
+
+async def run_user_kpis(builder: UserKPIBuilder, interval: float = USER_KPIS_REFRESH_SECONDS,
+                        lock: JobLock = user_kpis_lock):
+    while True:
+        try:
+            await lock.run(builder.refresh)
+        except Exception as e:
+            logging.warning(f"[USER KPIS] Falló el recálculo de KPIs por usuario: {e}")
+        await asyncio.sleep(interval)
+
+# Uso: python -m utils.user_kpis  (un recálculo completo)
+if __name__ == "__main__":
+    from routers.database import mongo_db
+    from utils.redis_pool import init_redis, close_redis
+
+    async def _main():
+        init_redis()
+        try:
+            print(json.dumps(await UserKPIBuilder(mongo_db).refresh(), indent=2))
+        finally:
+            await close_redis()
+
+    asyncio.run(_main())